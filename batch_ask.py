@@ -0,0 +1,20 @@
+import argparse
+
+from services.AskLLM import AskLLM
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетные ответы LLM на вопросы из JSONL файла")
+    parser.add_argument("input", help="входной JSONL файл, по одному вопросу на строку")
+    parser.add_argument("output", help="JSONL файл для результатов (запись дополняется полями answer, contexts и error)")
+    parser.add_argument("--collection", default=None, help="коллекция для RAG (по умолчанию ответы без RAG)")
+    parser.add_argument("--query-field", default="query", help="поле записи с текстом вопроса")
+    parser.add_argument("--batch-size", type=int, default=256, help="сколько вопросов обрабатывается за раз")
+    args = parser.parse_args()
+
+    ask = AskLLM()
+    ask.process_jsonl(args.input, args.output, args.collection, args.query_field, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,18 @@ class DataElement:
         url_list: list[str],
         collection_db_name: str = "default",
         url_data: dict | None = None,
-        chunks: list[str] | None = None
+        chunks: list[str] | None = None,
+        chunk_sources: list[str] | None = None,
+        chunk_titles: list[str] | None = None,
+        filter_stats: dict | None = None
     ) -> None:
         self.url_list = url_list  # Список url ссылок для парсинга
         self.collection_db_name = collection_db_name  # Имя коллекции для векторной БД для хранения данных
         self.url_data = url_data  # Предобработанные распаренные данные
         self.chunks = chunks  # Список чанков, полученных из url_data
+        self.chunk_sources = chunk_sources  # url страницы, из которой получен каждый чанк (в порядке chunks)
+        self.chunk_titles = chunk_titles  # Заголовок страницы, из которой получен каждый чанк (в порядке chunks)
+        self.filter_stats = filter_stats  # Сколько строк и символов удалило каждое правило фильтрации
 
     def __str__(self) -> str:
         """
@@ -21,6 +27,9 @@ class DataElement:
         url_list_str = ", ".join(self.url_list) if self.url_list else "No URLs"
         url_data_str = f"{len(self.url_data)} entries" if self.url_data else "No data"
         chunks_str = f"{len(self.chunks)} chunks" if self.chunks else "No chunks"
+        filter_stats_str = ", ".join(
+            f"{rule}: -{stats['lines']} lines/-{stats['chars']} chars" for rule, stats in self.filter_stats.items()
+        ) if self.filter_stats else "No filtering"
 
         return (
             f"DataElement(\n"
@@ -28,6 +37,7 @@ class DataElement:
             f"  URLs: {url_list_str}\n"
             f"  URL Data: {url_data_str}\n"
             f"  Chunks: {chunks_str}\n"
+            f"  Filtered: {filter_stats_str}\n"
             f")"
         )
 
@@ -59,6 +69,7 @@ class DataElement:
         # Сохраняем чанки в файл
         with open(file_path, "w", encoding="utf-8") as file:
             for i, chunk in enumerate(self.chunks):
-                file.write(f"Чанк {i + 1} ({len(chunk)} символов):\n{chunk}\n{'=' * 50}\n")
+                source = f", источник: {self.chunk_titles[i]} ({self.chunk_sources[i]})" if self.chunk_sources and self.chunk_titles else ""
+                file.write(f"Чанк {i + 1} ({len(chunk)} символов{source}):\n{chunk}\n{'=' * 50}\n")
 
         print(f"Чанки сохранены в файл {file_path}")
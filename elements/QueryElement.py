@@ -12,6 +12,8 @@ class QueryElement:
         prompt_chunks: list | None = None,
         final_prompt: str | None = None,
         answer: str | None = None,
+        source_urls: list[str] | None = None,
+        error: str | None = None,
     ) -> None:
         self.query = query # Запрос пользователя
         self.message_number = message_number # Номер сообщения в чате (начиная с 0)
@@ -23,6 +25,8 @@ class QueryElement:
         self.prompt_chunks = prompt_chunks # итоговые чанки, добавляемые в запрос (прошедшие фильтрацию по релевантности и числу)
         self.final_prompt = final_prompt # итоговый промпт
         self.answer = answer # ответ llm
+        self.source_urls = source_urls # поиск только по чанкам с этих url (None - по всей коллекции)
+        self.error = error # описание ошибки пакетной обработки запроса (None - ошибок не было)
   
     @staticmethod
     def display_chunks(chunks: list, limit_size: int = 200) -> None:
@@ -1,38 +1,209 @@
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from elements.DataElement import DataElement
 from utils_local.utils import profile_time
+from utils_local.dedup import ChunkDeduplicator
+from utils_local.text_filters import add_filter_stats
+from utils_local.tokenizer import load_local_tokenizer
 
 logger = logging.getLogger(__name__)
 
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+# Сплиттер процесса-воркера пула, создается один раз при запуске процесса
+_worker_splitter = None
+
+
+def _create_splitter(settings: dict, tokenizer=None) -> RecursiveCharacterTextSplitter:
+    """
+    Создает сплиттер по настройкам: длина чанка считается в символах или в токенах локального токенизатора.
+
+    Args:
+        settings (dict): Ключи 'length_mode' ("chars" | "tokens"), 'chunk_size', 'chunk_overlap', 'tokenizer_path'.
+        tokenizer: Уже загруженный токенизатор (None - загрузить по tokenizer_path).
+    """
+    length_function = len
+    if settings["length_mode"] == "tokens":
+        if tokenizer is None:
+            tokenizer = load_local_tokenizer(settings["tokenizer_path"])
+        length_function = lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    return RecursiveCharacterTextSplitter(
+        separators=SEPARATORS,
+        chunk_size=settings["chunk_size"],
+        chunk_overlap=settings["chunk_overlap"],
+        length_function=length_function
+    )
+
+
+def _init_worker(settings: dict) -> None:
+    global _worker_splitter
+    _worker_splitter = _create_splitter(settings)
+
+
+def _split_in_worker(text: str) -> list[str]:
+    return _worker_splitter.split_text(text)
+
 
 class ChunkingNode:
     """Модуль отвечающий, за парсинг веб страниц"""
 
     def __init__(self, config) -> None:
+        self.separators = SEPARATORS
+        self.length_mode = config["length_mode"]  # В чем считается размер чанка: chars | tokens
         self.chunk_size = config["chunk_size"]
         self.chunk_overlap = config["chunk_overlap"]
-        self.separators = ["\n\n", "\n", ". ", " "]
 
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            separators=self.separators,
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len
-        )
-        
+        tokenizer = None
+        if self.length_mode == "tokens":
+            tokenizer = load_local_tokenizer(config["tokenizer_path"])
+            if tokenizer is None:
+                # Молча считать в символах нельзя: chunk_size задан в символах, и чанки не совпадут с окном эмбеддера
+                raise ValueError(
+                    f"length_mode: tokens, но токенизатор для чанкинга не загружен из '{config['tokenizer_path']}'. "
+                    f"Проверьте tokenizer_path и установку библиотеки tokenizers или укажите length_mode: chars"
+                )
+            self.chunk_size = config["chunk_size_tokens"]
+            self.chunk_overlap = config["chunk_overlap_tokens"]
+
+        self.splitter_settings = {
+            "length_mode": self.length_mode,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "tokenizer_path": config["tokenizer_path"],
+        }
+        self.text_splitter = _create_splitter(self.splitter_settings, tokenizer)
+
+        # Параллельный чанкинг страниц в пуле процессов
+        parallel_config = config["parallel"]
+        self.workers = parallel_config["workers"]  # Число процессов (0 - чанкинг в текущем процессе)
+        self.min_pages = parallel_config["min_pages"]  # С какого числа страниц запускается пул
+        self.pages_in_flight = parallel_config["pages_in_flight"]  # Сколько страниц одновременно в обработке на процесс
+
+        # Удаление точных и почти точных повторов чанков (например, общих блоков на страницах одного сайта)
+        dedup_config = config["dedup"]
+        self.dedup_enabled = dedup_config["enabled"]
+        self.dedup_similarity_threshold = dedup_config["similarity_threshold"]
+        self.dedup_num_perm = dedup_config["num_perm"]
+        self.dedup_shingle_size = dedup_config["shingle_size"]
+
+    def create_deduplicator(self) -> ChunkDeduplicator | None:
+        """Создает дедупликатор на одну загрузку (None - дедупликация выключена)."""
+        if not self.dedup_enabled:
+            return None
+        return ChunkDeduplicator(self.dedup_similarity_threshold, self.dedup_num_perm, self.dedup_shingle_size)
+
+    def split_page(self, data: dict, deduplicator: ChunkDeduplicator | None = None, filter_stats: dict | None = None) -> list[str]:
+        """
+        Делит текст одной страницы на чанки.
+
+        Args:
+            data (dict): Данные страницы с ключами 'text' и 'description'.
+            deduplicator (ChunkDeduplicator): Если задан, повторы уже встреченных чанков отбрасываются.
+            filter_stats (dict): Словарь, куда добавляется статистика удаленных повторов.
+
+        Returns:
+            list[str]: Чанки страницы (url и заголовок страницы хранятся отдельно от текста чанка).
+        """
+        chunks = self.text_splitter.split_text(data['text'])
+        return self._finalize_chunks(chunks, deduplicator, filter_stats)
+
+    def iter_split_pages(
+        self,
+        pages: Iterable[tuple[str, dict]],
+        deduplicator: ChunkDeduplicator | None = None,
+        filter_stats: dict | None = None,
+        parallel: bool = True,
+    ) -> Iterator[tuple[str, str, list[str]]]:
+        """
+        Делит страницы на чанки, при parallel=True и workers > 0 - в пуле процессов.
+        В обработке одновременно не больше workers * pages_in_flight страниц, результат отдается в порядке входа,
+        а дедупликация выполняется в текущем процессе, поэтому результат не зависит от числа процессов.
+
+        Args:
+            pages (Iterable): Пары (url, {'text': ..., 'description': ...}).
+
+        Yields:
+            tuple: (url, заголовок страницы, чанки страницы).
+        """
+        if not parallel or self.workers <= 0:
+            for url, data in pages:
+                yield url, data['description'], self.split_page(data, deduplicator, filter_stats)
+            return
+
+        logger.info(f"Чанкинг в пуле из {self.workers} процессов")
+        # spawn: fork процесса с работающими потоками (парсинг, эмбеддинг) небезопасен
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.splitter_settings,),
+        ) as executor:
+            in_flight = deque()
+            for url, data in pages:
+                in_flight.append((url, data, executor.submit(_split_in_worker, data['text'])))
+                if len(in_flight) >= self.workers * self.pages_in_flight:
+                    url, data, future = in_flight.popleft()
+                    yield url, data['description'], self._finalize_chunks(future.result(), deduplicator, filter_stats)
+            while in_flight:
+                url, data, future = in_flight.popleft()
+                yield url, data['description'], self._finalize_chunks(future.result(), deduplicator, filter_stats)
+
+    def _finalize_chunks(self, chunks: list[str], deduplicator: ChunkDeduplicator | None, filter_stats: dict | None) -> list[str]:
+        if deduplicator is not None:
+            chunks = self._drop_duplicates(chunks, deduplicator, filter_stats)
+        return chunks
+
+    @staticmethod
+    def _drop_duplicates(chunks: list[str], deduplicator: ChunkDeduplicator, filter_stats: dict | None) -> list[str]:
+        unique_chunks = []
+        for chunk in chunks:
+            duplicate = deduplicator.check(chunk)
+            if duplicate is None:
+                unique_chunks.append(chunk)
+            elif filter_stats is not None:
+                rule = f"dedup:{duplicate}"
+                add_filter_stats(filter_stats, rule, chunk.count("\n") + 1, len(chunk))
+                filter_stats[rule]["chunks"] = filter_stats[rule].get("chunks", 0) + 1
+        return unique_chunks
+
+    @staticmethod
+    def log_dedup_stats(filter_stats: dict, total_chunks: int) -> None:
+        removed = {rule: stats for rule, stats in filter_stats.items() if rule.startswith("dedup:")}
+        if removed:
+            logger.info(
+                f"Дедупликация: сохранено {total_chunks} чанков, удалено повторов: "
+                + ", ".join(
+                    f"{rule.removeprefix('dedup:')} - {stats['chunks']} чанков ({stats['chars']} символов)"
+                    for rule, stats in removed.items()
+                )
+            )
+
     @profile_time
     def process(self, data_element: DataElement) -> DataElement:
         url_data = data_element.url_data
+        if data_element.filter_stats is None:
+            data_element.filter_stats = {}
+        deduplicator = self.create_deduplicator()
 
         all_chunks = []
-        for url, data in url_data.items():
-            chunks = self.text_splitter.split_text(data['text'])
-            for chunk in chunks:
-                # Добавляем описание в начало чанка
-                formatted_chunk = f"[Источник: {data['description']}]\n{chunk}"
-                all_chunks.append(formatted_chunk)
+        chunk_sources = []
+        chunk_titles = []
+        pages = self.iter_split_pages(
+            url_data.items(), deduplicator, data_element.filter_stats, parallel=len(url_data) >= self.min_pages
+        )
+        for url, title, chunks in pages:
+            all_chunks.extend(chunks)
+            chunk_sources.extend([url] * len(chunks))
+            chunk_titles.extend([title] * len(chunks))
+        self.log_dedup_stats(data_element.filter_stats, len(all_chunks))
 
         data_element.chunks = all_chunks
+        data_element.chunk_sources = chunk_sources
+        data_element.chunk_titles = chunk_titles
         return data_element
@@ -1,8 +1,16 @@
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 from elements.DataElement import DataElement
+from utils_local.html_extractor import HtmlExtractor
+from utils_local.http_cache import HttpCache
+from utils_local.text_filters import DomainStopPhrases, add_filter_stats
 from utils_local.utils import profile_time
 
 logger = logging.getLogger(__name__)
@@ -12,9 +20,32 @@ class DataParsingNode:
     
     def __init__(self, config) -> None:
         self.min_words = config["min_words"]
+        self.max_workers = max(1, config["max_workers"])  # Сколько страниц скачивается одновременно
+        self.max_per_host = max(1, config["max_per_host"])  # Сколько одновременных соединений к одному хосту
+        self.request_timeout = config["request_timeout"]
 
-    @staticmethod
-    def parse_url(url):
+        # Общая сессия с keep-alive: соединения к одному хосту переиспользуются между страницами
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+
+        self.extractor = HtmlExtractor(config["html_engine"], config["drop_tags"])
+
+        # Дисковый кэш страниц: повторная сборка датасета не качает неизмененные страницы
+        http_cache_config = config["http_cache"]
+        self.http_cache = None
+        if http_cache_config["enabled"]:
+            self.http_cache = HttpCache(http_cache_config["dir"], http_cache_config["max_size_mb"])
+
+        # Стоп-фразы компилируются один раз на узел, правила задаются по сайтам в конфиге
+        self.line_stop_phrases = DomainStopPhrases("line", config["line_stop_phrases"])
+        self.cutoff_stop_phrases = DomainStopPhrases("cutoff", config["cutoff_stop_phrases"])
+
+    def parse_url(self, url):
         """
         Парсит содержимое указанного URL и возвращает текстовое содержимое страницы.
         
@@ -25,24 +56,11 @@ class DataParsingNode:
             dict: Словарь с ключами 'text' (текстовая информация) и 'description' (краткое описание страницы).
         """
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            # Извлекаем краткое описание (title страницы)
-            description = soup.title.string.strip() if soup.title else url
-            
-            # Обработка контента
-            soup_copy = BeautifulSoup(response.text, "html.parser")
-            for tag in soup_copy.find_all(['pre', 'code']):
-                tag.replace_with(tag.get_text(separator=" ", strip=True))
-            
-            final_text = soup_copy.get_text(separator="\n", strip=True)
-            
-            # Если это GitHub-страница, применяем специальную фильтрацию
-            if "github" in url.lower():
-                logger.debug("Обнаружена ссылка на GitHub. Применяется специальная фильтрация.")
-                final_text = DataParsingNode.filter_github_text(final_text)
+            html = self._download(url)
+
+            # Один проход разбора: заголовок и текст без script/style/nav
+            title, final_text = self.extractor.extract(html)
+            description = title.strip() if title and title.strip() else url
             
             return {'text': final_text, 'description': description}
         
@@ -50,104 +68,136 @@ class DataParsingNode:
             logger.error(f"Ошибка при загрузке страницы {url}: {e}")
             return {'text': '', 'description': url}
 
-    @staticmethod
-    def filter_github_text(text):
+    def _download(self, url):
+        """
+        Скачивает HTML страницы. Если страница есть в HTTP кэше, делает условный запрос
+        и при ответе 304 Not Modified возвращает сохраненное тело.
+        """
+        if self.http_cache is None:
+            response = self.session.get(url, timeout=self.request_timeout)
+            response.raise_for_status()
+            return response.text
+
+        headers = self.http_cache.conditional_headers(url)
+        response = self.session.get(url, timeout=self.request_timeout, headers=headers)
+        if response.status_code == 304:
+            cached_body = self.http_cache.get_body(url)
+            if cached_body is not None:
+                logger.debug(f"Страница {url} не изменилась, используется кэш")
+                return cached_body
+            # Тело пропало из кэша - скачиваем страницу заново без условных заголовков
+            response = self.session.get(url, timeout=self.request_timeout)
+
+        response.raise_for_status()
+        self.http_cache.put(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.text
+
+    def filter_text(self, text, url, stats=None):
         """
-        Удаляет нежелательные строки из текста GitHub-страницы.
+        Фильтрует текст страницы: удаляет строки со стоп-фразами сайта и строки короче min_words слов,
+        затем обрезает текст с первой строки, содержащей стоп-фразу отсечения.
         
         Args:
             text (str): Исходный текст.
+            url (str): Адрес страницы, по нему выбираются правила сайта.
+            stats (dict): Словарь, куда добавляется число удаленных строк и символов по каждому правилу.
         
         Returns:
             str: Отфильтрованный текст.
         """
-        stop_phrases = [
-            "Skip to content",
-            "Write better code with AI",
-            "Find and fix vulnerabilities",
-            "Automate any workflow",
-            "Instant dev environments",
-            "Plan and track work",
-            "Manage code changes",
-            "Collaborate outside of code",
-            "Find more, search less",
-            "By company size",
-            "Small and medium teams",
-            "By use case",
-            "View all use cases",
-            "View all industries",
-            "View all solutions",
-            "White papers, Ebooks, Webinars",
-            "Fund open source developers",
-            "The ReadME Project",
-            "GitHub community articles",
-            "AI-powered developer platform",
-            "Enterprise-grade security features",
-            "Enterprise-grade AI features",
-            "Enterprise-grade 24/7 support",
-            "Search or jump to...",
-            "Search code, repositories, users, issues, pull requests...",
-            "Search syntax tips",
-            "We read every piece of feedback, and take your input very seriously.",
-            "Include my email address so I can be contacted",
-            "Use saved searches to filter your results more quickly",
-            "To see all available qualifiers, see our",
-            "Create saved search",
-            "You signed in with another tab or window.",
-            "to refresh your session.",
-            "You signed out in another tab or window.",
-            "to refresh your session.",
-            "You switched accounts on another tab or window.",
-            "to refresh your session.",
-            "Block or Report",
-            "Prevent this user from interacting with your repositories and sending you notifications.",
-            "You must be logged in to block users.",
-            "Please don't include any personal information such as legal names or email addresses. Maximum 100 characters, markdown supported. This note will be visible to only you."
-            "Contact GitHub support about this user’s behavior.",
-            "You must be signed in to change notification settings",
-            "Additional navigation options",
-            "Go to file",
-            "Folders and files",
-            "Last commit message",
-            "Last commit date",
-            "View all files",
-            "Repository files navigation",
-        ]
+        if not text:
+            return ''
+        if stats is None:
+            stats = {}
+
+        line_rules = self.line_stop_phrases.for_url(url)
+        filtered_text = []
+        for line in text.split("\n"):
+            rule = next((name for name, matcher in line_rules if matcher.search(line)), None)
+            if rule is None and len(line.split()) < self.min_words:
+                rule = "min_words"
+            if rule is not None:
+                add_filter_stats(stats, rule, 1, len(line))
+            else:
+                filtered_text.append(line.strip())
+
+        # Поиск стоп-фраз, после которых полезного текста уже нет
+        cutoff_rules = self.cutoff_stop_phrases.for_url(url)
+        if cutoff_rules:
+            for i, line in enumerate(filtered_text):
+                rule = next((name for name, matcher in cutoff_rules if matcher.search(line)), None)
+                if rule is not None:
+                    removed = filtered_text[i:]
+                    add_filter_stats(stats, rule, len(removed), sum(len(removed_line) for removed_line in removed))
+                    filtered_text = filtered_text[:i]
+                    break
         
-        lines = text.split("\n")
-        filtered_lines = [line for line in lines if not any(phrase in line for phrase in stop_phrases)]
-        return "\n".join(filtered_lines)
+        return "\n".join(filtered_text)
 
-    @staticmethod
-    def filter_text(text, min_words=3):
+    def _get_host_semaphore(self, url):
+        """Возвращает семафор, ограничивающий число одновременных запросов к хосту url."""
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_semaphores[host]
+
+    def fetch_url(self, url):
         """
-        Фильтрует текст, удаляя строки с минимальным количеством слов и стоп-фразы.
+        Скачивает и парсит страницу с учетом лимита соединений на хост.
         
         Args:
-            text (str): Исходный текст.
-            min_words (int): Минимальное количество слов в строке для сохранения.
+            url (str): URL-адрес для парсинга.
         
         Returns:
-            str: Отфильтрованный текст.
+            dict: Результат parse_url.
         """
-        if not text:
-            return ''
-        
-        lines = text.split("\n")
-        filtered_text = [line.strip() for line in lines if len(line.split()) >= min_words]
+        with self._get_host_semaphore(url):
+            logger.info(f"Парсинг {url}...")
+            return self.parse_url(url)
+
+    def iter_process(self, urls, filter_stats=None):
+        """
+        Скачивает и фильтрует страницы параллельно, отдавая результат по одной странице.
+        Одновременно в обработке не больше 2 * max_workers страниц, поэтому память не растет с числом url.
         
-        # Поиск стоп-фраз
-        stop_phrases = [
-            "Политика в отношении файлов cookie",
-            "Мы используем cookie",
-            "Дата обращения:",
-            "Использованная литература и источники:"
-        ]
-        cutoff_index = next((i for i, line in enumerate(filtered_text) if any(phrase in line for phrase in stop_phrases)), None)
-        if cutoff_index is not None:
-            filtered_text = filtered_text[:cutoff_index]
+        Args:
+            urls (list): Список url для парсинга.
+            filter_stats (dict): Словарь, куда добавляется статистика фильтрации.
         
-        return "\n".join(filtered_text)
+        Yields:
+            tuple: (url, {'text': ..., 'description': ...}) в порядке входного списка, пустые страницы пропускаются.
+        """
+        if filter_stats is None:
+            filter_stats = {}
+
+        workers = min(self.max_workers, len(urls)) or 1
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for url in urls:
+                    in_flight.append((url, executor.submit(self.fetch_url, url)))
+                    if len(in_flight) >= 2 * workers:
+                        yield from self._filter_page(*in_flight.popleft(), filter_stats)
+                while in_flight:
+                    yield from self._filter_page(*in_flight.popleft(), filter_stats)
+        finally:
+            if self.http_cache is not None:
+                self.http_cache.flush()
+
+    def _filter_page(self, url, future, filter_stats):
+        parsed_data = future.result()
+        if parsed_data['text']:
+            filtered_text = self.filter_text(parsed_data['text'], url, filter_stats)
+            yield url, {
+                'text': filtered_text,
+                'description': parsed_data['description']
+            }
+
+    @staticmethod
+    def log_filter_stats(filter_stats):
+        for rule, rule_stats in filter_stats.items():
+            logger.info(f"Фильтр '{rule}' удалил {rule_stats['lines']} строк, {rule_stats['chars']} символов")
 
     @profile_time
     def process(self, data_element: DataElement) -> DataElement:
@@ -160,18 +210,11 @@ class DataParsingNode:
         Returns:
             DataElement: Обработанный элемент данных.
         """
-        urls = data_element.url_list
-        url_data = {}
-        
-        for url in urls:
-            logger.info(f"Парсинг {url}...")
-            parsed_data = self.parse_url(url)
-            if parsed_data['text']:
-                filtered_text = self.filter_text(parsed_data['text'])
-                url_data[url] = {
-                    'text': filtered_text,
-                    'description': parsed_data['description']
-                }
-        
+        filter_stats = {}
+        # Страницы качаются параллельно, iter_process отдает результаты в порядке входного списка
+        url_data = dict(self.iter_process(data_element.url_list, filter_stats))
+        self.log_filter_stats(filter_stats)
+
         data_element.url_data = url_data
-        return data_element
\ No newline at end of file
+        data_element.filter_stats = filter_stats
+        return data_element
@@ -1,7 +1,17 @@
+import asyncio
+import atexit
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
 import requests
-from typing import List
+from requests.adapters import HTTPAdapter
+
 from utils_local.utils import profile_time
+from utils_local.embedding_cache import EmbeddingCache
+from utils_local.lru_cache import LRUCache
+from utils_local.async_http import LoopBoundAsyncClient
 from langchain.schema import Document
 
 logger = logging.getLogger(__name__)
@@ -13,40 +23,207 @@ class EmbedderNode:
         self.host = config["host"]
         self.port = config["port"]
         self.batch_size = config["max_batch_size"]  # Размер батча, можно настроить через конфиг
+        self.model_name = config["model_name"]  # Входит в ключ кэша, чтобы не смешивать эмбеддинги разных моделей
+        
+        self.max_in_flight = max(1, config["max_in_flight"])  # Сколько батчей одновременно обрабатывается сервером
+        self.request_timeout = config["request_timeout"]  # Общий таймаут для синхронных и асинхронных запросов
         
         self.embedder_url = f"http://{self.host}:{self.port}/embed"
+        self._server_batch_size = None  # --max-client-batch-size сервера, запрашивается при первом батче
+
+        # Пул keep-alive соединений: по соединению на каждый батч в обработке
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight))
+        # Пул асинхронных соединений для aembed_documents / aembed_query
+        self.async_client = LoopBoundAsyncClient(max_connections=self.max_in_flight, timeout=self.request_timeout)
+
+        # Дисковый кэш эмбеддингов чанков, общий для всех коллекций
+        cache_config = config["cache"]
+        self.cache = None
+        if cache_config["enabled"]:
+            self.cache = EmbeddingCache(cache_config["dir"], cache_config["max_items"])
+            # Индекс кэша сбрасывается на диск в конце загрузки (flush_cache) и при завершении процесса
+            atexit.register(self.flush_cache)
+
+        # LRU кэш эмбеддингов запросов пользователей в памяти процесса
+        query_cache_config = config["query_cache"]
+        self.query_cache = LRUCache(query_cache_config["max_size"], query_cache_config["ttl_sec"])
     
     @profile_time
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    def embed_documents(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
         """
-        Получает эмбеддинги для списка текстов, разбивая их на батчи.
+        Получает эмбеддинги для списка текстов. Тексты, уже найденные в кэше,
+        на сервер не отправляются, остальные отправляются батчами.
         
         Args:
             texts (List[str]): Список текстов для создания эмбеддингов.
+            use_cache (bool): Использовать ли дисковый кэш эмбеддингов.
         
         Returns:
             List[List[float]]: Список эмбеддингов для каждого текста.
         """
-        embeddings = []
+        if self.cache is None or not use_cache:
+            return self._embed_batches(texts)
+
+        keys, embeddings_by_key, missing = self._cache_lookup(texts)
+        if missing:
+            self._cache_store(missing, self._embed_batches(list(missing.values())), embeddings_by_key)
+        return [embeddings_by_key[key] for key in keys]
+
+    @profile_time
+    async def aembed_documents(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        """
+        Асинхронный вариант embed_documents: батчи отправляются одновременно (до max_in_flight)
+        через пул асинхронных соединений.
         
-        # Разбиваем тексты на батчи заданного размера
-        for i in range(0, len(texts), self.batch_size):
-            batch_texts = texts[i:i + self.batch_size]
-            logger.info(f"Обработка батча {i // self.batch_size + 1}, размер батча: {len(batch_texts)}")
-            
-            # Отправляем запрос для текущего батча
-            response = requests.post(
-                self.embedder_url,
-                json={"inputs": batch_texts}
-            )
-            
-            if response.status_code == 200:
-                batch_embeddings = response.json()
-                embeddings.extend(batch_embeddings)
-            else:
-                raise Exception(f"Ошибка при обработке батча: {response.status_code}, {response.text}")
+        Args:
+            texts (List[str]): Список текстов для создания эмбеддингов.
+            use_cache (bool): Использовать ли дисковый кэш эмбеддингов.
         
+        Returns:
+            List[List[float]]: Список эмбеддингов для каждого текста.
+        """
+        if self.cache is None or not use_cache:
+            return await self._aembed_batches(texts)
+
+        # Чтение и запись дискового кэша (memmap) блокируют, поэтому выполняются вне event loop
+        keys, embeddings_by_key, missing = await asyncio.to_thread(self._cache_lookup, texts)
+        if missing:
+            missing_embeddings = await self._aembed_batches(list(missing.values()))
+            await asyncio.to_thread(self._cache_store, missing, missing_embeddings, embeddings_by_key)
+        return [embeddings_by_key[key] for key in keys]
+
+    def _cache_lookup(self, texts: List[str]) -> tuple[list, dict, dict]:
+        """
+        Ищет эмбеддинги текстов в дисковом кэше.
+        
+        Returns:
+            tuple: (ключи текстов, {ключ: эмбеддинг} для найденных, {ключ: текст} для уникальных ненайденных).
+        """
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        embeddings_by_key = {key: embedding.tolist() for key, embedding in self.cache.get_many(keys).items()}
+
+        # Уникальные тексты, которых нет в кэше
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings_by_key:
+                missing.setdefault(key, text)
+        logger.info(f"Кэш эмбеддингов: {len(texts) - len(missing)} попаданий, {len(missing)} текстов отправлено на сервер")
+        return keys, embeddings_by_key, missing
+
+    def _cache_store(self, missing: dict, missing_embeddings: List[List[float]], embeddings_by_key: dict) -> None:
+        """Сохраняет в кэш эмбеддинги, полученные от сервера, и добавляет их в embeddings_by_key."""
+        self.cache.put_many(list(missing.keys()), missing_embeddings)
+        embeddings_by_key.update(zip(missing.keys(), missing_embeddings))
+
+    def flush_cache(self) -> None:
+        """Сбрасывает дисковый кэш эмбеддингов на диск, если в нем есть несохраненные изменения."""
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _embed_batches(self, texts: List[str]) -> List[List[float]]:
+        """
+        Получает эмбеддинги от сервера, разбивая тексты на батчи.
+        
+        Args:
+            texts (List[str]): Список текстов для создания эмбеддингов.
+        
+        Returns:
+            List[List[float]]: Список эмбеддингов для каждого текста.
+        """
+        embeddings = []
+        for batch_embeddings in self.iter_embeddings(texts):
+            embeddings.extend(batch_embeddings)
         return embeddings
+
+    def iter_embeddings(self, texts: List[str]) -> Iterator[List[List[float]]]:
+        """
+        Отправляет батчи на сервер конвейером: одновременно в обработке до max_in_flight батчей,
+        результаты отдаются по мере готовности строго в порядке батчей.
+        
+        Args:
+            texts (List[str]): Список текстов для создания эмбеддингов.
+        
+        Yields:
+            List[List[float]]: Эмбеддинги очередного батча.
+        """
+        batch_size = self.get_batch_size()
+        if len(texts) <= batch_size:
+            # Один батч (например, запрос пользователя) - пул потоков не нужен
+            if texts:
+                yield self._post_batch(texts)
+            return
+
+        batches = (texts[i:i + batch_size] for i in range(0, len(texts), batch_size))
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = deque()
+            for batch_number, batch_texts in enumerate(batches, start=1):
+                logger.info(f"Обработка батча {batch_number}, размер батча: {len(batch_texts)}")
+                in_flight.append(executor.submit(self._post_batch, batch_texts))
+                # Ждем самый старый батч, только когда конвейер заполнен
+                if len(in_flight) >= self.max_in_flight:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+
+    def get_batch_size(self) -> int:
+        """
+        Возвращает размер батча: max_batch_size из конфига, но не больше --max-client-batch-size сервера.
+        Лимит сервера запрашивается через /info один раз.
+        """
+        if self._server_batch_size is None:
+            try:
+                response = self.session.get(f"http://{self.host}:{self.port}/info", timeout=5)
+                response.raise_for_status()
+                self._server_batch_size = response.json().get("max_client_batch_size") or self.batch_size
+                logger.info(f"Лимит батча сервера эмбеддингов: {self._server_batch_size}")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Запоминаем лимит из конфига, чтобы не ждать таймаут /info на каждом батче
+                logger.warning(f"Не удалось получить лимит батча сервера эмбеддингов, используется max_batch_size: {e}")
+                self._server_batch_size = self.batch_size
+        return min(self.batch_size, self._server_batch_size)
+
+    async def _aembed_batches(self, texts: List[str]) -> List[List[float]]:
+        """Асинхронно получает эмбеддинги от сервера: до max_in_flight батчей одновременно, порядок сохраняется."""
+        if self._server_batch_size is None:
+            # Лимит сервера запрашивается один раз, синхронный запрос уводим из event loop
+            await asyncio.to_thread(self.get_batch_size)
+        batch_size = self.get_batch_size()
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def post_limited(batch_texts):
+            async with semaphore:
+                return await self._apost_batch(batch_texts)
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*(post_limited(batch_texts) for batch_texts in batches))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    async def _apost_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """Асинхронный вариант _post_batch."""
+        response = await self.async_client.get().post(self.embedder_url, json={"inputs": batch_texts})
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 413 and len(batch_texts) > 1:
+            logger.warning(f"Сервер отклонил батч из {len(batch_texts)} текстов, батч разделен пополам")
+            middle = len(batch_texts) // 2
+            return await self._apost_batch(batch_texts[:middle]) + await self._apost_batch(batch_texts[middle:])
+        raise Exception(f"Ошибка при обработке батча: {response.status_code}, {response.text}")
+
+    def _post_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """Отправляет один батч на сервер. Если сервер отклонил батч как слишком большой, делит его пополам."""
+        response = self.session.post(self.embedder_url, json={"inputs": batch_texts}, timeout=self.request_timeout)
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 413 and len(batch_texts) > 1:
+            logger.warning(f"Сервер отклонил батч из {len(batch_texts)} текстов, батч разделен пополам")
+            middle = len(batch_texts) // 2
+            return self._post_batch(batch_texts[:middle]) + self._post_batch(batch_texts[middle:])
+        raise Exception(f"Ошибка при обработке батча: {response.status_code}, {response.text}")
     
     def embed_query(self, text: str) -> List[float]:
         """
@@ -58,7 +235,36 @@ class EmbedderNode:
         Returns:
             List[float]: Эмбеддинг для указанного текста.
         """
-        return self.embed_documents([text])[0]
+        key = self.normalize_query(text)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            # Запросы пользователей не кладем в дисковый кэш чанков
+            embedding = self.embed_documents([text], use_cache=False)[0]
+            self.query_cache.put(key, embedding)
+        logger.debug(f"Кэш эмбеддингов запросов: {self.query_cache.stats()}")
+        return embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Асинхронный вариант embed_query.
+        
+        Args:
+            text (str): Текст для создания эмбеддинга.
+        
+        Returns:
+            List[float]: Эмбеддинг для указанного текста.
+        """
+        key = self.normalize_query(text)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            embedding = (await self.aembed_documents([text], use_cache=False))[0]
+            self.query_cache.put(key, embedding)
+        return embedding
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        """Приводит запрос к виду, используемому как ключ кэша: без лишних пробелов и регистра."""
+        return " ".join(text.split()).casefold()
     
     @staticmethod
     def chunks_to_documents(similar_chunks):
@@ -66,17 +272,20 @@ class EmbedderNode:
         Преобразует список чанков в список объектов Document.
 
         Args:
-            similar_chunks (list): Список кортежей (текст чанка, расстояние до запроса).
+            similar_chunks (list): Список кортежей (текст чанка, расстояние до запроса, длина чанка,
+                url источника, заголовок источника).
 
         Returns:
             list: Список объектов Document.
         """
         documents = []
-        for i, (text, distance, chunk_length) in enumerate(similar_chunks):
+        for i, (text, distance, chunk_length, source_url, source_title) in enumerate(similar_chunks):
             metadata = {
                 "source": f"chunk_{i}",  # Источник чанка
                 "distance": round(distance, 6),   # Расстояние до запроса
-                "chunk_length": chunk_length  # Длина чанка
+                "chunk_length": chunk_length,  # Длина чанка
+                "source_url": source_url,  # url страницы, из которой получен чанк
+                "source_title": source_title  # Заголовок этой страницы
             }
             documents.append(Document(page_content=text, metadata=metadata))
         return documents
@@ -1,7 +1,13 @@
+import asyncio
+import hashlib
 import logging
+from typing import Iterator
+
 import requests
 from elements.QueryElement import QueryElement
 from utils_local.utils import profile_time
+from utils_local.lru_cache import LRUCache
+from utils_local.tokenizer import load_local_tokenizer
 from langchain_openai import ChatOpenAI  
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
 
@@ -18,6 +24,11 @@ class LLMNode:
         self.max_tokens_input = config["max_tokens_input"] 
         self.temperature = config["temperature"]  
         self.max_messages_history = config["max_messages_history"]  
+
+        # Локальный токенизатор модели: размер запроса считается без обращения к /tokenize
+        self.tokenizer = load_local_tokenizer(config["tokenizer_path"])
+        # Число токенов каждого сообщения кэшируется, чтобы не пересчитывать системный промпт и историю чата
+        self.message_tokens_cache = LRUCache(config["message_tokens_cache_size"])
         
         self.openai_api_key = "EMPTY"
         self.openai_api_base = f"http://{self.host}:{self.port}/v1"
@@ -48,78 +59,157 @@ class LLMNode:
         
     @profile_time
     def answer_with_rag(self, query_element: QueryElement, show_data_info=False) -> QueryElement:
+        messages = self._prepare_messages(query_element, self._rag_prompt(query_element), show_data_info)
+        if messages is None:
+            return query_element  # Возвращаем объект без ответа
+
+        # Получаем ответ от модели
+        response = self.chat.invoke(messages)
+        query_element.answer = response.content
+            
+        return query_element
+
+    @profile_time
+    def answer(self, query_element: QueryElement, show_data_info=False) -> QueryElement:
+        messages = self._prepare_messages(query_element, query_element.query, show_data_info)
+        if messages is None:
+            return query_element  # Возвращаем объект с ошибкой
+
+        # Получаем ответ от модели
+        response = self.chat.invoke(messages)
+        query_element.answer = response.content
+            
+        return query_element
+
+    @profile_time
+    async def aanswer_with_rag(self, query_element: QueryElement, show_data_info=False) -> QueryElement:
+        """Асинхронный вариант answer_with_rag."""
+        messages = await self._aprepare_messages(query_element, self._rag_prompt(query_element), show_data_info)
+        if messages is None:
+            return query_element  # Возвращаем объект без ответа
+
+        response = await self.chat.ainvoke(messages)
+        query_element.answer = response.content
+        return query_element
+
+    @profile_time
+    async def aanswer(self, query_element: QueryElement, show_data_info=False) -> QueryElement:
+        """Асинхронный вариант answer."""
+        messages = await self._aprepare_messages(query_element, query_element.query, show_data_info)
+        if messages is None:
+            return query_element  # Возвращаем объект с ошибкой
+
+        response = await self.chat.ainvoke(messages)
+        query_element.answer = response.content
+        return query_element
+
+    def stream_answer_with_rag(self, query_element: QueryElement, show_data_info=False) -> Iterator[str]:
+        """
+        Потоковый вариант answer_with_rag: отдает ответ модели по частям по мере генерации.
+        После завершения генератора полный ответ записан в query_element.answer.
+        """
+        messages = self._prepare_messages(query_element, self._rag_prompt(query_element), show_data_info)
+        if messages is not None:
+            yield from self._stream(messages, query_element)
+
+    def stream_answer(self, query_element: QueryElement, show_data_info=False) -> Iterator[str]:
+        """
+        Потоковый вариант answer: отдает ответ модели по частям по мере генерации.
+        После завершения генератора полный ответ записан в query_element.answer.
+        """
+        messages = self._prepare_messages(query_element, query_element.query, show_data_info)
+        if messages is not None:
+            yield from self._stream(messages, query_element)
+
+    def _stream(self, messages: list, query_element: QueryElement) -> Iterator[str]:
+        parts = []
+        try:
+            for chunk in self.chat.stream(messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        finally:
+            # Даже если генерацию прервали, в историю попадет уже полученная часть ответа
+            query_element.answer = "".join(parts)
+
+    @staticmethod
+    def _rag_prompt(query_element: QueryElement) -> str:
         prompt_chunks = query_element.prompt_chunks
-        
-        examples = "\n".join([f"{i}. {doc.page_content}" for i, doc in enumerate(prompt_chunks, start=1)])
+
+        # Чанки группируются по странице-источнику, заголовок и url источника пишутся один раз на группу.
+        # Группы идут в порядке первого (самого релевантного) чанка
+        groups = {}
+        for doc in prompt_chunks:
+            source = (doc.metadata.get("source_url", ""), doc.metadata.get("source_title", ""))
+            groups.setdefault(source, []).append(doc.page_content)
+
+        parts = []
+        number = 1
+        for (source_url, source_title), texts in groups.items():
+            header = " - ".join(part for part in (source_title, source_url) if part)
+            if header:
+                parts.append(f"[Источник: {header}]")
+            for text in texts:
+                parts.append(f"{number}. {text}")
+                number += 1
+        examples = "\n".join(parts)
 
         if len(prompt_chunks) > 0:
             # Формируем итоговый промпт
-            human_message_content = (
+            return (
                 f"Учитывай информацию из этих отрывков текста если считаешь нужным:\n"
                 f"{examples}\n\n"
                 f"Ответь на вопрос: {query_element.query}"
             )
-        else:
-            # Формируем итоговый промпт
-            human_message_content = (
-                f"Ответь на вопрос: {query_element.query}\n"
-                f"Обязательно укажи, что отвечаешь без учета контекста с представленных сайтов, так как не нашел ничего релевантного"
-            )
-
-        if query_element.previous_messages and query_element.message_number > 0:
-            messages = [self.system_prompt] # Системный промпт
-            messages.extend(query_element.previous_messages) # История чата
-            messages.append(HumanMessage(content=human_message_content)) # Промпт пользователя с примерами
-        else:
-            messages = [
-                self.system_prompt,  # Системный промпт
-                HumanMessage(content=human_message_content)  # Промпт пользователя с примерами
-            ]
-
-        query_element.final_prompt = messages
+        # Формируем итоговый промпт
+        return (
+            f"Ответь на вопрос: {query_element.query}\n"
+            f"Обязательно укажи, что отвечаешь без учета контекста с представленных сайтов, так как не нашел ничего релевантного"
+        )
 
-        if show_data_info:
-            query_element.display_final_prompt()
+    def _prepare_messages(self, query_element: QueryElement, human_message_content: str, show_data_info=False) -> list | None:
+        """
+        Собирает сообщения для модели (системный промпт, история чата, запрос) и проверяет их размер.
+        
+        :return: Список сообщений или None, если запрос превышает лимит токенов.
+        """
+        messages = self._build_messages(query_element, human_message_content, show_data_info)
 
         # Проверяем размер запроса
         try:
             self._validate_prompt_size(messages)
-        except ValueError as e:
-            return query_element  # Возвращаем объект без ответа
+        except ValueError:
+            return None
+        return messages
 
-        # Получаем ответ от модели
-        response = self.chat.invoke(messages)
-        query_element.answer = response.content
-            
-        return query_element
+    async def _aprepare_messages(self, query_element: QueryElement, human_message_content: str, show_data_info=False) -> list | None:
+        """Асинхронный вариант _prepare_messages: подсчет токенов через /tokenize не блокирует event loop."""
+        messages = self._build_messages(query_element, human_message_content, show_data_info)
 
-    @profile_time
-    def answer(self, query_element: QueryElement, show_data_info=False) -> QueryElement:
+        try:
+            if self.tokenizer is not None:
+                self._validate_prompt_size(messages)
+            else:
+                await asyncio.to_thread(self._validate_prompt_size, messages)
+        except ValueError:
+            return None
+        return messages
+
+    def _build_messages(self, query_element: QueryElement, human_message_content: str, show_data_info=False) -> list:
         if query_element.previous_messages and query_element.message_number > 0:
             messages = [self.system_prompt] # Системный промпт
             messages.extend(query_element.previous_messages) # История чата
-            messages.append(HumanMessage(content=query_element.query)) # Промпт пользователя
+            messages.append(HumanMessage(content=human_message_content)) # Промпт пользователя
         else:
             messages = [
                 self.system_prompt,  # Системный промпт
-                HumanMessage(content=query_element.query)  # Промпт пользователя 
+                HumanMessage(content=human_message_content)  # Промпт пользователя
             ]
         query_element.final_prompt = messages
 
         if show_data_info:
             query_element.display_final_prompt()
-
-        # Проверяем размер запроса
-        try:
-            self._validate_prompt_size(messages)
-        except ValueError as e:
-            return query_element  # Возвращаем объект с ошибкой
-
-        # Получаем ответ от модели
-        response = self.chat.invoke(messages)
-        query_element.answer = response.content
-            
-        return query_element
+        return messages
     
     def get_new_history(self, query_element: QueryElement) -> list:
         previous_messages = query_element.previous_messages.copy()
@@ -136,27 +226,53 @@ class LLMNode:
     @profile_time
     def make_abstract(self, query_element: QueryElement) -> str:
         if query_element.previous_messages and query_element.message_number > 0:
-            messages = [
-                SystemMessage(content="Вы полезный помощник, который отвечает на вопросы очень кратко в одно предложение.")
-            ]
-            messages.extend(query_element.previous_messages)  # История чата
-            # Уточненный промпт
-            prompt = (
-                f'Перефразируй запрос пользователя, дополнив его информацией из контекста прошлых сообщений. '
-                f'Не отвечай на сам запрос, только уточни или дополни его! '
-                f'Запрос пользователя: "{query_element.query}"'
-            )
-            messages.append(HumanMessage(content=prompt))  # Промпт пользователя
-            
             # Получаем ответ от модели
-            response = self.chat.invoke(messages)
+            response = self.chat.invoke(self._abstract_messages(query_element))
+            abstract = response.content[:1000]
+            logger.info(f"Измененный текст сообщения для получения эмеддингов: {abstract}")
+            return abstract
+        else:
+            return query_element.query
+
+    @profile_time
+    async def amake_abstract(self, query_element: QueryElement) -> str:
+        """Асинхронный вариант make_abstract."""
+        if query_element.previous_messages and query_element.message_number > 0:
+            response = await self.chat.ainvoke(self._abstract_messages(query_element))
             abstract = response.content[:1000]
             logger.info(f"Измененный текст сообщения для получения эмеддингов: {abstract}")
             return abstract
         else:
             return query_element.query
 
+    @staticmethod
+    def _abstract_messages(query_element: QueryElement) -> list:
+        messages = [
+            SystemMessage(content="Вы полезный помощник, который отвечает на вопросы очень кратко в одно предложение.")
+        ]
+        messages.extend(query_element.previous_messages)  # История чата
+        # Уточненный промпт
+        prompt = (
+            f'Перефразируй запрос пользователя, дополнив его информацией из контекста прошлых сообщений. '
+            f'Не отвечай на сам запрос, только уточни или дополни его! '
+            f'Запрос пользователя: "{query_element.query}"'
+        )
+        messages.append(HumanMessage(content=prompt))  # Промпт пользователя
+        return messages
+
     def count_tokens(self, text: str) -> int:
+        """
+        Подсчитывает количество токенов в заданном тексте локальным токенизатором,
+        а если он недоступен - через эндпоинт /tokenize.
+
+        :param text: Текст, для которого нужно подсчитать токены.
+        :return: Количество токенов в тексте.
+        """
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return self._count_tokens_remote(text)
+
+    def _count_tokens_remote(self, text: str) -> int:
         """
         Подсчитывает количество токенов в заданном тексте через эндпоинт /tokenize.
 
@@ -181,34 +297,49 @@ class LLMNode:
         except requests.exceptions.RequestException as e:
             print(f"Ошибка при подсчете токенов: {e}")
             return -1  # Возвращаем -1 в случае ошибки
+
+    def _count_message_tokens(self, message_text: str) -> int:
+        """
+        Подсчитывает токены одного сообщения локальным токенизатором с кэшированием по содержимому.
+        :param message_text: Текст сообщения в формате _message_to_text.
+        :return: Количество токенов в сообщении.
+        """
+        key = hashlib.sha1(message_text.encode("utf-8")).digest()
+        tokens_count = self.message_tokens_cache.get(key)
+        if tokens_count is None:
+            tokens_count = self.count_tokens(message_text)
+            self.message_tokens_cache.put(key, tokens_count)
+        return tokens_count
         
-    def _messages_to_text(self, messages: list) -> str:
-        """
-        Преобразует список сообщений в одну строку для подсчета символов и токенов.
-        :param messages: Список сообщений.
-        :return: Объединенный текст всех сообщений.
-        """
-        text_parts = []
-        for message in messages:
-            if isinstance(message, SystemMessage):
-                text_parts.append(f"<|system|>{message.content}<|end|>")
-            elif isinstance(message, HumanMessage):
-                text_parts.append(f"<|user|>{message.content}<|end|>")
-            elif isinstance(message, AIMessage):
-                text_parts.append(f"<|assistant|>{message.content}<|end|>")
-        return "\n".join(text_parts)
-    
+    @staticmethod
+    def _message_to_text(message) -> str:
+        """
+        Преобразует одно сообщение в строку для подсчета символов и токенов.
+        :param message: Сообщение.
+        :return: Текст сообщения с разметкой роли (пустая строка для неизвестных типов сообщений).
+        """
+        if isinstance(message, SystemMessage):
+            return f"<|system|>{message.content}<|end|>"
+        if isinstance(message, HumanMessage):
+            return f"<|user|>{message.content}<|end|>"
+        if isinstance(message, AIMessage):
+            return f"<|assistant|>{message.content}<|end|>"
+        return ""
+
     def _validate_prompt_size(self, messages: list):
         """
         Проверяет размер запроса (символы и токены) и выбрасывает ошибку, если он превышает лимит.
         :param messages: Список сообщений для проверки.
         """
-        # Преобразуем сообщения в строку для подсчета символов и токенов
-        full_prompt_text = self._messages_to_text(messages)
+        message_texts = [text for text in map(self._message_to_text, messages) if text]
 
-        # Подсчет длины в символах
-        symbols_count = len(full_prompt_text)
-        tokens_count = self.count_tokens(full_prompt_text)
+        # Подсчет длины в символах (сообщения разделяются переводом строки)
+        symbols_count = sum(len(text) for text in message_texts) + max(len(message_texts) - 1, 0)
+        if self.tokenizer is not None:
+            # Локально и по сообщениям: токены истории чата берутся из кэша, разделители считаем по токену
+            tokens_count = sum(self._count_message_tokens(text) for text in message_texts) + max(len(message_texts) - 1, 0)
+        else:
+            tokens_count = self._count_tokens_remote("\n".join(message_texts))
         logging.info(f"Размер запроса: {symbols_count} символов, {tokens_count} токенов")
 
         # Проверяем лимит по токенам
@@ -0,0 +1,370 @@
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LexicalIndexNode:
+    """
+    Модуль лексического поиска BM25 по чанкам коллекции. Индекс хранится на диске рядом с векторной БД
+    в виде сегментов: в каждом сегменте постинги в формате CSR (indptr / doc_ids / tfs в .npy, читаются через mmap)
+    и тексты чанков. Новые чанки добавляются новым сегментом, удаленные помечаются в манифесте,
+    сегменты похожего размера сливаются по уровням, а при накоплении удалений индекс сливается в один сегмент.
+    Находит точные совпадения идентификаторов, кодов ошибок и названий, которые плохо ловит векторный поиск.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")  # Слова и составные идентификаторы (v2.5.4, ERR-404)
+    PART_PATTERN = re.compile(r"[-.]")
+
+    # Открытые индексы, общие для всех экземпляров узла в процессе: путь к папке индекса -> состояние
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, config) -> None:
+        self.enabled = config["enabled"]
+        self.data_dir = config["data_dir"]  # Папка с индексами коллекций
+        self.k1 = config["k1"]  # Насыщение частоты термина в BM25
+        self.b = config["b"]  # Нормировка по длине чанка в BM25
+        self.top_k = config["top_k"]  # Сколько чанков возвращает лексический поиск
+        self.merge_factor = max(2, config["merge_factor"])  # Сколько сегментов одного уровня сливаются в один
+        self.merge_deleted_ratio = config["merge_deleted_ratio"]  # При такой доле удаленных чанков индекс сливается
+
+        if self.enabled:
+            os.makedirs(self.data_dir, exist_ok=True)
+
+    @classmethod
+    def tokenize(cls, text: str) -> list[str]:
+        """Разбивает текст на термины: слова в нижнем регистре, составные идентификаторы и их части."""
+        tokens = []
+        for token in cls.TOKEN_PATTERN.findall(text.casefold()):
+            tokens.append(token)
+            if "-" in token or "." in token:
+                tokens.extend(part for part in cls.PART_PATTERN.split(token) if part)
+        return tokens
+
+    def _index_dir(self, collection_name: str) -> str:
+        return os.path.join(self.data_dir, collection_name)
+
+    def has_index(self, collection_name: str) -> bool:
+        return self.enabled and self._get_state(collection_name) is not None
+
+    def _get_state(self, collection_name: str, create: bool = False) -> dict | None:
+        index_dir = self._index_dir(collection_name)
+        with self._indexes_lock:
+            state = self._indexes.get(index_dir)
+            if state is not None:
+                return state
+            manifest_path = os.path.join(index_dir, self.MANIFEST_FILE)
+            if os.path.isfile(manifest_path):
+                state = self._load_state(index_dir)
+            elif create:
+                os.makedirs(index_dir, exist_ok=True)
+                state = {"dir": index_dir, "lock": threading.Lock(), "segments": [], "next_segment": 0, "locations": {}}
+                self._write_manifest(state)
+            else:
+                return None
+            self._indexes[index_dir] = state
+            return state
+
+    def _load_state(self, index_dir: str) -> dict:
+        with open(os.path.join(index_dir, self.MANIFEST_FILE), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        state = {"dir": index_dir, "lock": threading.Lock(), "segments": [], "next_segment": manifest["next_segment"], "locations": {}}
+        for segment_info in manifest["segments"]:
+            segment = self._load_segment(index_dir, segment_info["name"])
+            for local in segment_info["deleted"]:
+                self._mark_deleted(segment, local)
+            self._add_segment(state, segment)
+        return state
+
+    def _write_manifest(self, state: dict) -> None:
+        manifest = {
+            "next_segment": state["next_segment"],
+            "segments": [
+                {"name": segment["name"], "deleted": np.flatnonzero(segment["deleted"]).tolist()}
+                for segment in state["segments"]
+            ],
+        }
+        manifest_path = os.path.join(state["dir"], self.MANIFEST_FILE)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, manifest_path)
+
+    def _write_segment(self, index_dir: str, name: str, docs: list[tuple[str, str, str, str]]) -> None:
+        """Строит сегмент из кортежей (хэш чанка, текст, url источника, заголовок источника) и записывает его в папку name."""
+        term_ids = {}
+        postings = {}  # id термина -> [(номер чанка в сегменте, частота)]
+        doc_lengths = np.zeros(len(docs), dtype=np.int32)
+        for local, (_, text, _, _) in enumerate(docs):
+            counts = Counter(self.tokenize(text))
+            doc_lengths[local] = sum(counts.values())
+            for term, tf in counts.items():
+                term_id = term_ids.setdefault(term, len(term_ids))
+                postings.setdefault(term_id, []).append((local, tf))
+
+        indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        for term_id, term_postings in postings.items():
+            indptr[term_id + 1] = len(term_postings)
+        indptr = np.cumsum(indptr)
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.uint16)
+        for term_id, term_postings in postings.items():
+            term_postings = np.asarray(term_postings, dtype=np.int64)
+            start, end = indptr[term_id], indptr[term_id + 1]
+            doc_ids[start:end] = term_postings[:, 0]
+            tfs[start:end] = np.minimum(term_postings[:, 1], np.iinfo(np.uint16).max)
+
+        segment_dir = os.path.join(index_dir, name)
+        os.makedirs(segment_dir, exist_ok=True)
+        with open(os.path.join(segment_dir, "terms.json"), "w", encoding="utf-8") as file:
+            json.dump(list(term_ids), file, ensure_ascii=False)
+        np.save(os.path.join(segment_dir, "indptr.npy"), indptr)
+        np.save(os.path.join(segment_dir, "doc_ids.npy"), doc_ids)
+        np.save(os.path.join(segment_dir, "tfs.npy"), tfs)
+        np.save(os.path.join(segment_dir, "doc_lengths.npy"), doc_lengths)
+        with open(os.path.join(segment_dir, "docs.jsonl"), "w", encoding="utf-8") as file:
+            for chunk_hash, text, source_url, source_title in docs:
+                doc = {"hash": chunk_hash, "text": text, "source_url": source_url, "source_title": source_title}
+                file.write(json.dumps(doc, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _load_segment(index_dir: str, name: str) -> dict:
+        segment_dir = os.path.join(index_dir, name)
+        with open(os.path.join(segment_dir, "terms.json"), "r", encoding="utf-8") as file:
+            terms = {term: term_id for term_id, term in enumerate(json.load(file))}
+        hashes = []
+        texts = []
+        sources = []
+        titles = []
+        with open(os.path.join(segment_dir, "docs.jsonl"), "r", encoding="utf-8") as file:
+            for line in file:
+                doc = json.loads(line)
+                hashes.append(doc["hash"])
+                texts.append(doc["text"])
+                # В сегментах старого формата источник не хранится
+                sources.append(doc.get("source_url", ""))
+                titles.append(doc.get("source_title", ""))
+        doc_lengths = np.load(os.path.join(segment_dir, "doc_lengths.npy"))
+        return {
+            "name": name,
+            "terms": terms,
+            "indptr": np.load(os.path.join(segment_dir, "indptr.npy"), mmap_mode="r"),
+            "doc_ids": np.load(os.path.join(segment_dir, "doc_ids.npy"), mmap_mode="r"),
+            "tfs": np.load(os.path.join(segment_dir, "tfs.npy"), mmap_mode="r"),
+            "doc_lengths": doc_lengths,
+            "hashes": hashes,
+            "texts": texts,
+            "sources": sources,
+            "titles": titles,
+            "deleted": np.zeros(len(hashes), dtype=bool),
+            "alive_count": len(hashes),
+            "alive_length": int(doc_lengths.sum()),
+        }
+
+    @staticmethod
+    def _mark_deleted(segment: dict, local: int) -> bool:
+        if segment["deleted"][local]:
+            return False
+        segment["deleted"][local] = True
+        segment["alive_count"] -= 1
+        segment["alive_length"] -= int(segment["doc_lengths"][local])
+        return True
+
+    @staticmethod
+    def _add_segment(state: dict, segment: dict) -> None:
+        state["segments"].append(segment)
+        for local, chunk_hash in enumerate(segment["hashes"]):
+            if not segment["deleted"][local]:
+                state["locations"].setdefault(chunk_hash, []).append((segment, local))
+
+    def add_chunks(
+        self, collection_name: str, chunks: list[str], chunk_hashes: list[str],
+        sources: list[str] | None = None, titles: list[str] | None = None
+    ) -> None:
+        """
+        Добавляет чанки в индекс коллекции (создает индекс, если его нет).
+
+        Args:
+            collection_name (str): Имя коллекции.
+            chunks (list): Тексты чанков.
+            chunk_hashes (list): Хэши чанков, по которым они потом удаляются.
+            sources (list): url источника для каждого чанка (по умолчанию пустые строки).
+            titles (list): Заголовок страницы-источника для каждого чанка (по умолчанию пустые строки).
+        """
+        if not self.enabled or not chunks:
+            return
+        state = self._get_state(collection_name, create=True)
+        with state["lock"]:
+            name = f"segment_{state['next_segment']}"
+            sources = sources if sources is not None else [""] * len(chunks)
+            titles = titles if titles is not None else [""] * len(chunks)
+            self._write_segment(state["dir"], name, list(zip(chunk_hashes, chunks, sources, titles)))
+            state["next_segment"] += 1
+            self._add_segment(state, self._load_segment(state["dir"], name))
+            self._write_manifest(state)
+            self._merge_tiers(state)
+        logger.info(f"В лексический индекс '{collection_name}' добавлено {len(chunks)} чанков")
+
+    def delete_chunks(self, collection_name: str, chunk_hashes: list[str]) -> None:
+        """Помечает удаленными чанки с указанными хэшами."""
+        state = self._get_state(collection_name) if self.enabled else None
+        if state is None or not chunk_hashes:
+            return
+        deleted = 0
+        with state["lock"]:
+            for chunk_hash in chunk_hashes:
+                for segment, local in state["locations"].pop(chunk_hash, []):
+                    deleted += self._mark_deleted(segment, local)
+            total = sum(len(segment["hashes"]) for segment in state["segments"])
+            alive = sum(segment["alive_count"] for segment in state["segments"])
+            if total and (total - alive) > self.merge_deleted_ratio * total:
+                self._merge(state, state["segments"])
+            else:
+                self._write_manifest(state)
+        logger.info(f"Из лексического индекса '{collection_name}' удалено {deleted} чанков")
+
+    def _tier(self, segment: dict) -> int:
+        """Уровень сегмента: сегменты одного уровня отличаются по числу живых чанков меньше чем в merge_factor раз."""
+        tier = 0
+        size = segment["alive_count"]
+        while size >= self.merge_factor:
+            size //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge_tiers(self, state: dict) -> None:
+        """
+        Сливает сегменты по уровням: как только на одном уровне набирается merge_factor сегментов,
+        они сливаются в один сегмент следующего уровня. Каждый чанк переписывается не больше чем
+        log(число чанков) раз, поэтому суммарный объем записи растет как n log n, а не квадратично.
+        """
+        while True:
+            tiers = {}
+            for segment in state["segments"]:
+                tiers.setdefault(self._tier(segment), []).append(segment)
+            full_tiers = [segments for _, segments in sorted(tiers.items()) if len(segments) >= self.merge_factor]
+            if not full_tiers:
+                return
+            self._merge(state, full_tiers[0][:self.merge_factor])
+
+    def _merge(self, state: dict, segments: list[dict]) -> None:
+        """Сливает указанные сегменты в один без удаленных чанков."""
+        docs = [
+            (segment["hashes"][local], segment["texts"][local], segment["sources"][local], segment["titles"][local])
+            for segment in segments
+            for local in np.flatnonzero(~segment["deleted"])
+        ]
+        merged = {id(segment) for segment in segments}
+        name = f"segment_{state['next_segment']}"
+        self._write_segment(state["dir"], name, docs)
+        state["next_segment"] += 1
+        state["segments"] = [segment for segment in state["segments"] if id(segment) not in merged]
+        for segment in segments:
+            for chunk_hash in segment["hashes"]:
+                locations = [location for location in state["locations"].get(chunk_hash, []) if id(location[0]) not in merged]
+                if locations:
+                    state["locations"][chunk_hash] = locations
+                else:
+                    state["locations"].pop(chunk_hash, None)
+        self._add_segment(state, self._load_segment(state["dir"], name))
+        self._write_manifest(state)
+        for segment in segments:
+            shutil.rmtree(os.path.join(state["dir"], segment["name"]), ignore_errors=True)
+        logger.info(
+            f"Лексический индекс '{os.path.basename(state['dir'])}': {len(segments)} сегментов слиты в один "
+            f"({len(docs)} чанков), всего сегментов {len(state['segments'])}"
+        )
+
+    def delete_collection(self, collection_name: str) -> None:
+        """Удаляет индекс коллекции."""
+        index_dir = self._index_dir(collection_name)
+        with self._indexes_lock:
+            self._indexes.pop(index_dir, None)
+        if os.path.isdir(index_dir):
+            shutil.rmtree(index_dir)
+            logger.info(f"Лексический индекс '{collection_name}' удален")
+
+    def search(self, collection_name: str, query: str, top_k: int | None = None, source_urls: list[str] | None = None) -> list[tuple]:
+        """
+        Ищет чанки по BM25.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            query (str): Текст запроса.
+            top_k (int): Сколько чанков вернуть (по умолчанию top_k из конфига).
+            source_urls (list): Искать только среди чанков с этих url (None - по всей коллекции).
+
+        Returns:
+            list: Список кортежей (текст чанка, оценка BM25, длина чанка, url источника, заголовок источника)
+            по убыванию оценки.
+        """
+        state = self._get_state(collection_name) if self.enabled else None
+        if state is None:
+            return []
+        top_k = top_k or self.top_k
+        terms = set(self.tokenize(query))
+
+        with state["lock"]:
+            segments = [dict(segment, deleted=segment["deleted"].copy()) for segment in state["segments"]]
+        num_docs = sum(segment["alive_count"] for segment in segments)
+        if num_docs == 0 or not terms:
+            return []
+        avg_length = sum(segment["alive_length"] for segment in segments) / num_docs
+
+        # df и idf по живым чанкам всех сегментов: удаленные, но еще не слитые чанки не учитываются,
+        # иначе df может превысить num_docs и idf часто встречающихся терминов занижается
+        idf = {}
+        for term in terms:
+            df = 0
+            for segment in segments:
+                term_id = segment["terms"].get(term)
+                if term_id is None:
+                    continue
+                start, end = segment["indptr"][term_id], segment["indptr"][term_id + 1]
+                if segment["alive_count"] == len(segment["hashes"]):
+                    df += int(end - start)
+                else:
+                    df += int(np.count_nonzero(~segment["deleted"][segment["doc_ids"][start:end]]))
+            if df:
+                idf[term] = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+        allowed = set(source_urls) if source_urls is not None else None
+        candidates = []  # (оценка, сегмент, номер чанка в сегменте)
+        for segment in segments:
+            scores = np.zeros(len(segment["hashes"]), dtype=np.float32)
+            for term, term_idf in idf.items():
+                term_id = segment["terms"].get(term)
+                if term_id is None:
+                    continue
+                start, end = segment["indptr"][term_id], segment["indptr"][term_id + 1]
+                doc_ids = segment["doc_ids"][start:end]
+                tfs = segment["tfs"][start:end].astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * segment["doc_lengths"][doc_ids] / avg_length)
+                scores[doc_ids] += term_idf * tfs * (self.k1 + 1) / (tfs + norm)
+            scores[segment["deleted"]] = 0
+            if allowed is not None:
+                scores[[source not in allowed for source in segment["sources"]]] = 0
+            found = np.flatnonzero(scores > 0)
+            if len(found) > top_k:
+                found = found[np.argpartition(-scores[found], top_k - 1)[:top_k]]
+            candidates.extend((float(scores[local]), segment, local) for local in found)
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        similar_chunks = []
+        seen_text = set()
+        for score, segment, local in candidates:
+            text = segment["texts"][local]
+            if text not in seen_text:
+                seen_text.add(text)
+                similar_chunks.append((text, score, len(text), segment["sources"][local], segment["titles"][local]))
+            if len(similar_chunks) == top_k:
+                break
+        return similar_chunks
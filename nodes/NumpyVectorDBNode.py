@@ -0,0 +1,638 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class NumpyVectorDBNode:
+    """
+    Векторная база данных внутри процесса приложения с тем же интерфейсом, что у VectorDBNode.
+    Эмбеддинги коллекции хранятся на диске в memory-mapped матрице (float32 или float16), тексты и метаданные
+    чанков - в JSONL файле. Поиск точный: скалярное произведение запроса со всей матрицей и argpartition.
+    Подходит для коллекций до нескольких сотен тысяч чанков и для запуска без Milvus.
+    """
+
+    META_FILE = "meta.json"
+    VECTORS_FILE = "vectors.bin"
+    RECORDS_FILE = "records.jsonl"
+    DELETED_FILE = "deleted.json"
+    COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")  # Те же правила, что у имен коллекций Milvus
+
+    # Версии коллекций, общие для всех экземпляров узла в процессе (см. VectorDBNode)
+    _collection_versions = {}
+    _versions_lock = threading.Lock()
+
+    # Открытые коллекции, общие для всех экземпляров узла в процессе: путь к папке коллекции -> состояние
+    _collections = {}
+    _collections_lock = threading.Lock()
+
+    def __init__(self, config) -> None:
+        self.dim = config["dim"]
+        self.top_k = config["top_k"]
+
+        numpy_config = config["numpy"]
+        self.data_dir = numpy_config["data_dir"]  # Папка, в которой лежат коллекции
+        self.dtype = np.dtype(numpy_config["dtype"])  # Тип хранения эмбеддингов: float32 или float16
+        self.initial_capacity = numpy_config["initial_capacity"]  # Начальное число строк матрицы, дальше растет вдвое
+        self.compact_deleted_ratio = numpy_config["compact_deleted_ratio"]  # Доля удаленных строк для уплотнения
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        logger.info(f"Numpy vector store at '{self.data_dir}' is ready.")
+
+    def get_collection_version(self, collection_name):
+        """
+        Возвращает версию коллекции: число, которое меняется при каждом создании, удалении
+        или изменении данных коллекции через этот процесс.
+        """
+        with self._versions_lock:
+            return self._collection_versions.get(collection_name, 0)
+
+    def _bump_collection_version(self, collection_name):
+        with self._versions_lock:
+            self._collection_versions[collection_name] = self._collection_versions.get(collection_name, 0) + 1
+
+    def _collection_dir(self, collection_name):
+        return os.path.join(self.data_dir, collection_name)
+
+    def _get_state(self, collection_name):
+        """Возвращает состояние открытой коллекции, при первом обращении загружает ее с диска."""
+        collection_dir = self._collection_dir(collection_name)
+        with self._collections_lock:
+            state = self._collections.get(collection_dir)
+            if state is not None:
+                return state
+            if not os.path.isfile(os.path.join(collection_dir, self.META_FILE)):
+                return None
+            state = self._load_state(collection_dir)
+            self._collections[collection_dir] = state
+            return state
+
+    def _load_state(self, collection_dir):
+        with open(os.path.join(collection_dir, self.META_FILE), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        count = meta["count"]
+
+        # meta - точка фиксации вставки: строки records.jsonl после первых count (прерванная вставка) отрезаются,
+        # иначе следующая вставка допишется после них и номера строк разойдутся с номерами строк матрицы
+        records = []
+        records_size = 0
+        records_path = os.path.join(collection_dir, self.RECORDS_FILE)
+        with open(records_path, "rb") as file:
+            for line in file:
+                if len(records) == count:
+                    break
+                records.append(json.loads(line))
+                records_size += len(line)
+        if os.path.getsize(records_path) > records_size:
+            logger.warning(f"Collection '{os.path.basename(collection_dir)}': dropping records of an interrupted insert.")
+            with open(records_path, "r+b") as file:
+                file.truncate(records_size)
+
+        deleted_path = os.path.join(collection_dir, self.DELETED_FILE)
+        deleted_ids = set()
+        if os.path.exists(deleted_path):
+            with open(deleted_path, "r", encoding="utf-8") as file:
+                deleted_ids = set(json.load(file))
+
+        state = self._empty_state(collection_dir, meta["dim"], np.dtype(meta["dtype"]))
+        state["capacity"] = meta["capacity"]
+        state["next_id"] = meta["next_id"]
+        state["records_size"] = records_size
+        if state["capacity"] > 0:
+            state["vectors"] = np.memmap(
+                os.path.join(collection_dir, self.VECTORS_FILE), dtype=state["dtype"], mode="r+",
+                shape=(state["capacity"], state["dim"])
+            )
+        state["alive"] = np.zeros(state["capacity"], dtype=bool)
+        self._append_records(state, records)
+        for record_id in deleted_ids:
+            row = state["rows"].get(record_id)
+            if row is not None:
+                state["alive"][row] = False
+        state["deleted_ids"] = deleted_ids
+        logger.info(f"Collection '{os.path.basename(collection_dir)}' loaded: {count - len(deleted_ids)} records.")
+        return state
+
+    @staticmethod
+    def _empty_state(collection_dir, dim, dtype):
+        return {
+            "dir": collection_dir,
+            "lock": threading.Lock(),
+            "dim": dim,
+            "dtype": dtype,
+            "capacity": 0,
+            "count": 0,
+            "next_id": 0,
+            "records_size": 0,  # Размер records.jsonl в байтах по зафиксированным записям
+            "vectors": None,  # np.memmap (capacity, dim)
+            "alive": np.zeros(0, dtype=bool),  # строка не удалена
+            "ids": [],
+            "texts": [],
+            "lengths": [],
+            "times": [],
+            "hashes": [],
+            "sources": [],
+            "titles": [],
+            "rows": {},  # id записи -> номер строки
+            "deleted_ids": set(),
+        }
+
+    @staticmethod
+    def _append_records(state, records):
+        count = state["count"]
+        for i, record in enumerate(records):
+            state["ids"].append(record["id"])
+            state["texts"].append(record["text"])
+            state["lengths"].append(record["chunk_length"])
+            state["times"].append(record["time_insert"])
+            state["hashes"].append(record["chunk_hash"])
+            state["sources"].append(record["source_url"])
+            state["titles"].append(record.get("source_title", ""))  # В коллекциях старого формата заголовка нет
+            state["rows"][record["id"]] = count + i
+        state["alive"][count:count + len(records)] = True
+        state["count"] = count + len(records)
+
+    def _write_meta(self, state):
+        meta = {
+            "dim": state["dim"],
+            "dtype": state["dtype"].name,
+            "capacity": state["capacity"],
+            "count": state["count"],
+            "next_id": state["next_id"],
+        }
+        meta_path = os.path.join(state["dir"], self.META_FILE)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, meta_path)
+
+    def _write_deleted(self, state):
+        deleted_path = os.path.join(state["dir"], self.DELETED_FILE)
+        tmp_path = deleted_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(sorted(state["deleted_ids"]), file)
+        os.replace(tmp_path, deleted_path)
+
+    def _ensure_capacity(self, state, required_rows):
+        """Увеличивает файл и матрицу эмбеддингов (вдвое), если в них не помещается required_rows строк."""
+        if required_rows <= state["capacity"]:
+            return
+        capacity = max(required_rows, 2 * state["capacity"], self.initial_capacity)
+        vectors_path = os.path.join(state["dir"], self.VECTORS_FILE)
+        if state["vectors"] is not None:
+            state["vectors"].flush()
+        with open(vectors_path, "r+b") as file:
+            file.truncate(capacity * state["dim"] * state["dtype"].itemsize)
+        state["vectors"] = np.memmap(vectors_path, dtype=state["dtype"], mode="r+", shape=(capacity, state["dim"]))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:state["count"]] = state["alive"][:state["count"]]
+        state["alive"] = alive
+        state["capacity"] = capacity
+
+    def db_has_collection(self, collection_name):
+        # проверка наличия коллекции
+        return self._get_state(collection_name) is not None
+
+    async def adb_has_collection(self, collection_name):
+        """Асинхронный вариант db_has_collection."""
+        return await asyncio.to_thread(self.db_has_collection, collection_name)
+
+    def create_milvus_collection(self, collection_name, expected_rows=0):
+        """
+        Создает новую пустую коллекцию, если она еще не существует.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            expected_rows (int): Не используется (для совместимости с VectorDBNode).
+        """
+        if self.db_has_collection(collection_name):
+            logger.info(f"Collection '{collection_name}' already exists.")
+            return
+
+        if self.dim <= 0:
+            logger.error("Dimension must be greater than 0.")
+            return
+
+        if not self.COLLECTION_NAME_PATTERN.match(collection_name):
+            logger.error(f"Failed to create collection '{collection_name}': name must contain only letters, digits and underscores.")
+            return
+
+        collection_dir = self._collection_dir(collection_name)
+        os.makedirs(collection_dir, exist_ok=True)
+        open(os.path.join(collection_dir, self.VECTORS_FILE), "wb").close()
+        open(os.path.join(collection_dir, self.RECORDS_FILE), "w", encoding="utf-8").close()
+        state = self._empty_state(collection_dir, self.dim, self.dtype)
+        self._write_deleted(state)
+        self._write_meta(state)
+        with self._collections_lock:
+            self._collections[collection_dir] = state
+        logger.info(f"Collection '{collection_name}' created successfully.")
+        self._bump_collection_version(collection_name)
+
+    def create_index(self, collection_name, field_name="embedding", index_params=None):
+        """Поиск всегда точный, индекс не строится (метод для совместимости с VectorDBNode)."""
+        logger.info(f"Collection '{collection_name}' uses exact search, no index is built.")
+
+    def get_index_info(self, collection_name):
+        """Возвращает описание индекса коллекции {"index_type", "params"} или None."""
+        return {"index_type": "FLAT", "params": {}} if self.db_has_collection(collection_name) else None
+
+    def index_needs_rebuild(self, collection_name):
+        """Индекс не используется, перестраивать нечего (метод для совместимости с VectorDBNode)."""
+        return None
+
+    def optimize_index(self, collection_name):
+        """Индекс не используется, перестраивать нечего (метод для совместимости с VectorDBNode)."""
+        return False
+
+    def delete_milvus_collection(self, collection_name):
+        """
+        Удаляет коллекцию, если она существует.
+
+        Args:
+            collection_name (str): Имя коллекции для удаления.
+        """
+        collection_dir = self._collection_dir(collection_name)
+        if self.db_has_collection(collection_name):
+            with self._collections_lock:
+                self._collections.pop(collection_dir, None)
+            shutil.rmtree(collection_dir)
+            logger.info(f"Collection '{collection_name}' deleted successfully.")
+            self._bump_collection_version(collection_name)
+        else:
+            logger.warning(f"Collection '{collection_name}' does not exist.")
+
+    def list_milvus_collections(self):
+        """
+        Возвращает список всех коллекций.
+
+        Returns:
+            list: Список имен коллекций.
+        """
+        collections = sorted(
+            name for name in os.listdir(self.data_dir)
+            if os.path.isfile(os.path.join(self.data_dir, name, self.META_FILE))
+        )
+        logger.info(f"Available collections: {collections}")
+        return collections
+
+    def display_first_n_records(self, collection_name, n=5):
+        """
+        Отображает первые N записей из указанной коллекции.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            n (int): Количество записей для отображения.
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        with state["lock"]:
+            rows = np.flatnonzero(state["alive"][:state["count"]])[:n]
+            logger.info(f"First {n} records in collection '{collection_name}':")
+            for row in rows:
+                logger.info(
+                    f"ID: {state['ids'][row]}, Text: {state['texts'][row][:50]}..., "
+                    f"Length: {state['lengths'][row]}, Timestamp: {state['times'][row]}"
+                )
+
+    def get_total_records(self, collection_name):
+        """
+        Возвращает общее количество записей в указанной коллекции.
+
+        Args:
+            collection_name (str): Имя коллекции.
+
+        Returns:
+            int: Общее количество записей в коллекции.
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        with state["lock"]:
+            return state["count"] - len(state["deleted_ids"])
+
+    @staticmethod
+    def chunk_hash(text, source_url="", source_title=""):
+        """
+        Возвращает хэш чанка, по которому определяются новые и устаревшие чанки.
+        В хэш входят url и заголовок источника: при их изменении запись пересоздается с новыми метаданными.
+
+        Args:
+            text (str): Текст чанка.
+            source_url (str): url страницы-источника.
+            source_title (str): Заголовок страницы-источника.
+
+        Returns:
+            str: sha256 в виде hex-строки (64 символа).
+        """
+        return hashlib.sha256(f"{text}\0{source_url}\0{source_title}".encode("utf-8")).hexdigest()
+
+    def supports_incremental(self, collection_name):
+        """Коллекции всегда хранят хэши чанков, поэтому обновляются инкрементально, если существуют."""
+        return self.db_has_collection(collection_name)
+
+    def get_chunk_hashes(self, collection_name, batch_size=5000):
+        """
+        Возвращает хэши всех чанков коллекции вместе с id записей.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            batch_size (int): Не используется (для совместимости с VectorDBNode).
+
+        Returns:
+            dict: Словарь {хэш чанка: {"source_url": url источника, "ids": [id записей с этим хэшем]}}.
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return {}
+
+        chunk_hashes = {}
+        with state["lock"]:
+            for row in np.flatnonzero(state["alive"][:state["count"]]):
+                entry = chunk_hashes.setdefault(state["hashes"][row], {"source_url": state["sources"][row], "ids": []})
+                entry["ids"].append(state["ids"][row])
+        return chunk_hashes
+
+    def iter_embeddings(self, collection_name, batch_size=5000):
+        """
+        Читает все эмбеддинги коллекции пачками.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            batch_size (int): Сколько записей отдавать за раз.
+
+        Yields:
+            tuple: (список id, np.ndarray эмбеддингов float32 размера len(ids) x dim).
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        with state["lock"]:
+            vectors = state["vectors"]
+            rows = np.flatnonzero(state["alive"][:state["count"]])
+            ids = state["ids"]
+        for i in range(0, len(rows), batch_size):
+            batch_rows = rows[i:i + batch_size]
+            yield [ids[row] for row in batch_rows], np.asarray(vectors[batch_rows], dtype=np.float32)
+
+    def delete_records(self, collection_name, ids, batch_size=5000):
+        """
+        Удаляет записи коллекции по их id. Строки помечаются удаленными, а когда их доля превышает
+        compact_deleted_ratio, файлы коллекции переписываются без них.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            ids (list): Список id записей для удаления.
+            batch_size (int): Не используется (для совместимости с VectorDBNode).
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        deleted = 0
+        with state["lock"]:
+            for record_id in ids:
+                row = state["rows"].get(record_id)
+                if row is not None and state["alive"][row]:
+                    state["alive"][row] = False
+                    state["deleted_ids"].add(record_id)
+                    deleted += 1
+            if state["deleted_ids"] and len(state["deleted_ids"]) > self.compact_deleted_ratio * state["count"]:
+                self._compact(state)
+            else:
+                self._write_deleted(state)
+        logger.info(f"Deleted {deleted} records from collection '{collection_name}'.")
+        self._bump_collection_version(collection_name)
+
+    def _compact(self, state):
+        """Переписывает файлы коллекции без удаленных строк."""
+        rows = np.flatnonzero(state["alive"][:state["count"]])
+        records = [
+            {
+                "id": state["ids"][row],
+                "text": state["texts"][row],
+                "chunk_length": state["lengths"][row],
+                "time_insert": state["times"][row],
+                "chunk_hash": state["hashes"][row],
+                "source_url": state["sources"][row],
+                "source_title": state["titles"][row],
+            }
+            for row in rows
+        ]
+        vectors = np.array(state["vectors"][rows]) if len(rows) else None
+
+        # Новые файлы пишутся во временные и подменяют старые; текущие поиски дочитывают старую матрицу
+        collection_dir = state["dir"]
+        records_path = os.path.join(collection_dir, self.RECORDS_FILE)
+        records_data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        with open(records_path + ".tmp", "wb") as file:
+            file.write(records_data)
+
+        compacted = self._empty_state(collection_dir, state["dim"], state["dtype"])
+        compacted["lock"] = state["lock"]
+        compacted["next_id"] = state["next_id"]
+        compacted["records_size"] = len(records_data)
+        compacted["capacity"] = max(len(rows), self.initial_capacity) if len(rows) else 0
+
+        vectors_path = os.path.join(collection_dir, self.VECTORS_FILE)
+        with open(vectors_path + ".tmp", "wb") as file:
+            file.truncate(compacted["capacity"] * state["dim"] * state["dtype"].itemsize)
+        if vectors is not None:
+            tmp_vectors = np.memmap(vectors_path + ".tmp", dtype=state["dtype"], mode="r+", shape=(compacted["capacity"], state["dim"]))
+            tmp_vectors[:len(rows)] = vectors
+            tmp_vectors.flush()
+            del tmp_vectors
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(records_path + ".tmp", records_path)
+
+        if compacted["capacity"] > 0:
+            compacted["vectors"] = np.memmap(vectors_path, dtype=state["dtype"], mode="r+", shape=(compacted["capacity"], state["dim"]))
+        compacted["alive"] = np.zeros(compacted["capacity"], dtype=bool)
+        self._append_records(compacted, records)
+
+        state.update(compacted)
+        self._write_deleted(state)
+        self._write_meta(state)
+        logger.info(f"Collection '{os.path.basename(collection_dir)}' compacted to {len(rows)} records.")
+
+    def insert_data_into_milvus(self, collection_name, chunks, embeddings, sources=None, titles=None):
+        """
+        Вставляет чанки текста и их векторные представления в коллекцию.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            chunks (list): Список текстовых чанков.
+            embeddings (list): Эмбеддинги чанков.
+            sources (list): url источника для каждого чанка (по умолчанию пустые строки).
+            titles (list): Заголовок страницы-источника для каждого чанка (по умолчанию пустые строки).
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+        if not chunks:
+            return
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.shape != (len(chunks), state["dim"]):
+            logger.error(f"Error inserting data into collection '{collection_name}': embeddings shape {matrix.shape}, expected ({len(chunks)}, {state['dim']})")
+            return
+
+        time_now = int(time.time())
+        source_urls = list(sources) if sources is not None else [""] * len(chunks)
+        source_titles = list(titles) if titles is not None else [""] * len(chunks)
+        with state["lock"]:
+            records = [
+                {
+                    "id": state["next_id"] + i,
+                    "text": chunk,
+                    "chunk_length": len(chunk),
+                    "time_insert": time_now,
+                    "chunk_hash": self.chunk_hash(chunk, source, title),
+                    "source_url": source,
+                    "source_title": title,
+                }
+                for i, (chunk, source, title) in enumerate(zip(chunks, source_urls, source_titles))
+            ]
+            count = state["count"]
+            self._ensure_capacity(state, count + len(records))
+            state["vectors"][count:count + len(records)] = matrix.astype(state["dtype"])
+            state["vectors"].flush()
+            records_data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+            with open(os.path.join(state["dir"], self.RECORDS_FILE), "r+b") as file:
+                # Строки прерванной вставки (после зафиксированных записей) перезаписываются
+                file.truncate(state["records_size"])
+                file.seek(state["records_size"])
+                file.write(records_data)
+            state["records_size"] += len(records_data)
+            self._append_records(state, records)
+            state["next_id"] += len(records)
+            self._write_meta(state)
+
+        logger.info(f"Inserted {len(records)} records into collection '{collection_name}'.")
+        self._bump_collection_version(collection_name)
+
+    def search_similar_chunks(self, collection_name, query_embedding, source_urls=None):
+        """
+        Выполняет точный поиск top_k самых ближайших чанков к заданному запросу.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            query_embedding (list): Векторный запрос (эмбеддинг).
+            source_urls (list): Искать только среди чанков с этих url (None - по всей коллекции).
+
+        Returns:
+            list: Список кортежей (текст чанка, расстояние до запроса, длина чанка, url источника, заголовок источника).
+        """
+        return self.search_similar_chunks_batch(collection_name, [query_embedding], source_urls)[0]
+
+    def search_similar_chunks_batch(self, collection_name, query_embeddings, source_urls=None):
+        """
+        Выполняет точный поиск top_k ближайших чанков сразу для нескольких запросов одним умножением матриц.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            query_embeddings (list): Список эмбеддингов запросов.
+            source_urls (list): Искать только среди чанков с этих url (None - по всей коллекции).
+
+        Returns:
+            list: Для каждого запроса список кортежей (текст чанка, расстояние до запроса, длина чанка,
+                url источника, заголовок источника).
+        """
+        if not query_embeddings:
+            return []
+
+        state = self._get_state(collection_name)
+        if state is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return [[] for _ in query_embeddings]
+
+        rows, scores, snapshot = self._top_k(state, query_embeddings, self.top_k, source_urls)
+        texts, lengths, sources, titles = snapshot["texts"], snapshot["lengths"], snapshot["sources"], snapshot["titles"]
+
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            similar_chunks = []
+            seen_text = set()
+            for row, score in zip(query_rows, query_scores):
+                text = texts[row]
+                if text not in seen_text:
+                    seen_text.add(text)
+                    similar_chunks.append((text, float(score), lengths[row], sources[row], titles[row]))
+            results.append(similar_chunks)
+        return results
+
+    def _top_k(self, state, query_embeddings, k, source_urls=None):
+        """
+        Находит top-k строк по скалярному произведению для каждого запроса.
+        Матрица и списки метаданных берутся под блокировкой, а умножение идет без нее: вставки только
+        дописывают строки после count, а уплотнение подменяет матрицу и списки новыми объектами.
+
+        Returns:
+            tuple: (номера строк, оценки, снимок {"ids", "texts", "lengths", "sources", "titles"},
+            к которому относятся номера строк).
+        """
+        with state["lock"]:
+            count = state["count"]
+            vectors = state["vectors"][:count] if count else None
+            alive = state["alive"][:count].copy()
+            snapshot = {
+                "ids": state["ids"], "texts": state["texts"], "lengths": state["lengths"],
+                "sources": state["sources"], "titles": state["titles"],
+            }
+
+        if source_urls is not None:
+            allowed = set(source_urls)
+            alive &= np.fromiter((source in allowed for source in snapshot["sources"][:count]), dtype=bool, count=count)
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        k = min(k, int(alive.sum()))
+        if k == 0:
+            return [[] for _ in queries], [[] for _ in queries], snapshot
+
+        scores = queries @ vectors.T
+        scores[:, ~alive] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1), snapshot
+
+    def search_ids(self, collection_name, query_embeddings, search_params=None, limit=None):
+        """
+        Ищет ближайшие записи и возвращает только их id.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            query_embeddings (list): Эмбеддинги запросов.
+            search_params (dict): Не используется (для совместимости с VectorDBNode).
+            limit (int): Сколько результатов на запрос (по умолчанию top_k).
+
+        Returns:
+            list: Для каждого запроса список id найденных записей.
+        """
+        state = self._get_state(collection_name)
+        if state is None:
+            raise ValueError(f"Collection '{collection_name}' does not exist.")
+        rows, _, snapshot = self._top_k(state, query_embeddings, limit or self.top_k)
+        ids = snapshot["ids"]
+        return [[ids[row] for row in query_rows] for query_rows in rows]
+
+    async def asearch_similar_chunks(self, collection_name, query_embedding, source_urls=None):
+        """Асинхронный вариант search_similar_chunks: умножение матриц выполняется в пуле потоков."""
+        return await asyncio.to_thread(self.search_similar_chunks, collection_name, query_embedding, source_urls)
@@ -1,10 +1,15 @@
+import asyncio
+import hashlib
 import logging
 from typing import List
 import requests
+from requests.adapters import HTTPAdapter
 from langchain.schema import Document
 
 from elements.QueryElement import QueryElement
 from utils_local.utils import profile_time
+from utils_local.async_http import LoopBoundAsyncClient
+from utils_local.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +23,35 @@ class RerankerNode:
         self.reranker_url = f"http://{self.host}:{self.port}/rerank"
         self.min_score = config["min_score"]
         self.top_k = config["top_k"]
+        self.batch_size = config["max_batch_size"]  # Не больше --max-client-batch-size сервера
+        self.request_timeout = config["request_timeout"]  # Общий таймаут для синхронных и асинхронных запросов
+        # Пул keep-alive соединений для rerank
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=config["max_connections"]))
+        # Пул асинхронных соединений для aprocess
+        self.async_client = LoopBoundAsyncClient(max_connections=config["max_connections"], timeout=self.request_timeout)
+
+        # Кэш оценок реранкера для пар (запрос, чанк)
+        score_cache_config = config["score_cache"]
+        self.score_cache = LRUCache(score_cache_config["max_size"], score_cache_config["ttl_sec"])
  
     @profile_time
     def process(self, query_element: QueryElement) -> QueryElement:
-        top_chunks = query_element.top_chunks
-        reranked_docs = self.rerank(query=query_element.upgraded_query, documents=top_chunks)
+        reranked_docs = self.rerank(query=query_element.upgraded_query, documents=query_element.top_chunks)
+        return self._select_prompt_chunks(query_element, reranked_docs)
+
+    @profile_time
+    async def aprocess(self, query_element: QueryElement) -> QueryElement:
+        """Асинхронный вариант process."""
+        reranked_docs = await self.arerank(query=query_element.upgraded_query, documents=query_element.top_chunks)
+        return self._select_prompt_chunks(query_element, reranked_docs)
+
+    def select_without_rerank(self, query_element: QueryElement) -> QueryElement:
+        """Отбирает чанки для промпта в порядке векторного поиска, когда реранк пропущен."""
+        query_element.prompt_chunks = query_element.top_chunks[:self.top_k]
+        return query_element
+
+    def _select_prompt_chunks(self, query_element: QueryElement, reranked_docs: List[Document]) -> QueryElement:
         query_element.top_chunks = reranked_docs
 
         # Фильтрация топ-документов по условию score > self.min_score
@@ -34,18 +63,88 @@ class RerankerNode:
     def rerank(self, query: str, documents: List[Document]) -> List[Document]:
         """
         Пересчитывает релевантность документов на основе запроса.
+        На сервер отправляются только пары (запрос, чанк), которых нет в кэше оценок, батчами не больше batch_size.
+        """
+        keys, scores, missing = self._cache_lookup(query, documents)
+        for start in range(0, len(missing), self.batch_size):
+            batch_indices = missing[start:start + self.batch_size]
+            results = self._post_batch(query, [documents[i].page_content for i in batch_indices])
+            self._cache_store(keys, scores, batch_indices, results)
+        return self._apply_scores(documents, [{"index": i, "score": score} for i, score in scores.items()])
+
+    async def arerank(self, query: str, documents: List[Document]) -> List[Document]:
         """
-        # Преобразуем документы в текстовый формат
-        texts = [doc.page_content for doc in documents]
-        # Отправляем запрос к реранкеру
-        response = requests.post(
-            self.reranker_url,
-            json={"query": query, "texts": texts}
+        Асинхронный вариант rerank, батчи отправляются одновременно через пул асинхронных соединений.
+        """
+        keys, scores, missing = self._cache_lookup(query, documents)
+        batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+        batch_results = await asyncio.gather(
+            *(self._apost_batch(query, [documents[i].page_content for i in batch_indices]) for batch_indices in batches)
         )
-        if response.status_code != 200:
-            raise Exception(f"Ошибка: {response.status_code}, {response.text}")
-        # Получаем результаты реранкинга
-        results = response.json()
+        for batch_indices, results in zip(batches, batch_results):
+            self._cache_store(keys, scores, batch_indices, results)
+        return self._apply_scores(documents, [{"index": i, "score": score} for i, score in scores.items()])
+
+    @staticmethod
+    def _score_key(query: str, text: str) -> str:
+        normalized_query = " ".join(query.split()).casefold()
+        return hashlib.sha1(f"{normalized_query}\0{text}".encode("utf-8")).hexdigest()
+
+    def _cache_lookup(self, query: str, documents: List[Document]) -> tuple[list, dict, list]:
+        """
+        Returns:
+            tuple: (ключи кэша по документам, {индекс документа: оценка} для найденных в кэше,
+            индексы документов, которые нужно отправить на сервер).
+        """
+        keys = [self._score_key(query, doc.page_content) for doc in documents]
+        scores = {}
+        missing = []
+        for i, key in enumerate(keys):
+            score = self.score_cache.get(key)
+            if score is None:
+                missing.append(i)
+            else:
+                scores[i] = score
+        logger.info(f"Оценки реранкера из кэша: {len(scores)} из {len(documents)}")
+        return keys, scores, missing
+
+    def _cache_store(self, keys: list, scores: dict, batch_indices: list, results: list) -> None:
+        for result in results:
+            index = batch_indices[result["index"]]
+            scores[index] = result["score"]
+            self.score_cache.put(keys[index], result["score"])
+
+    def _post_batch(self, query: str, texts: List[str]) -> list:
+        """Отправляет один батч на сервер. Если сервер отклонил батч как слишком большой, делит его пополам."""
+        response = self.session.post(self.reranker_url, json={"query": query, "texts": texts}, timeout=self.request_timeout)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 413 and len(texts) > 1:
+            logger.warning(f"Сервер отклонил батч из {len(texts)} текстов, батч разделен пополам")
+            middle = len(texts) // 2
+            return self._merge_halves(texts, self._post_batch(query, texts[:middle]), self._post_batch(query, texts[middle:]))
+        raise Exception(f"Ошибка: {response.status_code}, {response.text}")
+
+    async def _apost_batch(self, query: str, texts: List[str]) -> list:
+        """Асинхронный вариант _post_batch."""
+        response = await self.async_client.get().post(self.reranker_url, json={"query": query, "texts": texts})
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 413 and len(texts) > 1:
+            logger.warning(f"Сервер отклонил батч из {len(texts)} текстов, батч разделен пополам")
+            middle = len(texts) // 2
+            return self._merge_halves(texts, await self._apost_batch(query, texts[:middle]), await self._apost_batch(query, texts[middle:]))
+        raise Exception(f"Ошибка: {response.status_code}, {response.text}")
+
+    @staticmethod
+    def _merge_halves(texts: List[str], first: list, second: list) -> list:
+        """Склеивает ответы по двум половинам батча, сдвигая индексы второй половины."""
+        offset = len(texts) // 2
+        return first + [{"index": result["index"] + offset, "score": result["score"]} for result in second]
+
+    @staticmethod
+    def _apply_scores(documents: List[Document], results: list) -> List[Document]:
+        """Записывает оценки реранкера в метаданные документов и сортирует их по убыванию оценки."""
         reranked_docs = []
         # Сортируем результаты по убыванию оценки
         results.sort(key=lambda x: x["score"], reverse=True)
@@ -0,0 +1,64 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalPolicyNode:
+    """
+    Модуль, выбирающий по оценкам векторного поиска, сколько кандидатов отправлять в реранкер.
+    В реранк идут чанки, близость которых отстает от лучшего не больше чем на score_window
+    (но не меньше min_candidates и не больше max_candidates). Если лучший чанк и близок к запросу,
+    и заметно оторвался от второго, реранк пропускается.
+    """
+
+    def __init__(self, config) -> None:
+        self.enabled = config["enabled"]
+        self.min_candidates = config["min_candidates"]  # Минимум кандидатов для реранка
+        self.max_candidates = config["max_candidates"]  # Максимум кандидатов для реранка
+        self.score_window = config["score_window"]  # Насколько близость кандидата может отставать от лучшей
+
+        skip_config = config["skip_rerank"]
+        self.skip_rerank = skip_config["enabled"]
+        self.skip_min_score = skip_config["min_score"]  # Минимальная близость лучшего чанка для пропуска реранка
+        self.skip_min_margin = skip_config["min_margin"]  # Минимальный отрыв лучшего чанка от второго
+
+        self.decisions = {"rerank": 0, "skip": 0}
+        self.candidates_total = 0  # Сколько кандидатов всего отправлено в реранк
+
+    def process(self, similar_chunks: list) -> tuple[list, bool]:
+        """
+        Выбирает кандидатов для реранка.
+
+        Args:
+            similar_chunks (list): Результаты векторного поиска (текст, близость, длина, url, заголовок) по убыванию близости.
+
+        Returns:
+            tuple: (кандидаты, нужен ли реранк).
+        """
+        if not self.enabled or not similar_chunks:
+            return similar_chunks, True
+
+        scores = [chunk[1] for chunk in similar_chunks]
+        best_score = scores[0]
+        margin = best_score - scores[1] if len(scores) > 1 else float("inf")
+
+        depth = sum(1 for score in scores if best_score - score <= self.score_window)
+        depth = max(self.min_candidates, min(self.max_candidates, depth))
+        candidates = similar_chunks[:depth]
+
+        if self.skip_rerank and best_score >= self.skip_min_score and margin >= self.skip_min_margin:
+            self.decisions["skip"] += 1
+            logger.info(
+                f"Реранк пропущен: лучший чанк {best_score:.4f}, отрыв от второго {margin:.4f}. "
+                f"Решения: {self.decisions}"
+            )
+            return candidates, False
+
+        self.decisions["rerank"] += 1
+        self.candidates_total += len(candidates)
+        logger.info(
+            f"В реранк {len(candidates)} кандидатов из {len(similar_chunks)} "
+            f"(лучший чанк {best_score:.4f}, отрыв от второго {margin:.4f}). "
+            f"Решения: {self.decisions}, в среднем кандидатов {self.candidates_total / self.decisions['rerank']:.1f}"
+        )
+        return candidates, True
@@ -0,0 +1,81 @@
+import logging
+import re
+
+from elements.QueryElement import QueryElement
+
+logger = logging.getLogger(__name__)
+
+
+class RewriteRouterNode:
+    """
+    Модуль, решающий без обращения к LLM, нужно ли уточнять follow-up запрос с учетом истории чата.
+    Уточнение нужно, если в запросе есть отсылки к прошлым сообщениям (местоимения, "там", "тогда")
+    или запрос слишком короткий. Не уточняются только самодостаточные запросы: достаточно длинные и без отсылок.
+    """
+
+    WORD_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, config) -> None:
+        self.enabled = config["enabled"]
+        self.max_short_words = config["max_short_words"]  # Запросы не длиннее считаются неполными
+        self.anaphora_words = {word.casefold() for word in config["anaphora_words"]}
+
+        self.decisions = {"rewrite": 0, "skip": 0}
+        self.saved_msecs = 0.0  # Оценка суммарной экономии времени на пропущенных уточнениях
+        self._rewrite_msecs = None  # Скользящее среднее времени одного уточнения запроса
+
+    def needs_rewrite(self, query_element: QueryElement) -> bool:
+        """
+        Решает, нужно ли уточнять запрос.
+
+        Args:
+            query_element (QueryElement): Запрос пользователя с историей чата.
+
+        Returns:
+            bool: True, если запрос нужно переписать с помощью LLM.
+        """
+        if not self._is_follow_up(query_element):
+            return False
+        if not self.enabled:
+            return True
+
+        decision, reason = self._decide_by_text(query_element.query)
+        return self._log_decision(decision, reason)
+
+    def record_rewrite_time(self, msecs: float) -> None:
+        """Учитывает время выполненного уточнения запроса для оценки сэкономленного времени."""
+        if self._rewrite_msecs is None:
+            self._rewrite_msecs = msecs
+        else:
+            self._rewrite_msecs = 0.8 * self._rewrite_msecs + 0.2 * msecs
+
+    @staticmethod
+    def _is_follow_up(query_element: QueryElement) -> bool:
+        return bool(query_element.previous_messages) and query_element.message_number > 0
+
+    def _decide_by_text(self, query: str) -> tuple[bool, str]:
+        """
+        Решение по тексту запроса. Короткие запросы уточняются всегда: даже при низкой близости
+        к прошлому вопросу ("а цена?") они обычно продолжают тему, а не начинают новую.
+        """
+        words = self.WORD_PATTERN.findall(query.casefold())
+        anaphora = [word for word in words if word in self.anaphora_words]
+        if anaphora:
+            return True, f"отсылка к контексту: {', '.join(anaphora)}"
+        if len(words) <= self.max_short_words:
+            return True, f"короткий запрос ({len(words)} слов)"
+        return False, f"самодостаточный запрос ({len(words)} слов)"
+
+    def _log_decision(self, decision: bool, reason: str) -> bool:
+        if decision:
+            self.decisions["rewrite"] += 1
+            logger.info(f"Запрос будет уточнен LLM: {reason}")
+        else:
+            self.decisions["skip"] += 1
+            saved = self._rewrite_msecs or 0.0
+            self.saved_msecs += saved
+            logger.info(
+                f"Уточнение запроса пропущено: {reason}. "
+                f"Сэкономлено ~{saved:.0f} мс, всего ~{self.saved_msecs:.0f} мс, решения: {self.decisions}"
+            )
+        return decision
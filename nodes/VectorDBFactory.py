@@ -0,0 +1,19 @@
+def create_vector_db_node(config):
+    """
+    Создает узел векторной базы данных по vector_db_node.backend из конфига.
+    Модули бэкендов импортируются только при выборе, поэтому для numpy не нужен pymilvus.
+
+    Args:
+        config (dict): Секция vector_db_node конфига.
+
+    Returns:
+        VectorDBNode | NumpyVectorDBNode: Узел с общим интерфейсом работы с коллекциями.
+    """
+    backend = config["backend"]
+    if backend == "milvus":
+        from nodes.VectorDBNode import VectorDBNode
+        return VectorDBNode(config)
+    if backend == "numpy":
+        from nodes.NumpyVectorDBNode import NumpyVectorDBNode
+        return NumpyVectorDBNode(config)
+    raise ValueError(f"Неизвестный бэкенд векторной БД '{backend}' (допустимо: milvus, numpy)")
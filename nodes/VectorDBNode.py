@@ -1,33 +1,133 @@
+import asyncio
+import hashlib
+import json
 import logging
+import threading
 import time
+import numpy as np
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
 
 logger = logging.getLogger(__name__)
 
 class VectorDBNode:
     """Модуль отвечающий за работу с векторной базой данных"""
+
+    # Поля, без которых коллекцию нельзя обновлять инкрементально (коллекции старого формата)
+    INCREMENTAL_FIELDS = ("chunk_hash", "source_url", "source_title")
+    SOURCE_FIELDS = ("source_url", "source_title")
+
+    # Версии коллекций, общие для всех экземпляров узла в процессе.
+    # Версия растет при любом изменении коллекции, по ней кэши понимают, что их данные устарели
+    _collection_versions = {}
+    _versions_lock = threading.Lock()
+
+    # Параметры индексов по умолчанию: тип -> (параметры построения, параметры поиска)
+    INDEX_DEFAULTS = {
+        "FLAT": ({}, {}),
+        "IVF_FLAT": ({"nlist": 128}, {"nprobe": 16}),
+        "IVF_SQ8": ({"nlist": 1024}, {"nprobe": 32}),
+        "IVF_PQ": ({"nlist": 1024, "m": 64, "nbits": 8}, {"nprobe": 32}),
+        "HNSW": ({"M": 16, "efConstruction": 200}, {"ef": 64}),
+        "DISKANN": ({}, {"search_list": 100}),
+    }
+    IVF_INDEX_TYPES = ("IVF_FLAT", "IVF_SQ8", "IVF_PQ")
+
+    # Реестр открытых коллекций, общий для всех экземпляров узла в процессе:
+    # имя -> {"collection": Collection, "field_names": set, "index": dict | None, "loaded": bool, "lock": Lock}.
+    # Хранятся только существующие коллекции, запись сбрасывается при создании, удалении и изменении коллекции,
+    # а также при ошибке поиска (коллекцию могли удалить из другого процесса)
+    _collections = {}
+    _collections_lock = threading.Lock()
+
     def __init__(self, config) -> None:
         self.host = config["host"]
         self.port = config["port"]
         self.dim = config["dim"]
         self.top_k = config["top_k"]
+        self.index_config = config["index"]  # тип и параметры индекса по умолчанию
+        self.collection_index_configs = config["collections"] or {}  # переопределения индекса по коллекциям
 
         # Создание подключения к Milvus
         connections.connect("default", host=self.host, port=self.port)
         logger.info(f"Connected to Milvus at {self.host}:{self.port} successfully!")
 
+    def get_collection_version(self, collection_name):
+        """
+        Возвращает версию коллекции: число, которое меняется при каждом создании, удалении
+        или изменении данных коллекции через этот процесс.
+        """
+        with self._versions_lock:
+            return self._collection_versions.get(collection_name, 0)
+
+    def _bump_collection_version(self, collection_name):
+        with self._versions_lock:
+            self._collection_versions[collection_name] = self._collection_versions.get(collection_name, 0) + 1
+        self._invalidate_collection(collection_name)
+
+    def _get_collection_entry(self, collection_name):
+        with self._collections_lock:
+            entry = self._collections.get(collection_name)
+        if entry is not None:
+            return entry
+
+        if not utility.has_collection(collection_name):
+            return None
+        collection = Collection(collection_name)
+        entry = {
+            "collection": collection,
+            "field_names": {field.name for field in collection.schema.fields},
+            "index": self._describe_index(collection),
+            "loaded": False,
+            "lock": threading.Lock(),
+        }
+        with self._collections_lock:
+            return self._collections.setdefault(collection_name, entry)
+
+    def _get_collection(self, collection_name, load=False):
+        """
+        Возвращает объект коллекции из реестра, обращаясь к Milvus только при первом использовании.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            load (bool): Загрузить коллекцию в память Milvus (нужно для поиска и запросов),
+                загрузка выполняется один раз на процесс.
+        
+        Returns:
+            Collection | None: Коллекция или None, если ее нет.
+        """
+        entry = self._get_collection_entry(collection_name)
+        if entry is None:
+            return None
+        if load and not entry["loaded"]:
+            with entry["lock"]:
+                if not entry["loaded"]:
+                    entry["collection"].load()
+                    entry["loaded"] = True
+                    logger.info(f"Collection '{collection_name}' loaded successfully.")
+        return entry["collection"]
+
+    def _invalidate_collection(self, collection_name):
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+
     def db_has_collection(self, collection_name):
         # проверка наличия коллекции
-        return utility.has_collection(collection_name)
+        return self._get_collection_entry(collection_name) is not None
+
+    async def adb_has_collection(self, collection_name):
+        """Асинхронный вариант db_has_collection (запрос к Milvus выполняется в пуле потоков)."""
+        return await asyncio.to_thread(self.db_has_collection, collection_name)
 
-    def create_milvus_collection(self, collection_name):
+    def create_milvus_collection(self, collection_name, expected_rows=0):
         """
         Создает новую коллекцию в Milvus, если она еще не существует.
         
         Args:
             collection_name (str): Имя коллекции.
+            expected_rows (int): Сколько записей будет загружено; по нему сразу выбирается тип индекса,
+                чтобы не перестраивать индекс после загрузки.
         """
-        if utility.has_collection(collection_name):
+        if self.db_has_collection(collection_name):
             logger.info(f"Collection '{collection_name}' already exists.")
             return
         
@@ -40,17 +140,21 @@ class VectorDBNode:
             FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
             FieldSchema(name="chunk_length", dtype=DataType.INT64),
-            FieldSchema(name="time_insert", dtype=DataType.INT64)
+            FieldSchema(name="time_insert", dtype=DataType.INT64),
+            FieldSchema(name="chunk_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="source_url", dtype=DataType.VARCHAR, max_length=2048),
+            FieldSchema(name="source_title", dtype=DataType.VARCHAR, max_length=1024)
         ]
         schema = CollectionSchema(fields, description="Collection for text chunks")
         
         try:
             Collection(name=collection_name, schema=schema)
             logger.info(f"Collection '{collection_name}' created successfully.")
+            self._bump_collection_version(collection_name)
         except Exception as e:
             logger.error(f"Failed to create collection '{collection_name}': {e}")
         
-        self.create_index(collection_name)
+        self.create_index(collection_name, index_params=self.get_index_params(collection_name, expected_rows))
 
     def create_index(self, collection_name, field_name="embedding", index_params=None):
         """
@@ -59,32 +163,239 @@ class VectorDBNode:
         Args:
             collection_name (str): Имя коллекции.
             field_name (str): Поле, на котором создается индекс (по умолчанию "embedding").
-            index_params (dict): Параметры индекса (по умолчанию IVF_FLAT).
+            index_params (dict): Параметры индекса (по умолчанию из конфига для пустой коллекции, см. get_index_params).
         """
-        if not utility.has_collection(collection_name):
+        collection = self._get_collection(collection_name)
+        if collection is None:
             logger.error(f"Collection '{collection_name}' does not exist.")
             return
 
-        collection = Collection(collection_name)
         if index_params is None:
-            index_params = {
-                "metric_type": "IP",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
+            index_params = self.get_index_params(collection_name)
 
         try:
             collection.create_index(field_name=field_name, index_params=index_params)
-            logger.info(f"Index created on field '{field_name}' for collection '{collection_name}'.")
+            logger.info(f"Index {index_params['index_type']} {index_params['params']} created on field '{field_name}' for collection '{collection_name}'.")
         except Exception as e:
             logger.error(f"Failed to create index on field '{field_name}' for collection '{collection_name}': {e}")
+        # В реестре должно оказаться описание нового индекса
+        self._invalidate_collection(collection_name)
 
         try:
-            collection.load()
-            logger.info(f"Collection '{collection_name}' loaded successfully.")
+            self._get_collection(collection_name, load=True)
         except Exception as e:
             logger.error(f"Failed to load collection '{collection_name}': {e}")
 
+    @staticmethod
+    def _describe_index(collection):
+        """Возвращает {"index_type", "params"} индекса коллекции или None, если индекса нет."""
+        if not collection.indexes:
+            return None
+        index_params = dict(collection.indexes[0].params)
+        params = index_params.get("params")
+        if not isinstance(params, dict):
+            params = {key: value for key, value in index_params.items() if key not in ("index_type", "metric_type")}
+        return {"index_type": index_params.get("index_type"), "params": params}
+
+    def _collection_index_config(self, collection_name):
+        index_config = dict(self.index_config)
+        index_config.update(self.collection_index_configs.get(collection_name) or {})
+        return index_config
+
+    @staticmethod
+    def _auto_index_type(auto_rules, num_rows):
+        for rule in auto_rules:
+            if rule["max_rows"] is None or num_rows <= rule["max_rows"]:
+                return rule["type"]
+        return auto_rules[-1]["type"]
+
+    @staticmethod
+    def _auto_nlist(num_rows):
+        # Обычная оценка числа кластеров IVF: ~4 * sqrt(N)
+        return int(min(65536, max(128, 4 * num_rows ** 0.5)))
+
+    def get_index_params(self, collection_name, num_rows=0):
+        """
+        Возвращает параметры индекса для коллекции с учетом ее переопределений в конфиге.
+        При type: auto тип выбирается по числу записей (auto_rules), параметры берутся по умолчанию для типа,
+        а число кластеров IVF подбирается по числу записей. При явном типе используются params из конфига.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            num_rows (int): Число записей в коллекции.
+        
+        Returns:
+            dict: index_params для Collection.create_index.
+        """
+        index_config = self._collection_index_config(collection_name)
+        index_type = index_config["type"]
+        auto = index_type == "auto"
+        if auto:
+            index_type = self._auto_index_type(index_config["auto_rules"], num_rows)
+        if index_type not in self.INDEX_DEFAULTS:
+            raise ValueError(f"Неизвестный тип индекса '{index_type}' для коллекции '{collection_name}'")
+
+        params = dict(self.INDEX_DEFAULTS[index_type][0])
+        if auto and index_type in self.IVF_INDEX_TYPES:
+            params["nlist"] = self._auto_nlist(num_rows)
+        if not auto:
+            params.update(index_config["params"] or {})
+        return {"metric_type": "IP", "index_type": index_type, "params": params}
+
+    def get_search_params(self, collection_name, index_info=None, limit=None):
+        """
+        Возвращает параметры поиска под построенный индекс коллекции: из конфига, если там задан
+        этот же тип индекса с search_params, иначе значения по умолчанию для типа.
+        Число проб IVF растет с числом кластеров, а ef (HNSW) и search_list (DISKANN) не меньше limit.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            index_info (dict): Описание индекса {"index_type", "params"} (по умолчанию из реестра).
+            limit (int): Сколько результатов нужно (по умолчанию top_k).
+        
+        Returns:
+            dict: param для Collection.search.
+        """
+        if index_info is None:
+            entry = self._get_collection_entry(collection_name)
+            index_info = entry["index"] if entry is not None else None
+        if index_info is None or index_info["index_type"] not in self.INDEX_DEFAULTS:
+            return {"metric_type": "IP", "params": {}}
+
+        index_type = index_info["index_type"]
+        limit = limit or self.top_k
+        index_config = self._collection_index_config(collection_name)
+        configured = index_config["search_params"] if index_config["type"] == index_type else None
+
+        if configured:
+            params = dict(configured)
+        else:
+            params = dict(self.INDEX_DEFAULTS[index_type][1])
+            if index_type in self.IVF_INDEX_TYPES:
+                nlist = int(index_info["params"].get("nlist", self.INDEX_DEFAULTS[index_type][0]["nlist"]))
+                params["nprobe"] = min(nlist, max(params["nprobe"], nlist // 32))
+        if index_type == "HNSW":
+            params["ef"] = max(int(params.get("ef", 0)), limit)
+        if index_type == "DISKANN":
+            params["search_list"] = max(int(params.get("search_list", 0)), limit)
+        return {"metric_type": "IP", "params": params}
+
+    def get_index_info(self, collection_name):
+        """Возвращает описание индекса коллекции {"index_type", "params"} или None."""
+        entry = self._get_collection_entry(collection_name)
+        return entry["index"] if entry is not None else None
+
+    def rebuild_index(self, collection_name, index_params, field_name="embedding"):
+        """
+        Пересоздает индекс коллекции с новыми параметрами. На время перестройки коллекция выгружается
+        из памяти Milvus и недоступна для поиска.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            index_params (dict): Параметры нового индекса.
+            field_name (str): Поле, на котором строится индекс.
+        
+        Returns:
+            float: Время перестройки в секундах.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return 0.0
+
+        start = time.perf_counter()
+        collection.release()
+        if collection.has_index():
+            collection.drop_index()
+        self._invalidate_collection(collection_name)
+        self.create_index(collection_name, field_name=field_name, index_params=index_params)
+        build_sec = time.perf_counter() - start
+        logger.info(f"Index of collection '{collection_name}' rebuilt in {build_sec:.1f} sec.")
+        return build_sec
+
+    def flush_collection(self, collection_name):
+        """Запечатывает вставленные данные коллекции (Collection.flush), чтобы индекс строился по всем записям."""
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+        collection.flush()
+
+    def index_needs_rebuild(self, collection_name):
+        """
+        Проверяет, отличается ли индекс коллекции от параметров из конфига для текущего числа записей.
+        При type: auto учитывается только смена типа, чтобы не перестраивать индекс из-за роста nlist.
+        
+        Returns:
+            dict | None: index_params нужного индекса или None, если индекс актуален.
+        """
+        num_rows = self.get_total_records(collection_name)
+        if num_rows is None:
+            return None
+
+        index_params = self.get_index_params(collection_name, num_rows)
+        current = self.get_index_info(collection_name)
+        auto = self._collection_index_config(collection_name)["type"] == "auto"
+        if current is not None and current["index_type"] == index_params["index_type"]:
+            same_params = {key: str(value) for key, value in current["params"].items()} == {
+                key: str(value) for key, value in index_params["params"].items()
+            }
+            if auto or same_params:
+                logger.info(f"Index {current['index_type']} of collection '{collection_name}' is up to date ({num_rows} rows).")
+                return None
+
+        logger.info(
+            f"Index of collection '{collection_name}' ({num_rows} rows) differs from config: "
+            f"{current['index_type'] if current else None} -> {index_params['index_type']} {index_params['params']}"
+        )
+        return index_params
+
+    def optimize_index(self, collection_name):
+        """
+        Приводит индекс коллекции к параметрам из конфига для текущего числа записей.
+        Перестройка выгружает коллекцию из памяти Milvus, поэтому метод не вызывается при загрузке данных,
+        а запускается отдельно как обслуживание (tune_index.py --optimize).
+        
+        Args:
+            collection_name (str): Имя коллекции.
+        
+        Returns:
+            bool: True, если индекс был перестроен.
+        """
+        index_params = self.index_needs_rebuild(collection_name)
+        if index_params is None:
+            return False
+        self.rebuild_index(collection_name, index_params)
+        return True
+
+    def search_ids(self, collection_name, query_embeddings, search_params=None, limit=None):
+        """
+        Ищет ближайшие записи и возвращает только их id (для оценки качества индекса).
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            query_embeddings (list): Эмбеддинги запросов.
+            search_params (dict): param для Collection.search (по умолчанию get_search_params).
+            limit (int): Сколько результатов на запрос (по умолчанию top_k).
+        
+        Returns:
+            list: Для каждого запроса список id найденных записей.
+        """
+        collection = self._get_collection(collection_name, load=True)
+        if collection is None:
+            raise ValueError(f"Collection '{collection_name}' does not exist.")
+        limit = limit or self.top_k
+        if search_params is None:
+            search_params = self.get_search_params(collection_name, limit=limit)
+        results = collection.search(
+            data=list(query_embeddings),
+            anns_field="embedding",
+            param=search_params,
+            limit=limit,
+            output_fields=[]
+        )
+        return [list(hits.ids) for hits in results]
+
     def delete_milvus_collection(self, collection_name):
         """
         Удаляет коллекцию из Milvus, если она существует.
@@ -92,10 +403,11 @@ class VectorDBNode:
         Args:
             collection_name (str): Имя коллекции для удаления.
         """
-        if utility.has_collection(collection_name):
-            collection = Collection(collection_name)
+        collection = self._get_collection(collection_name)
+        if collection is not None:
             collection.drop()
             logger.info(f"Collection '{collection_name}' deleted successfully.")
+            self._bump_collection_version(collection_name)
         else:
             logger.warning(f"Collection '{collection_name}' does not exist.")
 
@@ -118,11 +430,11 @@ class VectorDBNode:
             collection_name (str): Имя коллекции.
             n (int): Количество записей для отображения.
         """
-        if not utility.has_collection(collection_name):
+        collection = self._get_collection(collection_name, load=True)
+        if collection is None:
             logger.error(f"Collection '{collection_name}' does not exist.")
             return
 
-        collection = Collection(collection_name)
         try:
             results = collection.query(expr=f"id >= 0", output_fields=["id", "text", "chunk_length", "time_insert"], limit=n)
             logger.info(f"First {n} records in collection '{collection_name}':")
@@ -141,18 +453,132 @@ class VectorDBNode:
         Returns:
             int: Общее количество записей в коллекции.
         """
-        if not utility.has_collection(collection_name):
+        collection = self._get_collection(collection_name, load=True)
+        if collection is None:
             logger.error(f"Collection '{collection_name}' does not exist.")
             return
 
-        collection = Collection(collection_name)
         res = collection.query(
             expr="",
             output_fields=["count(*)"],
         )
         return res[0]["count(*)"]
         
-    def insert_data_into_milvus(self, collection_name, chunks, embeddings):
+    @staticmethod
+    def chunk_hash(text, source_url="", source_title=""):
+        """
+        Возвращает хэш чанка, по которому определяются новые и устаревшие чанки.
+        В хэш входят url и заголовок источника: при их изменении запись пересоздается с новыми метаданными.
+        
+        Args:
+            text (str): Текст чанка.
+            source_url (str): url страницы-источника.
+            source_title (str): Заголовок страницы-источника.
+        
+        Returns:
+            str: sha256 в виде hex-строки (64 символа).
+        """
+        return hashlib.sha256(f"{text}\0{source_url}\0{source_title}".encode("utf-8")).hexdigest()
+
+    def supports_incremental(self, collection_name):
+        """
+        Проверяет, что коллекция существует и хранит хэши чанков (создана в текущем формате схемы).
+        
+        Args:
+            collection_name (str): Имя коллекции.
+        
+        Returns:
+            bool: True, если коллекцию можно обновлять инкрементально.
+        """
+        entry = self._get_collection_entry(collection_name)
+        if entry is None:
+            return False
+        return all(field in entry["field_names"] for field in self.INCREMENTAL_FIELDS)
+
+    def get_chunk_hashes(self, collection_name, batch_size=5000):
+        """
+        Возвращает хэши всех чанков коллекции вместе с id записей.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            batch_size (int): Сколько записей читать за один запрос.
+        
+        Returns:
+            dict: Словарь {хэш чанка: {"source_url": url источника, "ids": [id записей с этим хэшем]}}.
+        """
+        collection = self._get_collection(collection_name, load=True)
+        if collection is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return {}
+
+        iterator = collection.query_iterator(batch_size=batch_size, expr="id >= 0", output_fields=["id", "chunk_hash", "source_url"])
+        chunk_hashes = {}
+        try:
+            while True:
+                records = iterator.next()
+                if not records:
+                    break
+                for record in records:
+                    entry = chunk_hashes.setdefault(record["chunk_hash"], {"source_url": record["source_url"], "ids": []})
+                    entry["ids"].append(record["id"])
+        finally:
+            iterator.close()
+        return chunk_hashes
+
+    def iter_embeddings(self, collection_name, batch_size=5000):
+        """
+        Читает все эмбеддинги коллекции пачками.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            batch_size (int): Сколько записей читать за один запрос.
+        
+        Yields:
+            tuple: (список id, np.ndarray эмбеддингов float32 размера len(ids) x dim).
+        """
+        collection = self._get_collection(collection_name, load=True)
+        if collection is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        iterator = collection.query_iterator(batch_size=batch_size, expr="id >= 0", output_fields=["id", "embedding"])
+        try:
+            while True:
+                records = iterator.next()
+                if not records:
+                    break
+                ids = [record["id"] for record in records]
+                embeddings = np.asarray([record["embedding"] for record in records], dtype=np.float32)
+                yield ids, embeddings
+        finally:
+            iterator.close()
+
+    def delete_records(self, collection_name, ids, batch_size=5000):
+        """
+        Удаляет записи коллекции по их id.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            ids (list): Список id записей для удаления.
+            batch_size (int): Сколько id удалять за один запрос.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return
+
+        deleted = 0
+        for i in range(0, len(ids), batch_size):
+            batch_ids = ids[i:i + batch_size]
+            try:
+                result = collection.delete(expr=f"id in {batch_ids}")
+                deleted += result.delete_count
+            except Exception as e:
+                logger.error(f"Error deleting records from collection '{collection_name}': {e}")
+        logger.info(f"Deleted {deleted} records from collection '{collection_name}'.")
+        self._bump_collection_version(collection_name)
+
+    def insert_data_into_milvus(self, collection_name, chunks, embeddings, sources=None, titles=None):
         """
         Вставляет чанки текста и их векторные представления в Milvus.
         
@@ -160,68 +586,111 @@ class VectorDBNode:
             collection_name (str): Имя коллекции.
             chunks (list): Список текстовых чанков.
             embeddings (list): Эмбеддинги чанков.
+            sources (list): url источника для каждого чанка (по умолчанию пустые строки).
+            titles (list): Заголовок страницы-источника для каждого чанка (по умолчанию пустые строки).
         """
-        if not utility.has_collection(collection_name):
+        collection = self._get_collection(collection_name)
+        if collection is None:
             logger.error(f"Collection '{collection_name}' does not exist.")
             return
 
-        collection = Collection(collection_name)
         texts = [chunk for chunk in chunks]
         lengths = [len(chunk) for chunk in chunks]
         time_now = int(time.time())
         times = [time_now] * len(chunks)
+        source_urls = list(sources) if sources is not None else [""] * len(chunks)
+        titles = list(titles) if titles is not None else [""] * len(chunks)
+        hashes = [self.chunk_hash(chunk, source, title) for chunk, source, title in zip(chunks, source_urls, titles)]
+        # Заголовки обрезаются под длину поля схемы (в байтах UTF-8)
+        source_titles = [title.encode("utf-8")[:1024].decode("utf-8", "ignore") for title in titles]
 
         data = [
             embeddings,
             texts,
             lengths,
-            times
+            times,
+            hashes,
+            source_urls,
+            source_titles
         ]
 
         try:
             result = collection.insert(data)
             logger.info(f"Inserted {len(result.primary_keys)} records into collection '{collection_name}'.")
+            self._bump_collection_version(collection_name)
         except Exception as e:
             logger.error(f"Error inserting data into collection '{collection_name}': {e}")
 
-    def search_similar_chunks(self, collection_name, query_embedding):
+    def search_similar_chunks(self, collection_name, query_embedding, source_urls=None):
         """
         Выполняет поиск top_k самых ближайших чанков к заданному запросу в коллекции Milvus.
         
         Args:
             collection_name (str): Имя коллекции.
             query_embedding (list): Векторный запрос (эмбеддинг).
+            source_urls (list): Искать только среди чанков с этих url (None - по всей коллекции).
         
         Returns:
-            list: Список кортежей (текст чанка, расстояние до запроса, длина чанка).
+            list: Список кортежей (текст чанка, расстояние до запроса, длина чанка, url источника, заголовок источника).
         """
-        if not utility.has_collection(collection_name):
-            logger.error(f"Collection '{collection_name}' does not exist.")
+        return self.search_similar_chunks_batch(collection_name, [query_embedding], source_urls)[0]
+
+    def search_similar_chunks_batch(self, collection_name, query_embeddings, source_urls=None):
+        """
+        Выполняет поиск top_k ближайших чанков сразу для нескольких запросов одним обращением к Milvus.
+        
+        Args:
+            collection_name (str): Имя коллекции.
+            query_embeddings (list): Список эмбеддингов запросов.
+            source_urls (list): Искать только среди чанков с этих url (None - по всей коллекции).
+        
+        Returns:
+            list: Для каждого запроса список кортежей (текст чанка, расстояние до запроса, длина чанка,
+                url источника, заголовок источника). При ошибке для всех запросов возвращаются пустые списки.
+        """
+        if not query_embeddings:
             return []
 
-        collection = Collection(collection_name)
+        entry = self._get_collection_entry(collection_name)
+        if entry is None:
+            logger.error(f"Collection '{collection_name}' does not exist.")
+            return [[] for _ in query_embeddings]
+        collection = entry["collection"]
 
-        search_params = {
-            "metric_type": "IP",
-            "params": {"nprobe": 16}
-        }
+        # Коллекции старого формата могут не хранить поля источника
+        field_names = entry["field_names"]
+        source_fields = [field for field in self.SOURCE_FIELDS if field in field_names]
+        expr = None
+        if source_urls is not None:
+            if "source_url" not in field_names:
+                logger.error(f"Collection '{collection_name}' does not store source urls, source filter is not supported.")
+                return [[] for _ in query_embeddings]
+            expr = f"source_url in {json.dumps(list(source_urls), ensure_ascii=False)}"
 
         try:
+            self._get_collection(collection_name, load=True)
+            search_params = self.get_search_params(collection_name)
             results = collection.search(
-                data=[query_embedding],
+                data=list(query_embeddings),
                 anns_field="embedding",
                 param=search_params,
                 limit=self.top_k,
-                output_fields=["text", "chunk_length"]
+                expr=expr,
+                output_fields=["text", "chunk_length"] + source_fields
             )
         except Exception as e:
             logger.error(f"Error during search in collection '{collection_name}': {e}")
-            return []
+            self._invalidate_collection(collection_name)
+            return [[] for _ in query_embeddings]
+
+        return [self._hits_to_chunks(hits) for hits in results]
 
+    @staticmethod
+    def _hits_to_chunks(hits):
         similar_chunks = []
         seen_text = set()
 
-        for hit in results[0]:
+        for hit in hits:
             entity = hit.entity
             distance = hit.distance
             text = entity.get("text")
@@ -229,6 +698,13 @@ class VectorDBNode:
 
             if text not in seen_text:
                 seen_text.add(text)
-                similar_chunks.append((text, distance, chunk_length))
+                similar_chunks.append((text, distance, chunk_length, entity.get("source_url") or "", entity.get("source_title") or ""))
+
+        return similar_chunks
 
-        return similar_chunks
\ No newline at end of file
+    async def asearch_similar_chunks(self, collection_name, query_embedding, source_urls=None):
+        """
+        Асинхронный вариант search_similar_chunks. Клиент pymilvus синхронный, поэтому поиск
+        выполняется в пуле потоков, а gRPC-канал Milvus обслуживает параллельные запросы.
+        """
+        return await asyncio.to_thread(self.search_similar_chunks, collection_name, query_embedding, source_urls)
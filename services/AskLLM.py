@@ -1,12 +1,23 @@
+import asyncio
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from utils_local.utils import profile_time
+from utils_local.semantic_cache import SemanticCache
+from utils_local.rank_fusion import reciprocal_rank_fusion
 import yaml
 
 from elements.QueryElement import QueryElement
 from nodes.RerankerNode import RerankerNode
-from nodes.VectorDBNode import VectorDBNode
+from nodes.VectorDBFactory import create_vector_db_node
 from nodes.EmbedderNode import EmbedderNode
 from nodes.LLMNode import LLMNode
+from nodes.LexicalIndexNode import LexicalIndexNode
+from nodes.RewriteRouterNode import RewriteRouterNode
+from nodes.RetrievalPolicyNode import RetrievalPolicyNode
 
 # Настройка логгера для работы в режиме INFO
 logging.basicConfig(
@@ -23,40 +34,510 @@ class AskLLM:
         with open("configs/app_config.yaml", "r") as file:
             config = yaml.safe_load(file)
         
-        self.vector_db_node = VectorDBNode(config["vector_db_node"])
+        self.vector_db_node = create_vector_db_node(config["vector_db_node"])
         self.embedder_node = EmbedderNode(config["embedder_node"])
         self.reranker_node = RerankerNode(config["reranker_node"])
         self.llm_node = LLMNode(config["llm_node"])
+        self.rewrite_router_node = RewriteRouterNode(config["rewrite_router_node"])
+        self.lexical_index_node = LexicalIndexNode(config["lexical_index_node"])
+        self.retrieval_policy_node = RetrievalPolicyNode(config["retrieval_policy_node"])
+
+        # Кэш ответов на близкие по смыслу первые вопросы к коллекции
+        semantic_cache_config = config["ask_llm"]["semantic_cache"]
+        self.semantic_cache = None
+        if semantic_cache_config["enabled"]:
+            self.semantic_cache = SemanticCache(
+                semantic_cache_config["similarity_threshold"],
+                semantic_cache_config["max_size"],
+                semantic_cache_config["ttl_sec"],
+            )
+
+        # Спекулятивный поиск по исходному запросу, пока LLM уточняет follow-up запрос
+        speculative_config = config["ask_llm"]["speculative_retrieval"]
+        self.speculative_retrieval = speculative_config["enabled"]
+        self.speculative_reuse_similarity = speculative_config["reuse_similarity"]
+        self.speculative_merge = speculative_config["merge"]
+        self.executor = ThreadPoolExecutor(max_workers=speculative_config["max_workers"], thread_name_prefix="ask-llm")
+
+        # Гибридный поиск: объединение векторных и лексических (BM25) результатов перед реранком
+        hybrid_config = config["ask_llm"]["hybrid"]
+        self.hybrid_retrieval = hybrid_config["enabled"] and self.lexical_index_node.enabled
+        self.hybrid_rrf_k = hybrid_config["rrf_k"]
+        self.hybrid_candidates = hybrid_config["candidates"]
+
+        # Пакетная обработка наборов вопросов (process_batch / process_jsonl)
+        batch_config = config["ask_llm"]["batch"]
+        self.batch_search_size = batch_config["search_batch_size"]
+        self.batch_max_workers = batch_config["max_workers"]
        
     @profile_time
-    def process(self, query: str, message_number=0, collection_db_name=None, previous_messages=[], show_data_info=False):
-        """Наполняет датасет по данным url"""
-        query_element = QueryElement(query, message_number, collection_db_name, previous_messages)
+    def process(self, query: str, message_number=0, collection_db_name=None, previous_messages=[], show_data_info=False, source_urls=None):
+        """
+        Отвечает на запрос пользователя, с RAG если выбрана существующая коллекция.
+        source_urls ограничивает поиск чанками с указанных страниц (None - вся коллекция).
+        """
+        query_element = QueryElement(query, message_number, collection_db_name, previous_messages, source_urls=source_urls)
+
+        if self._uses_rag(collection_db_name):
+            cache_version = self._retrieve(query_element, show_data_info)
+            if query_element.answer is None:
+                query_element = self.llm_node.answer_with_rag(query_element, show_data_info)
+                self._store_in_semantic_cache(query_element, cache_version)
+        else:
+            query_element = self.llm_node.answer(query_element, show_data_info)
+
+        return query_element
+
+    @profile_time
+    def process_stream(self, query: str, message_number=0, collection_db_name=None, previous_messages=[], show_data_info=False, source_urls=None):
+        """
+        Потоковый вариант process: поиск контекста выполняется сразу, а ответ модели
+        отдается генератором по частям по мере генерации.
+
+        Returns:
+            tuple: (QueryElement, генератор частей ответа). После исчерпания генератора
+            полный ответ записан в QueryElement.answer.
+        """
+        query_element = QueryElement(query, message_number, collection_db_name, previous_messages, source_urls=source_urls)
+
+        if self._uses_rag(collection_db_name):
+            cache_version = self._retrieve(query_element, show_data_info)
+            if query_element.answer is not None:
+                return query_element, iter([query_element.answer])
+            deltas = self._stream_with_rag(query_element, cache_version, show_data_info)
+        else:
+            deltas = self.llm_node.stream_answer(query_element, show_data_info)
+
+        return query_element, deltas
+
+    @profile_time
+    async def aprocess(self, query: str, message_number=0, collection_db_name=None, previous_messages=[], show_data_info=False, source_urls=None):
+        """
+        Асинхронный вариант process. Все запросы к сервисам идут через пулы асинхронных соединений,
+        поэтому несколько запросов пользователей могут обрабатываться одновременно в одном event loop.
+        """
+        query_element = QueryElement(query, message_number, collection_db_name, previous_messages, source_urls=source_urls)
+
+        if collection_db_name is not None and await self.vector_db_node.adb_has_collection(collection_db_name):
+            cache_version = await self._aretrieve(query_element, show_data_info)
+            if query_element.answer is None:
+                query_element = await self.llm_node.aanswer_with_rag(query_element, show_data_info)
+                self._store_in_semantic_cache(query_element, cache_version)
+        else:
+            query_element = await self.llm_node.aanswer(query_element, show_data_info)
+
+        return query_element
+
+    @profile_time
+    def process_batch(self, queries: list[str], collection_db_name=None, show_data_info=False, source_urls=None) -> list[QueryElement]:
+        """
+        Отвечает на набор независимых вопросов (первых сообщений чата, без истории).
+        Эмбеддинги всех вопросов считаются пачками, поиск идет несколькими запросами к Milvus сразу,
+        а реранк и генерация ответов выполняются параллельно.
+        Ошибка на одном вопросе не прерывает обработку остальных: его ответ остается None, а описание ошибки
+        записывается в query_element.error.
+
+        Returns:
+            list[QueryElement]: Результаты в порядке вопросов.
+        """
+        query_elements = [QueryElement(query, 0, collection_db_name, [], source_urls=source_urls) for query in queries]
+        if not query_elements:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.batch_max_workers, thread_name_prefix="ask-llm-batch") as executor:
+            if self._uses_rag(collection_db_name):
+                try:
+                    embeddings = self.embedder_node.embed_documents(queries, use_cache=False)
+                except Exception as e:
+                    for query_element in query_elements:
+                        self._record_error(query_element, "эмбеддинг", e)
+                    return query_elements
+                pending = []
+                cache_versions = {}
+                for query_element, embedding in zip(query_elements, embeddings):
+                    query_element.query_embedding = embedding
+                    cache_versions[id(query_element)] = self._safe_lookup_semantic_cache(query_element)
+                    if query_element.answer is None:
+                        pending.append(query_element)
+                logger.info(f"Пакетная обработка: {len(query_elements)} вопросов, из семантического кэша {len(query_elements) - len(pending)}")
+
+                to_rerank = []
+                skipped_rerank = set()
+
+                for i in range(0, len(pending), self.batch_search_size):
+                    batch = pending[i:i + self.batch_search_size]
+                    try:
+                        batch_chunks = self.vector_db_node.search_similar_chunks_batch(
+                            collection_db_name, [query_element.query_embedding for query_element in batch], source_urls
+                        )
+                    except Exception as e:
+                        for query_element in batch:
+                            self._record_error(query_element, "поиск", e)
+                        continue
+                    for query_element, similar_chunks in zip(batch, batch_chunks):
+                        try:
+                            rerank = self._prepare_candidates(query_element, similar_chunks)
+                        except Exception as e:
+                            self._record_error(query_element, "отбор кандидатов", e)
+                            continue
+                        if rerank:
+                            to_rerank.append(query_element)
+                        else:
+                            self.reranker_node.select_without_rerank(query_element)
+                            skipped_rerank.add(id(query_element))
+
+                reranked = self._run_batch(executor, self.reranker_node.process, to_rerank, "реранк")
+                ready_ids = skipped_rerank | {id(query_element) for query_element in reranked}
+                pending = [query_element for query_element in pending if id(query_element) in ready_ids]
+                answered = self._run_batch(
+                    executor, lambda query_element: self.llm_node.answer_with_rag(query_element, show_data_info), pending, "генерация"
+                )
+                for query_element in answered:
+                    try:
+                        self._store_in_semantic_cache(query_element, cache_versions[id(query_element)])
+                    except Exception as e:
+                        # Ответ уже получен, ошибка кэша на него не влияет
+                        logger.error(f"Не удалось сохранить ответ в семантический кэш для запроса '{query_element.query[:100]}': {e}")
+            else:
+                self._run_batch(
+                    executor, lambda query_element: self.llm_node.answer(query_element, show_data_info), query_elements, "генерация"
+                )
+
+        return query_elements
+
+    @staticmethod
+    def _run_batch(executor: ThreadPoolExecutor, func, query_elements: list[QueryElement], stage: str) -> list[QueryElement]:
+        """
+        Выполняет func параллельно для всех запросов. Запросы, на которых func упала, логируются
+        и исключаются из результата.
+
+        Returns:
+            list[QueryElement]: Успешно обработанные запросы.
+        """
+        futures = [(query_element, executor.submit(func, query_element)) for query_element in query_elements]
+        succeeded = []
+        for query_element, future in futures:
+            try:
+                future.result()
+                succeeded.append(query_element)
+            except Exception as e:
+                AskLLM._record_error(query_element, stage, e)
+        return succeeded
+
+    @staticmethod
+    def _record_error(query_element: QueryElement, stage: str, error: Exception) -> None:
+        """Логирует ошибку обработки запроса и записывает ее в query_element.error."""
+        logger.error(f"Ошибка на этапе '{stage}' для запроса '{query_element.query[:100]}': {error}")
+        query_element.error = f"{stage}: {error}"
+
+    def _safe_lookup_semantic_cache(self, query_element: QueryElement) -> int | None:
+        """_lookup_semantic_cache для пакетной обработки: при ошибке кэша вопрос обрабатывается без кэша."""
+        try:
+            return self._lookup_semantic_cache(query_element)
+        except Exception as e:
+            logger.error(f"Ошибка семантического кэша для запроса '{query_element.query[:100]}': {e}")
+            return None
+
+    @profile_time
+    def process_jsonl(self, input_path: str, output_path: str, collection_db_name=None, query_field="query", batch_size=256):
+        """
+        Отвечает на вопросы из JSONL файла и пишет результаты в JSONL файл.
+        Каждая входная запись дополняется полями 'answer' (None при ошибке), 'contexts' (тексты чанков промпта),
+        'context_sources' (url страниц, из которых получены эти чанки) и 'error' (описание ошибки или None).
+        Вопросы обрабатываются пачками по batch_size через process_batch, результаты пишутся по мере готовности.
+        Ошибка на одной записи (в том числе невалидный JSON) не прерывает обработку файла: для нее пишется запись с 'error'.
+
+        Args:
+            input_path (str): Входной файл, по одной JSON записи на строку.
+            output_path (str): Файл для результатов.
+            collection_db_name (str): Коллекция для RAG (None - ответы без RAG).
+            query_field (str): Поле записи с текстом вопроса.
+            batch_size (int): Сколько вопросов обрабатывается за один вызов process_batch.
+
+        Returns:
+            int: Число обработанных записей.
+        """
+        processed = 0
+        with open(input_path, "r", encoding="utf-8") as input_file, open(output_path, "w", encoding="utf-8") as output_file:
+            records = []
+            for line in input_file:
+                if not line.strip():
+                    continue
+                try:
+                    records.append((json.loads(line), None))
+                except json.JSONDecodeError as e:
+                    logger.error(f"Невалидная JSON запись в {input_path}: {e}")
+                    records.append(({"raw": line.rstrip("\n")}, f"невалидный JSON: {e}"))
+                if len(records) >= batch_size:
+                    processed += self._process_jsonl_batch(records, output_file, collection_db_name, query_field)
+                    records = []
+            if records:
+                processed += self._process_jsonl_batch(records, output_file, collection_db_name, query_field)
+
+        logger.info(f"Обработано {processed} записей из {input_path}, результаты записаны в {output_path}")
+        return processed
+
+    def _process_jsonl_batch(self, records: list[tuple[dict, str | None]], output_file, collection_db_name, query_field: str) -> int:
+        """
+        Обрабатывает пачку записей process_jsonl.
+
+        Args:
+            records (list): Пары (запись, ошибка разбора строки или None).
+        """
+        errors = []
+        queries = []
+        for record, error in records:
+            if error is None and not (isinstance(record, dict) and isinstance(record.get(query_field), str)):
+                error = f"в записи нет строкового поля '{query_field}'"
+            errors.append(error)
+            if error is None:
+                queries.append(record[query_field])
+
+        try:
+            query_elements = iter(self.process_batch(queries, collection_db_name))
+        except Exception as e:
+            logger.error(f"Ошибка пакетной обработки {len(queries)} вопросов: {e}")
+            query_elements = iter([QueryElement(query, error=f"пакетная обработка: {e}") for query in queries])
 
-        if collection_db_name is not None and self.vector_db_node.db_has_collection(collection_db_name):
+        for (record, _), error in zip(records, errors):
+            query_element = next(query_elements) if error is None else QueryElement(None, error=error)
+            result = dict(record) if isinstance(record, dict) else {"record": record}
+            result["answer"] = query_element.answer
+            result["contexts"] = [chunk.page_content for chunk in query_element.prompt_chunks or []]
+            result["context_sources"] = [chunk.metadata.get("source_url", "") for chunk in query_element.prompt_chunks or []]
+            result["error"] = query_element.error
+            output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output_file.flush()
+        return len(records)
+
+    async def aclose(self) -> None:
+        """Закрывает пулы асинхронных соединений текущего event loop."""
+        await self.embedder_node.async_client.aclose()
+        await self.reranker_node.async_client.aclose()
+
+    def _uses_rag(self, collection_db_name) -> bool:
+        return collection_db_name is not None and self.vector_db_node.db_has_collection(collection_db_name)
+
+    def _retrieve(self, query_element: QueryElement, show_data_info=False) -> int | None:
+        """
+        Уточняет запрос с учетом чата, ищет и реранжирует чанки для ответа с RAG.
+        Если ответ найден в семантическом кэше, он записывается в query_element.answer.
+
+        Returns:
+            int | None: Версия коллекции, под которой ответ можно сохранить в семантический кэш
+            (None - ответ не кэшируется).
+        """
+        collection_db_name = query_element.collection_db_name
+        source_urls = query_element.source_urls
+        cache_version = None
+
+        # Самодостаточные follow-up запросы не уточняются LLM
+        needs_rewrite = self.rewrite_router_node.needs_rewrite(query_element)
+
+        if self.speculative_retrieval and needs_rewrite:
+            # Поиск по исходному запросу идет параллельно с его уточнением LLM
+            rewrite = self.executor.submit(self._rewrite_query, query_element)
+            speculative_embedding = self.embedder_node.embed_query(query_element.query)
+            speculative_chunks = self.vector_db_node.search_similar_chunks(collection_db_name, speculative_embedding, source_urls)
+
+            query_element.upgraded_query = rewrite.result()
+            query_element.query_embedding = self.embedder_node.embed_query(query_element.upgraded_query)
+            if self._can_reuse_speculative(query_element, speculative_embedding):
+                similar_chunks = speculative_chunks
+            else:
+                upgraded_chunks = self.vector_db_node.search_similar_chunks(collection_db_name, query_element.query_embedding, source_urls)
+                similar_chunks = self._merge_speculative(upgraded_chunks, speculative_chunks)
+        else:
             # уточнение запроса с учетом чата:
-            query_element.upgraded_query = self.llm_node.make_abstract(query_element)
-            embedding = self.embedder_node.embed_query(query_element.upgraded_query)
-            similar_chunks = self.vector_db_node.search_similar_chunks(collection_db_name, embedding)
-            query_element.top_chunks = self.embedder_node.chunks_to_documents(similar_chunks)
-
-            if show_data_info:
-                print("Результат векторного поиска:")
-                query_element.display_chunks(query_element.top_chunks, limit_size=200)
-                print("\n=======================\n")
-            
+            query_element.upgraded_query = self._rewrite_query(query_element) if needs_rewrite else query_element.query
+            query_element.query_embedding = self.embedder_node.embed_query(query_element.upgraded_query)
+
+            cache_version = self._lookup_semantic_cache(query_element)
+            if query_element.answer is not None:
+                return None
+
+            similar_chunks = self.vector_db_node.search_similar_chunks(collection_db_name, query_element.query_embedding, source_urls)
+
+        rerank = self._prepare_candidates(query_element, similar_chunks)
+        self._display_chunks("Результат векторного поиска:", query_element.top_chunks, show_data_info)
+        
+        if rerank:
             query_element = self.reranker_node.process(query_element)
+            self._display_chunks("Результат после реранка:", query_element.prompt_chunks, show_data_info)
+        else:
+            query_element = self.reranker_node.select_without_rerank(query_element)
+
+        return cache_version
+
+    async def _aretrieve(self, query_element: QueryElement, show_data_info=False) -> int | None:
+        """Асинхронный вариант _retrieve."""
+        collection_db_name = query_element.collection_db_name
+        source_urls = query_element.source_urls
+        cache_version = None
+
+        needs_rewrite = self.rewrite_router_node.needs_rewrite(query_element)
 
-            if show_data_info:
-                print("Результат после реранка:")
-                query_element.display_chunks(query_element.prompt_chunks, limit_size=200)
-                print("\n=======================\n")
+        if self.speculative_retrieval and needs_rewrite:
+            rewrite = asyncio.create_task(self._arewrite_query(query_element))
+            speculative_embedding = await self.embedder_node.aembed_query(query_element.query)
+            speculative_chunks = await self.vector_db_node.asearch_similar_chunks(collection_db_name, speculative_embedding, source_urls)
 
-            query_element = self.llm_node.answer_with_rag(query_element, show_data_info)
+            query_element.upgraded_query = await rewrite
+            query_element.query_embedding = await self.embedder_node.aembed_query(query_element.upgraded_query)
+            if self._can_reuse_speculative(query_element, speculative_embedding):
+                similar_chunks = speculative_chunks
+            else:
+                upgraded_chunks = await self.vector_db_node.asearch_similar_chunks(collection_db_name, query_element.query_embedding, source_urls)
+                similar_chunks = self._merge_speculative(upgraded_chunks, speculative_chunks)
         else:
-            query_element = self.llm_node.answer(query_element, show_data_info)
+            query_element.upgraded_query = await self._arewrite_query(query_element) if needs_rewrite else query_element.query
+            query_element.query_embedding = await self.embedder_node.aembed_query(query_element.upgraded_query)
 
-        return query_element
+            cache_version = self._lookup_semantic_cache(query_element)
+            if query_element.answer is not None:
+                return None
+
+            similar_chunks = await self.vector_db_node.asearch_similar_chunks(collection_db_name, query_element.query_embedding, source_urls)
+
+        if self.hybrid_retrieval:
+            rerank = await asyncio.to_thread(self._prepare_candidates, query_element, similar_chunks)
+        else:
+            rerank = self._prepare_candidates(query_element, similar_chunks)
+        self._display_chunks("Результат векторного поиска:", query_element.top_chunks, show_data_info)
+
+        if rerank:
+            query_element = await self.reranker_node.aprocess(query_element)
+            self._display_chunks("Результат после реранка:", query_element.prompt_chunks, show_data_info)
+        else:
+            query_element = self.reranker_node.select_without_rerank(query_element)
+
+        return cache_version
+
+    def _rewrite_query(self, query_element: QueryElement) -> str:
+        """Уточняет запрос с учетом чата и передает время уточнения роутеру для оценки экономии."""
+        start = time.perf_counter()
+        upgraded_query = self.llm_node.make_abstract(query_element)
+        self.rewrite_router_node.record_rewrite_time((time.perf_counter() - start) * 1000)
+        return upgraded_query
+
+    async def _arewrite_query(self, query_element: QueryElement) -> str:
+        """Асинхронный вариант _rewrite_query."""
+        start = time.perf_counter()
+        upgraded_query = await self.llm_node.amake_abstract(query_element)
+        self.rewrite_router_node.record_rewrite_time((time.perf_counter() - start) * 1000)
+        return upgraded_query
+
+    def _can_reuse_speculative(self, query_element: QueryElement, speculative_embedding: list) -> bool:
+        """
+        Проверяет, можно ли взять результат поиска по исходному запросу без повторного поиска:
+        уточненный запрос совпадает с исходным или очень близок к нему по эмбеддингу.
+        """
+        if self.embedder_node.normalize_query(query_element.upgraded_query) == self.embedder_node.normalize_query(query_element.query):
+            logger.info("Уточненный запрос совпал с исходным, используется спекулятивный поиск")
+            return True
+
+        upgraded = np.asarray(query_element.query_embedding, dtype=np.float32)
+        speculative = np.asarray(speculative_embedding, dtype=np.float32)
+        similarity = float(upgraded @ speculative / (np.linalg.norm(upgraded) * np.linalg.norm(speculative) + 1e-12))
+        if similarity >= self.speculative_reuse_similarity:
+            logger.info(f"Уточненный запрос близок к исходному ({similarity:.4f}), используется спекулятивный поиск")
+            return True
+        return False
+
+    def _merge_speculative(self, upgraded_chunks: list, speculative_chunks: list) -> list:
+        """
+        Объединяет результаты поиска по уточненному и исходному запросам: без повторов текста,
+        по убыванию близости, не больше top_k векторного поиска.
+        Если объединение выключено, возвращает только результаты по уточненному запросу.
+        """
+        if not self.speculative_merge:
+            return upgraded_chunks
+
+        merged = {}
+        for chunk in upgraded_chunks + speculative_chunks:
+            text, distance = chunk[0], chunk[1]
+            if text not in merged or distance > merged[text][1]:
+                merged[text] = chunk
+        merged_chunks = sorted(merged.values(), key=lambda chunk: chunk[1], reverse=True)
+        return merged_chunks[:self.vector_db_node.top_k]
+
+    def _prepare_candidates(self, query_element: QueryElement, similar_chunks: list) -> bool:
+        """
+        Отбирает кандидатов для реранка по оценкам векторного поиска и записывает их в query_element.top_chunks.
+        Лексические результаты добавляются, только если реранк не пропущен.
+
+        Returns:
+            bool: Нужен ли реранк.
+        """
+        similar_chunks, rerank = self.retrieval_policy_node.process(similar_chunks)
+        if rerank:
+            similar_chunks = self._fuse_lexical(query_element, similar_chunks)
+        query_element.top_chunks = self.embedder_node.chunks_to_documents(similar_chunks)
+        return rerank
+
+    def _fuse_lexical(self, query_element: QueryElement, similar_chunks: list) -> list:
+        """
+        Добавляет к результатам векторного поиска результаты BM25 по уточненному запросу и объединяет их
+        методом RRF в не более чем candidates кандидатов для реранка.
+        Если гибридный поиск выключен или у коллекции нет лексического индекса, возвращает результаты как есть.
+        """
+        if not self.hybrid_retrieval:
+            return similar_chunks
+
+        lexical_chunks = self.lexical_index_node.search(
+            query_element.collection_db_name, query_element.upgraded_query, source_urls=query_element.source_urls
+        )
+        if not lexical_chunks:
+            return similar_chunks
+
+        fused_chunks = reciprocal_rank_fusion([similar_chunks, lexical_chunks], self.hybrid_rrf_k, self.hybrid_candidates)
+        logger.info(
+            f"Гибридный поиск: векторных {len(similar_chunks)}, лексических {len(lexical_chunks)}, "
+            f"кандидатов для реранка {len(fused_chunks)}"
+        )
+        return fused_chunks
+
+    def _lookup_semantic_cache(self, query_element: QueryElement) -> int | None:
+        """
+        Ищет ответ в семантическом кэше и при попадании записывает его в query_element.
+
+        Returns:
+            int | None: Версия коллекции для сохранения ответа в кэш (None - ответ не кэшируется).
+        """
+        # Ответы кэшируются только для первых сообщений: ответ на них не зависит от истории чата.
+        # Ответы с фильтром по источникам не кэшируются: кэш не различает фильтры
+        if self.semantic_cache is None or (query_element.previous_messages and query_element.message_number > 0):
+            return None
+        if query_element.source_urls is not None:
+            return None
+
+        collection_db_name = query_element.collection_db_name
+        cache_version = self.vector_db_node.get_collection_version(collection_db_name)
+        cached = self.semantic_cache.lookup(collection_db_name, cache_version, query_element.query_embedding)
+        if cached is not None:
+            logger.info(f"Ответ взят из семантического кэша (близость {cached['similarity']:.4f} к запросу '{cached['query']}')")
+            query_element.prompt_chunks = cached["prompt_chunks"]
+            query_element.answer = cached["answer"]
+        return cache_version
+
+    @staticmethod
+    def _display_chunks(title: str, chunks: list, show_data_info: bool) -> None:
+        if show_data_info:
+            print(title)
+            QueryElement.display_chunks(chunks, limit_size=200)
+            print("\n=======================\n")
+
+    def _stream_with_rag(self, query_element: QueryElement, cache_version: int | None, show_data_info=False):
+        yield from self.llm_node.stream_answer_with_rag(query_element, show_data_info)
+        self._store_in_semantic_cache(query_element, cache_version)
+
+    def _store_in_semantic_cache(self, query_element: QueryElement, cache_version: int | None) -> None:
+        if cache_version is None or not query_element.answer:
+            return
+        self.semantic_cache.store(
+            query_element.collection_db_name, cache_version, query_element.query_embedding,
+            query_element.query, query_element.answer, query_element.prompt_chunks
+        )
     
     def get_new_history(self, query_element: QueryElement) -> list:
         return self.llm_node.get_new_history(query_element)
\ No newline at end of file
@@ -0,0 +1,208 @@
+import logging
+import time
+
+import numpy as np
+import yaml
+
+from utils_local.utils import profile_time
+from nodes.VectorDBFactory import create_vector_db_node
+
+# Настройка логгера для работы в режиме INFO
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+class IndexTuner:
+    """
+    Модуль подбора параметров ANN индекса коллекции. Перебор идет на временной копии коллекции
+    (<имя>__tune), поэтому рабочая коллекция все время доступна для поиска и ее индекс не меняется.
+    Для каждого варианта из сетки индекс копии перестраивается, после чего измеряются recall@k относительно
+    точного поиска и задержки p50/p99 одиночных запросов.
+    В качестве запросов берется случайная выборка эмбеддингов коллекции; эти записи не копируются,
+    иначе каждый запрос находил бы сам себя и recall был бы завышен.
+    """
+
+    SCRATCH_SUFFIX = "__tune"
+
+    def __init__(self) -> None:
+        with open("configs/app_config.yaml", "r") as file:
+            config = yaml.safe_load(file)
+
+        self.vector_db_node = create_vector_db_node(config["vector_db_node"])
+
+        tuner_config = config["index_tuner"]
+        self.num_queries = tuner_config["num_queries"]  # Сколько записей коллекции используется как запросы
+        self.warmup_queries = tuner_config["warmup_queries"]  # Сколько запросов выполняется до замера задержки
+        self.recall_target = tuner_config["recall_target"]  # Минимальный recall@k для рекомендации
+        self.grid = tuner_config["grid"]  # Варианты индекса: type, params, search_params (список)
+
+    @profile_time
+    def process(self, collection_name: str, k=None, num_queries=None, recall_target=None, seed=0) -> dict:
+        """
+        Перебирает сетку параметров индекса на временной копии коллекции, после перебора копия удаляется.
+
+        Args:
+            collection_name (str): Имя коллекции.
+            k (int): Для какого числа результатов считается recall (по умолчанию top_k).
+            num_queries (int): Число запросов (по умолчанию из конфига).
+            recall_target (float): Минимальный recall@k для рекомендации (по умолчанию из конфига).
+            seed (int): Seed выборки запросов.
+
+        Returns:
+            dict: {"results": список замеров по вариантам, "recommended": самый быстрый по p50 вариант
+                с recall не ниже целевого или None}.
+        """
+        k = k or self.vector_db_node.top_k
+        num_queries = num_queries or self.num_queries
+        recall_target = recall_target or self.recall_target
+
+        if not hasattr(self.vector_db_node, "rebuild_index"):
+            logger.error("Бэкенд векторной БД ищет точно и не использует ANN индекс, подбирать нечего")
+            return {"results": [], "recommended": None}
+
+        scratch_name = collection_name + self.SCRATCH_SUFFIX
+        query_ids = self._sample_ids(collection_name, num_queries, seed)
+        if not query_ids:
+            logger.error(f"Коллекция '{collection_name}' пуста или не существует")
+            return {"results": [], "recommended": None}
+
+        results = []
+        try:
+            queries = self._copy_without_queries(collection_name, scratch_name, query_ids)
+            exact_ids = self._exact_top_k(scratch_name, queries, k)
+            logger.info(f"Точный поиск для {len(queries)} запросов выполнен, начинается перебор {len(self.grid)} вариантов индекса")
+            for variant in self.grid:
+                results.extend(self._evaluate_variant(scratch_name, variant, queries, exact_ids, k))
+        finally:
+            if self.vector_db_node.db_has_collection(scratch_name):
+                self.vector_db_node.delete_milvus_collection(scratch_name)
+
+        passed = [result for result in results if result["recall"] >= recall_target]
+        recommended = min(passed, key=lambda result: (result["p50_ms"], result["p99_ms"])) if passed else None
+        self._log_report(results, recommended, k, recall_target)
+        return {"results": results, "recommended": recommended}
+
+    def _sample_ids(self, collection_name: str, num_queries: int, seed: int) -> set:
+        """
+        Равномерная выборка id записей коллекции (reservoir sampling за один проход).
+        Запросами становится не больше половины записей, чтобы во временной копии оставались данные для поиска.
+        """
+        rng = np.random.default_rng(seed)
+        sample = []
+        seen = 0
+        for ids, _ in self.vector_db_node.iter_embeddings(collection_name):
+            for record_id in ids:
+                if len(sample) < num_queries:
+                    sample.append(record_id)
+                else:
+                    j = rng.integers(0, seen + 1)
+                    if j < num_queries:
+                        sample[j] = record_id
+                seen += 1
+        return set(sample[:seen // 2])
+
+    def _copy_without_queries(self, collection_name: str, scratch_name: str, query_ids: set) -> np.ndarray:
+        """
+        Создает временную копию коллекции из всех эмбеддингов, кроме отобранных запросов (тексты не копируются).
+
+        Returns:
+            np.ndarray: Эмбеддинги запросов.
+        """
+        if self.vector_db_node.db_has_collection(scratch_name):
+            self.vector_db_node.delete_milvus_collection(scratch_name)
+        self.vector_db_node.create_milvus_collection(scratch_name)
+
+        queries = []
+        for ids, embeddings in self.vector_db_node.iter_embeddings(collection_name):
+            is_query = np.fromiter((record_id in query_ids for record_id in ids), dtype=bool, count=len(ids))
+            queries.extend(embeddings[is_query])
+            documents = embeddings[~is_query]
+            if len(documents):
+                self.vector_db_node.insert_data_into_milvus(scratch_name, [""] * len(documents), documents.tolist())
+        # Индексы строятся по запечатанным сегментам, иначе часть данных ищется перебором
+        self.vector_db_node.flush_collection(scratch_name)
+        logger.info(f"Создана временная копия '{scratch_name}' без {len(queries)} записей-запросов")
+        return np.asarray(queries, dtype=np.float32)
+
+    def _exact_top_k(self, collection_name: str, queries: np.ndarray, k: int) -> list[set]:
+        """Точные top-k по скалярному произведению, коллекция читается пачками."""
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for ids, embeddings in self.vector_db_node.iter_embeddings(collection_name):
+            scores = np.concatenate([best_scores, queries @ embeddings.T], axis=1)
+            candidate_ids = np.concatenate([best_ids, np.broadcast_to(np.asarray(ids, dtype=np.int64), (len(queries), len(ids)))], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                candidate_ids = np.take_along_axis(candidate_ids, top, axis=1)
+            best_scores, best_ids = scores, candidate_ids
+        return [set(row.tolist()) for row in best_ids]
+
+    def _evaluate_variant(self, collection_name: str, variant: dict, queries: np.ndarray, exact_ids: list[set], k: int) -> list[dict]:
+        index_type = variant["type"]
+        params = dict(self.vector_db_node.INDEX_DEFAULTS[index_type][0])
+        params.update(variant.get("params") or {})
+        index_params = {"metric_type": "IP", "index_type": index_type, "params": params}
+
+        build_sec = self.vector_db_node.rebuild_index(collection_name, index_params)
+        index_info = self.vector_db_node.get_index_info(collection_name)
+        if index_info is None or index_info["index_type"] != index_type:
+            logger.error(f"Не удалось построить индекс {index_type} {params}, вариант пропущен")
+            return []
+
+        results = []
+        for search_params in variant.get("search_params") or [None]:
+            if search_params is None:
+                param = self.vector_db_node.get_search_params(collection_name, index_info, limit=k)
+            else:
+                param = {"metric_type": "IP", "params": dict(search_params)}
+            try:
+                recall, latencies = self._measure(collection_name, queries, exact_ids, param, k)
+            except Exception as e:
+                logger.error(f"Ошибка поиска с индексом {index_type} {params} и параметрами {param['params']}: {e}")
+                continue
+            results.append({
+                "index_type": index_type,
+                "params": params,
+                "search_params": param["params"],
+                "recall": recall,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_sec": build_sec,
+            })
+            logger.info(f"{index_type} {params} {param['params']}: recall@{k}={recall:.4f}, p50={results[-1]['p50_ms']:.2f} мс, p99={results[-1]['p99_ms']:.2f} мс")
+        return results
+
+    def _measure(self, collection_name: str, queries: np.ndarray, exact_ids: list[set], param: dict, k: int) -> tuple[float, list]:
+        """Выполняет запросы по одному (как в чате) и возвращает средний recall@k и задержки в мс."""
+        for query in queries[:self.warmup_queries]:
+            self.vector_db_node.search_ids(collection_name, [query.tolist()], param, k)
+
+        recalls = []
+        latencies = []
+        for query, expected in zip(queries, exact_ids):
+            start = time.perf_counter()
+            found = self.vector_db_node.search_ids(collection_name, [query.tolist()], param, k)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected.intersection(found)) / len(expected))
+        return float(np.mean(recalls)), latencies
+
+    @staticmethod
+    def _log_report(results: list[dict], recommended: dict | None, k: int, recall_target: float) -> None:
+        lines = [f"{'index':<10} {'params':<40} {'search':<22} {'recall@' + str(k):>10} {'p50 мс':>8} {'p99 мс':>8} {'build с':>8}"]
+        for result in results:
+            lines.append(
+                f"{result['index_type']:<10} {str(result['params']):<40} {str(result['search_params']):<22} "
+                f"{result['recall']:>10.4f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['build_sec']:>8.1f}"
+            )
+        logger.info("Результаты подбора индекса:\n" + "\n".join(lines))
+        if recommended is None:
+            logger.warning(f"Ни один вариант не достиг recall@{k} >= {recall_target}")
+        else:
+            logger.info(
+                f"Рекомендуется: type: {recommended['index_type']}, params: {recommended['params']}, "
+                f"search_params: {recommended['search_params']} (recall@{k}={recommended['recall']:.4f}, p50={recommended['p50_ms']:.2f} мс)"
+            )
@@ -1,13 +1,16 @@
 import logging
-from typing import List
+import queue
+import threading
+from typing import Iterator, List
 from utils_local.utils import profile_time
 import yaml
 
 from elements.DataElement import DataElement
 from nodes.DataParsingNode import DataParsingNode
 from nodes.ChunkingNode import ChunkingNode
-from nodes.VectorDBNode import VectorDBNode
+from nodes.VectorDBFactory import create_vector_db_node
 from nodes.EmbedderNode import EmbedderNode
+from nodes.LexicalIndexNode import LexicalIndexNode
 
 # Настройка логгера для работы в режиме INFO
 logging.basicConfig(
@@ -26,24 +29,234 @@ class MakeDatasetRAG:
         
         self.data_parsing_node = DataParsingNode(config["data_parsing_node"])
         self.chunking_node = ChunkingNode(config["chunking_node"])
-        self.vector_db_node = VectorDBNode(config["vector_db_node"])
+        self.vector_db_node = create_vector_db_node(config["vector_db_node"])
         self.embedder_node = EmbedderNode(config["embedder_node"])
+        self.lexical_index_node = LexicalIndexNode(config["lexical_index_node"])
+
+        service_config = config["make_dataset_rag"]
+        self.stream_batch_size = service_config["stream_batch_size"]  # Сколько чанков эмбеддится и вставляется за раз
+        self.stream_queue_batches = service_config["stream_queue_batches"]  # Сколько готовых батчей может ждать эмбеддинга
        
 
     @profile_time
-    def process(self, url_list: List[str], collection_db_name="default", show_data_info=False):
-        """Наполняет датасет по данным url"""
-        data_element = DataElement(url_list, collection_db_name)
-        data_element = self.data_parsing_node.process(data_element)
-        data_element = self.chunking_node.process(data_element)
-
-        if show_data_info:
-            data_element.save_chunks()
-            data_element.save_parsing_result()
-            print(data_element)
-
-        embeddings = self.embedder_node.embed_documents(data_element.chunks)
+    def process(self, url_list: List[str], collection_db_name="default", show_data_info=False, incremental=False):
+        """
+        Наполняет датасет по данным url.
+        При incremental=True существующая коллекция не пересоздается: эмбеддятся и добавляются
+        только новые чанки, а затем удаляются устаревшие, так что коллекция доступна для поиска все время.
+        Устаревшими считаются только чанки страниц, которые удалось скачать заново.
+        """
+        try:
+            data_element = DataElement(url_list, collection_db_name)
+            data_element = self.data_parsing_node.process(data_element)
+            data_element = self.chunking_node.process(data_element)
+
+            if show_data_info:
+                data_element.save_chunks()
+                data_element.save_parsing_result()
+                print(data_element)
+
+            if incremental and self.vector_db_node.supports_incremental(collection_db_name):
+                self._warn_missing_lexical_index(collection_db_name)
+                self._update_collection(data_element)
+                return
+
+            if incremental and self.vector_db_node.db_has_collection(collection_db_name):
+                logger.warning(f"Коллекция '{collection_db_name}' создана без хэшей чанков, выполняется полная пересборка")
+
+            embeddings = self.embedder_node.embed_documents(data_element.chunks)
+        
+            self.delete_collection(collection_db_name)
+            # Число записей известно заранее, поэтому индекс сразу создается нужного типа
+            self.vector_db_node.create_milvus_collection(collection_db_name, expected_rows=len(data_element.chunks))
+            self.vector_db_node.insert_data_into_milvus(
+                collection_db_name, data_element.chunks, embeddings, data_element.chunk_sources, data_element.chunk_titles
+            )
+            self._add_to_lexical_index(collection_db_name, data_element.chunks, data_element.chunk_sources, data_element.chunk_titles)
+        finally:
+            # Индекс кэша эмбеддингов сбрасывается на диск один раз за загрузку
+            self.embedder_node.flush_cache()
+
+    @profile_time
+    def process_streaming(self, url_list: List[str], collection_db_name="default", incremental=False):
+        """
+        Наполняет датасет потоково: парсинг и чанкинг идут в отдельном потоке, а эмбеддинг и вставка
+        выполняются батчами по мере поступления чанков. Между стадиями ограниченная очередь,
+        поэтому пиковая память зависит от stream_batch_size, а не от размера корпуса.
+        """
+        try:
+            if incremental and self.vector_db_node.supports_incremental(collection_db_name):
+                self._warn_missing_lexical_index(collection_db_name)
+                existing_hashes = self.vector_db_node.get_chunk_hashes(collection_db_name)
+                actual_hashes = set()
+            else:
+                if incremental and self.vector_db_node.db_has_collection(collection_db_name):
+                    logger.warning(f"Коллекция '{collection_db_name}' создана без хэшей чанков, выполняется полная пересборка")
+                existing_hashes = None
+                actual_hashes = None
+                self.delete_collection(collection_db_name)
+                self.vector_db_node.create_milvus_collection(collection_db_name)
+
+            inserted = 0
+            fetched_urls = set()
+            for batch in self._iter_chunk_batches(url_list, fetched_urls):
+                chunks = [chunk for chunk, _, _ in batch]
+                sources = [source for _, source, _ in batch]
+                titles = [title for _, _, title in batch]
+                if existing_hashes is not None:
+                    chunks, sources, titles = self._select_new_chunks(chunks, sources, titles, existing_hashes, actual_hashes)
+                if not chunks:
+                    continue
+                embeddings = self.embedder_node.embed_documents(chunks)
+                self.vector_db_node.insert_data_into_milvus(collection_db_name, chunks, embeddings, sources, titles)
+                self._add_to_lexical_index(collection_db_name, chunks, sources, titles)
+                inserted += len(chunks)
+
+            logger.info(f"Потоковая загрузка в '{collection_db_name}' завершена, добавлено {inserted} чанков")
+            if existing_hashes is not None:
+                self._delete_stale_chunks(collection_db_name, existing_hashes, actual_hashes, fetched_urls)
+            self._warn_index_outdated(collection_db_name)
+        finally:
+            # Индекс кэша эмбеддингов сбрасывается на диск один раз за загрузку
+            self.embedder_node.flush_cache()
+
+    def _iter_chunk_batches(self, url_list: List[str], fetched_urls: set | None = None) -> Iterator[list]:
+        """
+        Запускает парсинг и чанкинг в фоновом потоке и отдает батчи кортежей (чанк, url источника, заголовок источника).
+        Если очередь заполнена, фоновый поток ждет (backpressure).
+        В fetched_urls добавляются url страниц, которые удалось скачать (с непустым текстом).
+        """
+        batch_queue = queue.Queue(maxsize=self.stream_queue_batches)
+        stop_event = threading.Event()
+        finished = object()
+        filter_stats = {}
+        deduplicator = self.chunking_node.create_deduplicator()
+        produced = [0]
+
+        def put(item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    batch_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                batch = []
+                pages = self.data_parsing_node.iter_process(url_list, filter_stats)
+                for url, title, chunks in self.chunking_node.iter_split_pages(pages, deduplicator, filter_stats):
+                    if fetched_urls is not None:
+                        fetched_urls.add(url)
+                    for chunk in chunks:
+                        batch.append((chunk, url, title))
+                        produced[0] += 1
+                        if len(batch) >= self.stream_batch_size:
+                            if not put(batch):
+                                return
+                            batch = []
+                if batch and not put(batch):
+                    return
+                put(finished)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=produce, name="rag-ingest-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batch_queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Останавливаем фоновый поток, если потребитель прервался раньше времени
+            stop_event.set()
+            producer.join()
+            self.data_parsing_node.log_filter_stats(filter_stats)
+            self.chunking_node.log_dedup_stats(filter_stats, produced[0])
+
+    def _select_new_chunks(self, chunks, sources, titles, existing_hashes, actual_hashes):
+        """
+        Отбирает чанки, которых еще нет в коллекции, и добавляет хэши всех чанков в actual_hashes.
         
+        Returns:
+            tuple: (новые чанки, их url источников, их заголовки источников).
+        """
+        new_chunks = []
+        new_sources = []
+        new_titles = []
+        for chunk, source, title in zip(chunks, sources, titles):
+            chunk_hash = self.vector_db_node.chunk_hash(chunk, source, title)
+            if chunk_hash not in existing_hashes and chunk_hash not in actual_hashes:
+                new_chunks.append(chunk)
+                new_sources.append(source)
+                new_titles.append(title)
+            actual_hashes.add(chunk_hash)
+        return new_chunks, new_sources, new_titles
+
+    def _delete_stale_chunks(self, collection_db_name, existing_hashes, actual_hashes, fetched_urls) -> None:
+        """
+        Удаляет записи, хэшей которых нет среди актуальных чанков. Удаляются только чанки страниц,
+        которые в этот раз удалось скачать: если страница не загрузилась (таймаут, 5xx) или ее нет в списке url,
+        ее чанки остаются в коллекции.
+        """
+        stale_hashes = [
+            chunk_hash for chunk_hash, entry in existing_hashes.items()
+            if chunk_hash not in actual_hashes and entry["source_url"] in fetched_urls
+        ]
+        stale_ids = [record_id for chunk_hash in stale_hashes for record_id in existing_hashes[chunk_hash]["ids"]]
+        logger.info(f"Устаревших чанков в '{collection_db_name}': {len(stale_ids)}")
+        if stale_ids:
+            self.vector_db_node.delete_records(collection_db_name, stale_ids)
+            self.lexical_index_node.delete_chunks(collection_db_name, stale_hashes)
+
+    def _update_collection(self, data_element: DataElement) -> None:
+        """Инкрементально приводит коллекцию к чанкам data_element."""
+        collection_db_name = data_element.collection_db_name
+        existing_hashes = self.vector_db_node.get_chunk_hashes(collection_db_name)
+        actual_hashes = set()
+        new_chunks, new_sources, new_titles = self._select_new_chunks(
+            data_element.chunks, data_element.chunk_sources, data_element.chunk_titles, existing_hashes, actual_hashes
+        )
+        logger.info(
+            f"Инкрементальное обновление '{collection_db_name}': "
+            f"{len(new_chunks)} новых чанков, {len(actual_hashes) - len(new_chunks)} без изменений"
+        )
+
+        # Сначала добавляем новые чанки, потом удаляем старые - поиск по коллекции не прерывается
+        if new_chunks:
+            embeddings = self.embedder_node.embed_documents(new_chunks)
+            self.vector_db_node.insert_data_into_milvus(collection_db_name, new_chunks, embeddings, new_sources, new_titles)
+            self._add_to_lexical_index(collection_db_name, new_chunks, new_sources, new_titles)
+        self._delete_stale_chunks(collection_db_name, existing_hashes, actual_hashes, set(data_element.url_data))
+        self._warn_index_outdated(collection_db_name)
+
+    def _add_to_lexical_index(self, collection_db_name, chunks, sources, titles) -> None:
+        chunk_hashes = [
+            self.vector_db_node.chunk_hash(chunk, source, title) for chunk, source, title in zip(chunks, sources, titles)
+        ]
+        self.lexical_index_node.add_chunks(collection_db_name, chunks, chunk_hashes, sources, titles)
+
+    def _warn_index_outdated(self, collection_db_name) -> None:
+        # Индекс не перестраивается при загрузке: перестройка выгружает коллекцию и прерывает поиск
+        if self.vector_db_node.index_needs_rebuild(collection_db_name) is not None:
+            logger.warning(
+                f"Индекс коллекции '{collection_db_name}' не соответствует числу записей. "
+                f"Перестройте его отдельно: python tune_index.py {collection_db_name} --optimize"
+            )
+
+    def _warn_missing_lexical_index(self, collection_db_name) -> None:
+        if self.lexical_index_node.enabled and not self.lexical_index_node.has_index(collection_db_name):
+            logger.warning(
+                f"У коллекции '{collection_db_name}' нет лексического индекса, в него попадут только новые чанки. "
+                f"Для полного индекса пересоздайте коллекцию"
+            )
+
+    def delete_collection(self, collection_db_name) -> None:
+        """Удаляет коллекцию из векторной БД вместе с ее лексическим индексом."""
         self.vector_db_node.delete_milvus_collection(collection_db_name)
-        self.vector_db_node.create_milvus_collection(collection_db_name)
-        self.vector_db_node.insert_data_into_milvus(collection_db_name, data_element.chunks, embeddings)
+        self.lexical_index_node.delete_collection(collection_db_name)
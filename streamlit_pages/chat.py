@@ -29,11 +29,15 @@ def chat_process(ask):
         )
         
         # Установка collection_db_name
+        source_urls = None
         if selected_collection == "Без коллекции":
             collection_db_name = None
             st.markdown("__Mодель будет отвечать без RAG__")
         else:
             collection_db_name = selected_collection
+            # Необязательный фильтр: поиск только по чанкам с указанных страниц
+            source_filter_input = st.text_area("Искать только на страницах (url, по одному на строку):", value="")
+            source_urls = [url.strip() for url in source_filter_input.splitlines() if url.strip()] or None
 
 
     # Отображение истории чата
@@ -55,14 +59,18 @@ def chat_process(ask):
         # Обработка запроса через AskLLM
         message_number = (len(st.session_state.chat_history) - 1) // 2  # Номер текущего сообщения
        
-        with st.spinner("Модель отвечает"):
-            res = ask.process(prompt, message_number, collection_db_name, st.session_state.previous_messages)
+        with st.spinner("Поиск информации"):
+            res, answer_stream = ask.process_stream(
+                prompt, message_number, collection_db_name, st.session_state.previous_messages, source_urls=source_urls
+            )
 
-        # Получение ответа модели
+        # Ответ модели выводится по мере генерации
+        with st.chat_message("assistant"):
+            st.write_stream(answer_stream)
+
+        # После окончания генерации полный ответ записан в res.answer
         answer = res.answer
         st.session_state.chat_history.append({"role": "assistant", "content": answer})
-        with st.chat_message("assistant"):
-            st.markdown(answer)
 
         # Обновление внутренней истории для AskLLM
         st.session_state.previous_messages = ask.get_new_history(res)
@@ -20,6 +20,10 @@ def settings_rag():
     url_list_input = st.text_area("Введите URL-адреса (по одному на строку):", height=200)
     # Текстовое поле для ввода имени коллекции
     collection_db_name = st.text_input("Введите имя коллекции для создания RAG:", value="")
+    # Инкрементальное обновление: существующая коллекция не удаляется, пересчитываются только изменившиеся чанки
+    incremental = st.checkbox("Обновить существующую коллекцию инкрементально", value=False)
+    # Потоковый режим: страницы обрабатываются и загружаются в БД батчами, без сборки всего корпуса в памяти
+    streaming = st.checkbox("Потоковая загрузка (для больших списков сайтов)", value=False)
 
     # Проверка, что все поля заполнены
     if st.button("Создать RAG датасет"):
@@ -31,7 +35,10 @@ def settings_rag():
                 url_list = [url.strip() for url in url_list_input.splitlines() if url.strip()]
                 
                 # Запускаем процесс создания RAG-датасета
-                make_rag.process(url_list, collection_db_name, show_data_info=True)
+                if streaming:
+                    make_rag.process_streaming(url_list, collection_db_name, incremental=incremental)
+                else:
+                    make_rag.process(url_list, collection_db_name, show_data_info=True, incremental=incremental)
                 st.success(f"RAG датасет '{collection_db_name}' успешно создан.")
             except Exception as e:
                 st.error(f"Произошла ошибка при создании RAG датасета: {e}")
@@ -56,7 +63,7 @@ def settings_rag():
         if st.button("Удалить коллекцию"):
             try:
                 # Вызываем метод для удаления коллекции
-                make_rag.vector_db_node.delete_milvus_collection(selected_collection)
+                make_rag.delete_collection(selected_collection)
                 st.success(f"Коллекция '{selected_collection}' успешно удалена.")
                 
                 # Обновляем список коллекций после удаления
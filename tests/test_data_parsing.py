@@ -0,0 +1,96 @@
+import os
+
+import pytest
+import yaml
+
+# Узел импортирует requests и bs4; без них тесты пропускаются
+DataParsingNode = pytest.importorskip("nodes.DataParsingNode").DataParsingNode
+
+
+def make_node(**overrides):
+    with open("configs/app_config.yaml", "r", encoding="utf-8") as file:
+        config = yaml.safe_load(file)["data_parsing_node"]
+    config["http_cache"] = {"enabled": False, "dir": None, "max_size_mb": 0}
+    config.update(overrides)
+    return DataParsingNode(config)
+
+
+def test_short_lines_are_dropped_by_config_min_words():
+    node = make_node()
+    text = "Меню\nО компании\nТариф стоит дешево\nТариф Базовый стоит 990 рублей"
+    stats = {}
+
+    filtered = node.filter_text(text, "https://example.com/tariffs", stats)
+
+    # Строки из трех слов сохраняются, как и до переноса порога в конфиг
+    assert filtered == "Тариф стоит дешево\nТариф Базовый стоит 990 рублей"
+    assert stats == {"min_words": {"lines": 2, "chars": len("Меню") + len("О компании")}}
+
+
+def test_stop_phrases_apply_only_to_their_site():
+    node = make_node()
+    text = "Skip to content right now\nREADME of the project here"
+
+    assert node.filter_text(text, "https://github.com/org/repo") == "README of the project here"
+    assert node.filter_text(text, "https://example.com/page") == text
+
+
+def test_text_is_cut_from_cutoff_phrase():
+    node = make_node()
+    text = "Полезный текст статьи здесь\nМы используем cookie на сайте\nФутер сайта со ссылками"
+    stats = {}
+
+    assert node.filter_text(text, "https://example.com/page", stats) == "Полезный текст статьи здесь"
+    assert stats["cutoff:*"]["lines"] == 2
+
+
+class FakeResponse:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+    """Сервер со страницей, не менявшейся с первой загрузки: на условный запрос отвечает 304."""
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.body, {"ETag": self.etag})
+
+
+def make_cached_node(tmp_path, session):
+    node = make_node(http_cache={"enabled": True, "dir": str(tmp_path), "max_size_mb": 1})
+    node.session = session
+    return node
+
+
+def test_unchanged_page_is_served_from_cache_after_304(tmp_path):
+    session = FakeSession("<html>page</html>", '"v1"')
+    node = make_cached_node(tmp_path, session)
+
+    assert node._download("https://example.com/page") == "<html>page</html>"
+    assert node._download("https://example.com/page") == "<html>page</html>"
+    assert session.requests == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_page_missing_from_cache_is_downloaded_again_after_304(tmp_path):
+    session = FakeSession("<html>page</html>", '"v1"')
+    node = make_cached_node(tmp_path, session)
+    node._download("https://example.com/page")
+    os.remove(os.path.join(tmp_path, node.http_cache._file_name("https://example.com/page")))
+
+    assert node._download("https://example.com/page") == "<html>page</html>"
+    assert session.requests == [{}, {"If-None-Match": '"v1"'}, {}]
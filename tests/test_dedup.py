@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from utils_local.dedup import ChunkDeduplicator
+
+
+def make_text(seed, words=200):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(5000)}" for _ in range(words))
+
+
+def replace_words(text, count, seed=0):
+    words = text.split()
+    rng = random.Random(seed)
+    for index in rng.sample(range(len(words)), count):
+        words[index] = f"new{index}"
+    return " ".join(words)
+
+
+def lsh_threshold(bands, rows):
+    return (1 / bands) ** (1 / rows)
+
+
+@pytest.mark.parametrize(
+    "num_perm, threshold, expected",
+    [(128, 0.85, (16, 8)), (128, 0.5, (32, 4)), (100, 0.9, (10, 10)), (128, 0.001, (128, 1))],
+)
+def test_band_choice(num_perm, threshold, expected):
+    assert ChunkDeduplicator._choose_bands(num_perm, threshold) == expected
+
+
+@pytest.mark.parametrize("threshold", [0.3, 0.5, 0.7, 0.8, 0.85, 0.9, 0.95])
+def test_lsh_threshold_is_closest_not_above_similarity_threshold(threshold):
+    bands, rows = ChunkDeduplicator._choose_bands(128, threshold)
+    assert bands * rows == 128
+    assert lsh_threshold(bands, rows) <= threshold
+    # Ни одно другое разбиение не дает порог ближе к similarity_threshold снизу
+    for other_rows in [r for r in range(1, 129) if 128 % r == 0]:
+        other = lsh_threshold(128 // other_rows, other_rows)
+        assert not lsh_threshold(bands, rows) < other <= threshold
+
+
+def test_exact_duplicates_ignore_whitespace_and_case():
+    dedup = ChunkDeduplicator(0.85)
+    assert dedup.check("Hello   World\nagain") is None
+    assert dedup.check("hello world again") == "exact"
+
+
+def test_near_duplicate_is_dropped():
+    dedup = ChunkDeduplicator(0.85)
+    text = make_text(1)
+    assert dedup.check(text) is None
+    assert dedup.check(replace_words(text, 1)) == "near"
+
+
+def test_distinct_and_weakly_similar_texts_are_kept():
+    dedup = ChunkDeduplicator(0.85)
+    text = make_text(1)
+    assert dedup.check(text) is None
+    assert dedup.check(make_text(2)) is None
+    # Замена каждого пятого слова задевает почти все шинглы из 5 слов
+    assert dedup.check(replace_words(text, 40)) is None
+
+
+def test_short_texts_use_single_shingle():
+    dedup = ChunkDeduplicator(0.85, shingle_size=5)
+    assert dedup.check("one two three") is None
+    assert dedup.check("one two four") is None
+
+
+def test_signatures_are_deterministic_for_seed():
+    text = make_text(3)
+    first = ChunkDeduplicator(0.85, seed=7)._signature(text)
+    second = ChunkDeduplicator(0.85, seed=7)._signature(text)
+    assert (first == second).all()
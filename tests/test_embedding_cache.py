@@ -0,0 +1,102 @@
+import numpy as np
+
+from utils_local.embedding_cache import EmbeddingCache
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+    found = cache.get_many(["a", "b", "missing"])
+    assert set(found) == {"a", "b"}
+    np.testing.assert_allclose(found["a"], [1.0, 0.0])
+    assert found["a"].dtype == np.float32
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=2)
+    cache.put_many(["a", "b"], [[1.0], [2.0]])
+    cache.get_many(["a"])  # b становится самым давно использованным
+    cache.put_many(["c"], [[3.0]])
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert len(cache) == 2
+
+
+def test_batch_larger_than_cache_keeps_last_items(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=2)
+    cache.put_many(["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    assert set(cache.get_many(["a", "b", "c"])) == {"b", "c"}
+
+
+def test_dimension_change_resets_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a"], [[1.0, 2.0]])
+    cache.put_many(["b"], [[1.0, 2.0, 3.0]])
+    assert set(cache.get_many(["a", "b"])) == {"b"}
+
+
+def test_changes_persist_only_after_flush(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a"], [[1.0, 2.0]])
+    assert len(EmbeddingCache(str(tmp_path), max_items=4)) == 0
+
+    cache.flush()
+    reopened = EmbeddingCache(str(tmp_path), max_items=4)
+    np.testing.assert_allclose(reopened.get_many(["a"])["a"], [1.0, 2.0])
+
+
+def test_max_items_change_resets_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a"], [[1.0]])
+    cache.flush()
+    assert len(EmbeddingCache(str(tmp_path), max_items=8)) == 0
+
+
+def test_make_key_depends_on_model():
+    assert EmbeddingCache.make_key("m1", "text") != EmbeddingCache.make_key("m2", "text")
+
+
+def test_eviction_without_flush_never_maps_old_key_to_new_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=2)
+    cache.put_many(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+    cache.flush()
+    cache.put_many(["c"], [[5.0, 5.0]])  # вытесняет a, индекс на диске не сброшен явно
+
+    # Как после падения процесса: индекс читается с диска
+    reopened = EmbeddingCache(str(tmp_path), max_items=2)
+    found = reopened.get_many(["a", "b", "c"])
+    assert "a" not in found
+    np.testing.assert_allclose(found["b"], [0.0, 1.0])
+
+
+def test_freed_slots_are_reused_after_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=20)
+    cache.put_many([f"k{i}" for i in range(20)], [[float(i)] for i in range(20)])
+    cache.put_many(["new"], [[100.0]])  # вытесняется пачка из EVICT_FRACTION * max_items записей
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), max_items=20)
+    assert len(reopened) == 20
+    reopened.put_many(["other"], [[200.0]])
+    found = reopened.get_many(["new", "other", "k19"])
+    assert {key: float(value[0]) for key, value in found.items()} == {"new": 100.0, "other": 200.0, "k19": 19.0}
+
+
+def test_truncated_vectors_file_starts_empty_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a"], [[1.0, 2.0]])
+    cache.flush()
+    with open(tmp_path / EmbeddingCache.VECTORS_FILE, "r+b") as file:
+        file.truncate(3)
+
+    reopened = EmbeddingCache(str(tmp_path), max_items=4)
+    assert len(reopened) == 0
+    reopened.put_many(["b"], [[3.0, 4.0]])
+    assert set(reopened.get_many(["a", "b"])) == {"b"}
+
+
+def test_corrupted_index_starts_empty_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_items=4)
+    cache.put_many(["a"], [[1.0, 2.0]])
+    cache.flush()
+    (tmp_path / EmbeddingCache.INDEX_FILE).write_text('{"max_items": 4}', encoding="utf-8")
+    assert len(EmbeddingCache(str(tmp_path), max_items=4)) == 0
@@ -0,0 +1,66 @@
+import os
+
+from utils_local.http_cache import HttpCache
+
+KB = 1024 / (1024 * 1024)  # max_size_mb для лимита в 1 КБ
+
+
+def page(size):
+    return "x" * size
+
+
+def cached_urls(cache):
+    return [url for url in ["a", "b", "c", "d"] if cache.get_body(url) is not None]
+
+
+def test_conditional_headers_from_cached_page(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size_mb=1)
+    cache.put("a", "<html>A</html>", '"v1"', "Wed, 01 Jan 2025 00:00:00 GMT")
+    cache.put("b", "<html>B</html>", None, None)
+
+    assert cache.conditional_headers("a") == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT",
+    }
+    # Страницы без валидаторов не кэшируются: условный запрос для них невозможен
+    assert cache.conditional_headers("b") == {}
+    assert cache.get_body("a") == "<html>A</html>"
+
+
+def test_least_recently_used_page_is_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size_mb=KB)
+    cache.put("a", page(400), '"a"', None)
+    cache.put("b", page(400), '"b"', None)
+    cache.get_body("a")  # "a" использована позже "b"
+    cache.put("c", page(400), '"c"', None)
+
+    assert cache.conditional_headers("b") == {}
+    assert cache.get_body("a") == page(400)
+    assert cache.get_body("c") == page(400)
+    assert sorted(os.listdir(tmp_path)) == sorted(HttpCache._file_name(url) for url in ["a", "c"])
+
+
+def test_overwriting_page_does_not_inflate_size(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size_mb=KB)
+    cache.put("a", page(300), '"a"', None)
+    for version in range(10):
+        cache.put("b", page(300), f'"b{version}"', None)
+    cache.put("c", page(300), '"c"', None)
+
+    assert cached_urls(cache) == ["a", "b", "c"]
+    assert cache.conditional_headers("b") == {"If-None-Match": '"b9"'}
+
+
+def test_lru_order_survives_reload(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size_mb=KB)
+    cache.put("a", page(300), '"a"', None)
+    cache.put("b", page(300), '"b"', None)
+    cache.put("c", page(300), '"c"', None)
+    cache.get_body("a")
+    cache.flush()
+
+    reloaded = HttpCache(str(tmp_path), max_size_mb=KB)
+    reloaded.put("d", page(300), '"d"', None)
+
+    assert reloaded.conditional_headers("b") == {}
+    assert reloaded.conditional_headers("a") == {"If-None-Match": '"a"'}
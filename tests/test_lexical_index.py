@@ -0,0 +1,145 @@
+import pytest
+
+from nodes.LexicalIndexNode import LexicalIndexNode
+
+DOCS = {
+    "h1": "milvus index rebuild guide",
+    "h2": "bm25 ranking with milvus",
+    "h3": "streamlit chat page",
+    "h4": "milvus milvus cluster setup",
+}
+
+
+@pytest.fixture
+def make_node(tmp_path):
+    def make(data_dir="index", merge_factor=4, merge_deleted_ratio=0.99):
+        config = {
+            "enabled": True,
+            "data_dir": str(tmp_path / data_dir),
+            "k1": 1.2,
+            "b": 0.75,
+            "top_k": 10,
+            "merge_factor": merge_factor,
+            "merge_deleted_ratio": merge_deleted_ratio,
+        }
+        return LexicalIndexNode(config)
+
+    yield make
+    # Открытые индексы общие для процесса, чтобы следующий тест читал их с диска
+    LexicalIndexNode._indexes.clear()
+
+
+def add(node, hashes, name="docs"):
+    node.add_chunks(name, [DOCS[h] for h in hashes], hashes, sources=[f"url-{h}" for h in hashes])
+
+
+def scores(results):
+    return {text: score for text, score, *_ in results}
+
+
+def test_tokenize_keeps_compound_identifiers_and_parts():
+    assert LexicalIndexNode.tokenize("Ошибка ERR-404 в v2.5") == ["ошибка", "err-404", "err", "404", "в", "v2.5", "v2", "5"]
+
+
+def test_search_ranks_by_bm25(make_node):
+    node = make_node()
+    add(node, ["h1", "h2", "h3", "h4"])
+    results = node.search("docs", "milvus cluster")
+    assert results[0][0] == DOCS["h4"]
+    assert results[0][3] == "url-h4"
+    assert DOCS["h3"] not in scores(results)
+
+
+def test_tombstones_match_a_clean_index(make_node):
+    node = make_node()
+    add(node, ["h1", "h2"])
+    add(node, ["h3", "h4"])
+    node.delete_chunks("docs", ["h1", "h4"])
+    assert len(node._get_state("docs")["segments"]) == 2  # удаленные чанки еще не слиты
+
+    clean = make_node(data_dir="clean")
+    add(clean, ["h2", "h3"])
+
+    query = "milvus ranking chat"
+    tombstoned = scores(node.search("docs", query))
+    assert DOCS["h1"] not in tombstoned and DOCS["h4"] not in tombstoned
+    # df и N считаются только по живым чанкам, поэтому оценки совпадают с индексом без удаленных
+    assert tombstoned == pytest.approx(scores(clean.search("docs", query)))
+
+
+def test_merge_drops_deleted_chunks(make_node):
+    node = make_node(merge_deleted_ratio=0.3)
+    add(node, ["h1", "h2"])
+    add(node, ["h3", "h4"])
+    before = scores(node.search("docs", "milvus chat"))
+    node.delete_chunks("docs", ["h1", "h2"])
+
+    state = node._get_state("docs")
+    assert len(state["segments"]) == 1
+    assert state["segments"][0]["hashes"] == ["h3", "h4"]
+    after = scores(node.search("docs", "milvus chat"))
+    assert set(after) == {DOCS["h3"], DOCS["h4"]}
+    assert after != before
+
+
+def test_segments_of_one_tier_are_merged(make_node):
+    node = make_node(merge_factor=2)
+    for h in ["h1", "h2", "h4"]:
+        add(node, [h])
+    # Два одиночных сегмента слиты в один из двух чанков, третий ждет пары
+    assert [segment["alive_count"] for segment in node._get_state("docs")["segments"]] == [2, 1]
+    assert len(node.search("docs", "milvus")) == 3
+
+
+def test_merged_segments_keep_deletes_working(make_node):
+    node = make_node(merge_factor=2)
+    for h in ["h1", "h2", "h3", "h4"]:
+        add(node, [h])
+    assert [segment["alive_count"] for segment in node._get_state("docs")["segments"]] == [4]
+    node.delete_chunks("docs", ["h4"])
+    assert set(scores(node.search("docs", "milvus"))) == {DOCS["h1"], DOCS["h2"]}
+
+
+def test_merge_io_grows_as_n_log_n(make_node, monkeypatch):
+    node = make_node(merge_factor=4)
+    written = [0]
+    write_segment = node._write_segment
+
+    def counting_write(index_dir, name, docs):
+        written[0] += len(docs)
+        write_segment(index_dir, name, docs)
+
+    monkeypatch.setattr(node, "_write_segment", counting_write)
+    batches = 64
+    for i in range(batches):
+        node.add_chunks("docs", [f"chunk {i}"], [f"hash-{i}"])
+
+    # Каждый чанк записан при добавлении и переписан не больше log4(64) = 3 раз
+    assert written[0] <= batches * 4
+    assert len(node._get_state("docs")["segments"]) < 4 * 3
+    assert len(node.search("docs", "chunk", top_k=100)) == batches
+
+
+def test_deletes_survive_reload(make_node):
+    node = make_node()
+    add(node, ["h1", "h2", "h4"])
+    node.delete_chunks("docs", ["h2"])
+
+    LexicalIndexNode._indexes.clear()
+    reloaded = make_node()
+    assert set(scores(reloaded.search("docs", "milvus"))) == {DOCS["h1"], DOCS["h4"]}
+
+
+def test_source_filter(make_node):
+    node = make_node()
+    add(node, ["h1", "h2", "h4"])
+    results = node.search("docs", "milvus", source_urls=["url-h2"])
+    assert [text for text, *_ in results] == [DOCS["h2"]]
+
+
+def test_missing_index_and_empty_query(make_node):
+    node = make_node()
+    assert node.search("missing", "milvus") == []
+    add(node, ["h1"])
+    assert node.search("docs", "   ") == []
+    assert not node.has_index("missing")
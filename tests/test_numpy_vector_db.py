@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+import pytest
+
+from nodes.NumpyVectorDBNode import NumpyVectorDBNode
+
+
+@pytest.fixture
+def make_node(tmp_path):
+    def make(initial_capacity=2, compact_deleted_ratio=0.9, top_k=10):
+        config = {
+            "dim": 3,
+            "top_k": top_k,
+            "numpy": {
+                "data_dir": str(tmp_path),
+                "dtype": "float32",
+                "initial_capacity": initial_capacity,
+                "compact_deleted_ratio": compact_deleted_ratio,
+            },
+        }
+        return NumpyVectorDBNode(config)
+
+    yield make
+    # Открытые коллекции общие для процесса, чтобы следующий тест читал их с диска
+    NumpyVectorDBNode._collections.clear()
+
+
+def reopen(make_node, **kwargs):
+    NumpyVectorDBNode._collections.clear()
+    return make_node(**kwargs)
+
+
+def fill(node, name="docs"):
+    node.create_milvus_collection(name)
+    chunks = ["a", "b", "c", "d", "e"]
+    embeddings = np.eye(5, 3, dtype=np.float32) + np.arange(5, dtype=np.float32)[:, None] * 0.01
+    node.insert_data_into_milvus(name, chunks, embeddings, sources=["u1", "u1", "u2", "u2", "u3"], titles=["t"] * 5)
+    return chunks
+
+
+def texts(results):
+    return [result[0] for result in results]
+
+
+def test_insert_grows_matrix_and_finds_nearest(make_node):
+    node = make_node(initial_capacity=2)
+    fill(node)
+    assert node.get_total_records("docs") == 5
+
+    results = node.search_similar_chunks("docs", [0.0, 1.0, 0.0])
+    assert results[0] == ("b", pytest.approx(1.01), 1, "u1", "t")
+    assert len(results) == 5
+
+
+def test_deleted_records_are_not_found_and_survive_reload(make_node):
+    node = make_node()
+    fill(node)
+    ids = node.get_chunk_hashes("docs")
+    b_hash = node.chunk_hash("b", "u1", "t")
+    node.delete_records("docs", ids[b_hash]["ids"])
+
+    assert "b" not in texts(node.search_similar_chunks("docs", [0.0, 1.0, 0.0]))
+    assert node.get_total_records("docs") == 4
+
+    reloaded = reopen(make_node)
+    assert reloaded.get_total_records("docs") == 4
+    assert b_hash not in reloaded.get_chunk_hashes("docs")
+    assert "b" not in texts(reloaded.search_similar_chunks("docs", [0.0, 1.0, 0.0]))
+
+
+def test_compaction_keeps_ids_and_vectors(make_node):
+    node = make_node(compact_deleted_ratio=0.3)
+    fill(node)
+    hashes = node.get_chunk_hashes("docs")
+    to_delete = [hashes[node.chunk_hash(text, source, "t")]["ids"][0] for text, source in [("a", "u1"), ("b", "u1")]]
+    node.delete_records("docs", to_delete)
+
+    state = node._get_state("docs")
+    assert state["count"] == 3 and not state["deleted_ids"]
+    ids_before = {chunk_hash: entry["ids"] for chunk_hash, entry in hashes.items() if entry["ids"][0] not in to_delete}
+    assert {chunk_hash: entry["ids"] for chunk_hash, entry in node.get_chunk_hashes("docs").items()} == ids_before
+    assert texts(node.search_similar_chunks("docs", [0.0, 0.0, 1.0]))[0] == "c"
+
+    # id новых записей продолжают нумерацию, а не переиспользуют удаленные
+    node.insert_data_into_milvus("docs", ["f"], [[1.0, 0.0, 0.0]])
+    assert node.search_ids("docs", [[1.0, 0.0, 0.0]], limit=1) == [[5]]
+
+    reloaded = reopen(make_node, compact_deleted_ratio=0.3)
+    assert reloaded.get_total_records("docs") == 4
+    assert texts(reloaded.search_similar_chunks("docs", [1.0, 0.0, 0.0]))[0] == "f"
+
+
+def test_source_filter_masks_other_pages(make_node):
+    node = make_node()
+    fill(node)
+    results = node.search_similar_chunks("docs", [0.0, 1.0, 0.0], source_urls=["u2"])
+    assert sorted(texts(results)) == ["c", "d"]
+    assert node.search_similar_chunks("docs", [0.0, 1.0, 0.0], source_urls=["missing"]) == []
+
+
+def test_batch_search_matches_single_queries(make_node):
+    node = make_node(top_k=2)
+    fill(node)
+    queries = [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]
+    assert node.search_similar_chunks_batch("docs", queries) == [node.search_similar_chunks("docs", q) for q in queries]
+
+
+def test_collection_version_changes_on_writes(make_node):
+    node = make_node()
+    version = node.get_collection_version("docs")
+    fill(node)
+    after_insert = node.get_collection_version("docs")
+    assert after_insert > version
+
+    node.delete_milvus_collection("docs")
+    assert node.get_collection_version("docs") > after_insert
+    assert not node.db_has_collection("docs")
+
+
+def append_orphan(tmp_path, name="docs"):
+    # Как после вставки, прерванной между записью records.jsonl и meta.json
+    with open(tmp_path / name / NumpyVectorDBNode.RECORDS_FILE, "a", encoding="utf-8") as file:
+        record = {"id": 99, "text": "ORPHAN", "chunk_length": 6, "time_insert": 0, "chunk_hash": "x", "source_url": ""}
+        file.write(json.dumps(record) + "\n")
+
+
+def test_interrupted_insert_is_dropped_on_reload(make_node, tmp_path):
+    node = make_node()
+    fill(node)
+    append_orphan(tmp_path)
+
+    reloaded = reopen(make_node)
+    reloaded.insert_data_into_milvus("docs", ["new"], [[0.0, 0.0, -1.0]])
+    assert reloaded.search_similar_chunks("docs", [0.0, 0.0, -1.0])[0][0] == "new"
+
+    again = reopen(make_node)
+    assert again.search_similar_chunks("docs", [0.0, 0.0, -1.0])[0][0] == "new"
+    assert again.get_total_records("docs") == 6
+
+
+def test_interrupted_insert_is_overwritten_in_process(make_node, tmp_path):
+    node = make_node()
+    fill(node)
+    append_orphan(tmp_path)
+    node.insert_data_into_milvus("docs", ["new"], [[0.0, 0.0, -1.0]])
+
+    reloaded = reopen(make_node)
+    assert "ORPHAN" not in texts(reloaded.search_similar_chunks("docs", [0.0, 0.0, -1.0]))
+    assert reloaded.search_similar_chunks("docs", [0.0, 0.0, -1.0])[0][0] == "new"
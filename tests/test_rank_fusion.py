@@ -0,0 +1,29 @@
+import pytest
+
+from utils_local.rank_fusion import reciprocal_rank_fusion
+
+
+def chunk(text, score=0.0):
+    return (text, score, len(text), f"url-{text}", f"title-{text}")
+
+
+def test_chunks_found_by_both_lists_rank_first():
+    vector = [chunk("a", 0.9), chunk("b", 0.8), chunk("c", 0.7)]
+    lexical = [chunk("c", 12.0), chunk("d", 10.0), chunk("a", 5.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert [text for text, *_ in fused] == ["a", "c", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 63)
+
+
+def test_keeps_metadata_and_applies_limit():
+    fused = reciprocal_rank_fusion([[chunk("a"), chunk("b")], [chunk("b")]], limit=1)
+    assert fused == [("b", pytest.approx(1 / 62 + 1 / 61), 1, "url-b", "title-b")]
+
+
+def test_ties_keep_first_seen_order():
+    fused = reciprocal_rank_fusion([[chunk("a")], [chunk("b")]])
+    assert [text for text, *_ in fused] == ["a", "b"]
+
+
+def test_empty_lists():
+    assert reciprocal_rank_fusion([[], []]) == []
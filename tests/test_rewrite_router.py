@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+from elements.QueryElement import QueryElement
+from nodes.RewriteRouterNode import RewriteRouterNode
+
+
+def make_router(**overrides):
+    config = {
+        "enabled": True,
+        "max_short_words": 4,
+        "anaphora_words": ["он", "она", "его", "это", "там", "it", "this"],
+    }
+    config.update(overrides)
+    return RewriteRouterNode(config)
+
+
+def follow_up(query):
+    history = [
+        SimpleNamespace(type="human", content="Сколько стоит тариф Базовый для юрлиц?"),
+        SimpleNamespace(type="ai", content="Тариф Базовый стоит 990 рублей в месяц."),
+    ]
+    return QueryElement(query, message_number=1, previous_messages=history)
+
+
+@pytest.mark.parametrize("query", ["а цена?", "а для второго?", "а в Казани"])
+def test_short_follow_up_is_rewritten(query):
+    # Короткие уточнения мало похожи на прошлый вопрос, но без контекста чата бессмысленны
+    router = make_router()
+
+    assert router.needs_rewrite(follow_up(query))
+    assert router.decisions == {"rewrite": 1, "skip": 0}
+
+
+def test_follow_up_with_anaphora_is_rewritten():
+    router = make_router()
+
+    assert router.needs_rewrite(follow_up("Как подключить его к личному кабинету через приложение?"))
+
+
+def test_self_contained_follow_up_is_not_rewritten():
+    router = make_router()
+    router.record_rewrite_time(500.0)
+
+    assert not router.needs_rewrite(follow_up("Как открыть расчетный счет для индивидуального предпринимателя?"))
+    assert router.decisions == {"rewrite": 0, "skip": 1}
+    assert router.saved_msecs == 500.0
+
+
+def test_first_message_is_not_rewritten():
+    router = make_router()
+
+    assert not router.needs_rewrite(QueryElement("а цена?"))
+
+
+def test_disabled_router_rewrites_every_follow_up():
+    router = make_router(enabled=False)
+
+    assert router.needs_rewrite(follow_up("Как открыть расчетный счет для индивидуального предпринимателя?"))
@@ -0,0 +1,62 @@
+from utils_local.semantic_cache import SemanticCache
+
+
+def store(cache, version, embedding, answer, collection="docs"):
+    cache.store(collection, version, embedding, f"query {answer}", answer, [])
+
+
+def test_similar_query_hits():
+    cache = SemanticCache(similarity_threshold=0.95, max_size=10)
+    store(cache, 1, [1.0, 0.0], "A")
+    assert cache.lookup("docs", 1, [0.99, 0.01])["answer"] == "A"
+    assert cache.lookup("docs", 1, [0.0, 1.0]) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_newer_version_resets_collection():
+    cache = SemanticCache(similarity_threshold=0.95, max_size=10)
+    store(cache, 1, [1.0, 0.0], "old")
+    assert cache.lookup("docs", 2, [1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_outdated_version_does_not_reset_collection():
+    cache = SemanticCache(similarity_threshold=0.95, max_size=10)
+    store(cache, 2, [1.0, 0.0], "new")
+    # Ответ, полученный до обновления коллекции, не сохраняется и не сбрасывает свежие записи
+    store(cache, 1, [0.0, 1.0], "stale")
+    assert cache.lookup("docs", 1, [1.0, 0.0]) is None
+    assert cache.lookup("docs", 2, [1.0, 0.0])["answer"] == "new"
+    assert cache.lookup("docs", 2, [0.0, 1.0]) is None
+
+
+def test_evicts_least_recently_used_across_collections():
+    cache = SemanticCache(similarity_threshold=0.95, max_size=2)
+    store(cache, 1, [1.0, 0.0], "A", collection="first")
+    store(cache, 1, [0.0, 1.0], "B", collection="second")
+    cache.lookup("first", 1, [1.0, 0.0])
+    store(cache, 1, [1.0, 1.0], "C", collection="second")
+    assert cache.lookup("first", 1, [1.0, 0.0])["answer"] == "A"
+    assert cache.lookup("second", 1, [0.0, 1.0]) is None
+    assert cache.lookup("second", 1, [1.0, 1.0])["answer"] == "C"
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils_local.semantic_cache.time.monotonic", lambda: now[0])
+    cache = SemanticCache(similarity_threshold=0.95, max_size=10, ttl_sec=60)
+    store(cache, 1, [1.0, 0.0], "A")
+    now[0] += 61
+    assert cache.lookup("docs", 1, [1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_and_disabled_cache():
+    cache = SemanticCache(similarity_threshold=0.95, max_size=10)
+    store(cache, 1, [1.0, 0.0], "A")
+    cache.invalidate("docs")
+    assert cache.lookup("docs", 1, [1.0, 0.0]) is None
+
+    disabled = SemanticCache(similarity_threshold=0.95, max_size=0)
+    store(disabled, 1, [1.0, 0.0], "A")
+    assert disabled.stats()["size"] == 0
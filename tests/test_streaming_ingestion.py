@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+# Сервис импортирует клиентов Milvus, HTTP и langchain; без них тесты пропускаются
+MakeDatasetRAG = pytest.importorskip("services.MakeDatasetRAG").MakeDatasetRAG
+
+
+class FakeParsingNode:
+    def __init__(self, pages, fail_after=None):
+        self.pages = pages
+        self.fail_after = fail_after
+        self.yielded = 0
+
+    def iter_process(self, url_list, filter_stats):
+        for url in url_list:
+            if self.fail_after is not None and self.yielded == self.fail_after:
+                raise RuntimeError("parsing failed")
+            if url in self.pages:
+                self.yielded += 1
+                yield url, {"text": self.pages[url], "description": f"title {url}"}
+
+    @staticmethod
+    def log_filter_stats(filter_stats):
+        pass
+
+
+class FakeChunkingNode:
+    @staticmethod
+    def create_deduplicator():
+        return None
+
+    @staticmethod
+    def iter_split_pages(pages, deduplicator, filter_stats):
+        for url, data in pages:
+            yield url, data["description"], data["text"].split()
+
+    @staticmethod
+    def log_dedup_stats(filter_stats, total_chunks):
+        pass
+
+
+def make_service(pages, batch_size=3, queue_batches=1, fail_after=None):
+    service = MakeDatasetRAG.__new__(MakeDatasetRAG)
+    service.data_parsing_node = FakeParsingNode(pages, fail_after)
+    service.chunking_node = FakeChunkingNode()
+    service.stream_batch_size = batch_size
+    service.stream_queue_batches = queue_batches
+    return service
+
+
+def test_batches_keep_order_and_record_fetched_pages():
+    service = make_service({"u1": "a b c d", "u2": "e f"})
+    fetched = set()
+    batches = list(service._iter_chunk_batches(["u1", "missing", "u2"], fetched))
+
+    assert [len(batch) for batch in batches] == [3, 3]
+    assert [chunk for batch in batches for chunk, _, _ in batch] == list("abcdef")
+    assert batches[1][0] == ("d", "u1", "title u1")
+    assert fetched == {"u1", "u2"}
+
+
+def test_producer_error_is_raised_in_consumer():
+    service = make_service({"u1": "a b", "u2": "c d"}, fail_after=1)
+    with pytest.raises(RuntimeError, match="parsing failed"):
+        list(service._iter_chunk_batches(["u1", "u2"]))
+
+
+def test_early_stop_releases_producer():
+    pages = {f"u{i}": "x y z" for i in range(100)}
+    service = make_service(pages, batch_size=1, queue_batches=1)
+    batches = service._iter_chunk_batches(list(pages))
+    next(batches)
+    batches.close()
+
+    assert not any(thread.name == "rag-ingest-producer" for thread in threading.enumerate())
+    # Очередь ограничена, поэтому фоновый поток не успел разобрать все страницы
+    assert service.data_parsing_node.yielded < len(pages)
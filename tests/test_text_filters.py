@@ -0,0 +1,33 @@
+from utils_local.text_filters import DomainStopPhrases, StopPhraseMatcher, add_filter_stats
+
+
+def test_matcher_finds_any_phrase():
+    matcher = StopPhraseMatcher(["Читать далее", "Подписаться"])
+    assert matcher.search("Нажмите, чтобы подписаться. Подписаться")
+    assert matcher.search("...Читать далее")
+    assert not matcher.search("Обычная строка текста")
+
+
+def test_matcher_escapes_regex_characters():
+    matcher = StopPhraseMatcher(["(c) 2024", "a.b"])
+    assert matcher.search("Copyright (c) 2024")
+    assert not matcher.search("axb")
+
+
+def test_matcher_ignores_empty_and_duplicate_phrases():
+    matcher = StopPhraseMatcher(["", "abc", "abc"])
+    assert len(matcher) == 1
+    assert not StopPhraseMatcher([]).search("abc")
+
+
+def test_domain_rules_apply_by_url_substring():
+    rules = DomainStopPhrases("stop", {"*": ["все"], "GitHub": ["звезды"], "empty": []})
+    assert [name for name, _ in rules.for_url("https://github.com/org/repo")] == ["stop:*", "stop:github"]
+    assert [name for name, _ in rules.for_url("https://example.com")] == ["stop:*"]
+
+
+def test_add_filter_stats_accumulates():
+    stats = {}
+    add_filter_stats(stats, "stop:*", 2, 10)
+    add_filter_stats(stats, "stop:*", 1, 5)
+    assert stats == {"stop:*": {"lines": 3, "chars": 15}}
@@ -0,0 +1,34 @@
+import argparse
+import json
+
+from services.IndexTuner import IndexTuner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор параметров ANN индекса коллекции по recall@k и задержке")
+    parser.add_argument("collection", help="имя коллекции Milvus")
+    parser.add_argument("--k", type=int, default=None, help="для какого числа результатов считать recall (по умолчанию top_k)")
+    parser.add_argument("--num-queries", type=int, default=None, help="число запросов (по умолчанию из конфига)")
+    parser.add_argument("--recall-target", type=float, default=None, help="минимальный recall@k (по умолчанию из конфига)")
+    parser.add_argument("--output", default=None, help="JSON файл для сохранения результатов")
+    parser.add_argument(
+        "--optimize", action="store_true",
+        help="без подбора: перестроить индекс по настройкам из конфига для текущего числа записей "
+             "(на время перестройки коллекция недоступна для поиска)"
+    )
+    args = parser.parse_args()
+
+    tuner = IndexTuner()
+    if args.optimize:
+        tuner.vector_db_node.optimize_index(args.collection)
+        return
+
+    report = tuner.process(args.collection, args.k, args.num_queries, args.recall_target)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
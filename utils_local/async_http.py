@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class LoopBoundAsyncClient:
+    """
+    Пул соединений httpx.AsyncClient для асинхронных запросов узла.
+    Клиент привязан к event loop, в котором создан, поэтому при вызове из другого loop
+    (например, после нового asyncio.run) создается новый клиент, а старый закрывается.
+    """
+
+    def __init__(self, max_connections: int, timeout: float | None = None) -> None:
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = timeout  # Таймаут запроса в секундах, как у синхронной сессии узла
+        self._client = None
+        self._loop = None
+        self._closing = set()  # Задачи закрытия старых клиентов, ссылки держим до завершения
+
+    def get(self) -> httpx.AsyncClient:
+        """Возвращает клиент для текущего event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            if self._client is not None and not self._client.is_closed:
+                self._close_stale(self._client, self._loop, loop)
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            self._loop = loop
+        return self._client
+
+    def _close_stale(self, client: httpx.AsyncClient, client_loop, loop) -> None:
+        """
+        Закрывает клиент прежнего event loop: в его loop, если тот еще работает (в другом потоке),
+        иначе - в текущем loop. Ошибки закрытия не мешают запросу, ради которого создается новый клиент.
+        """
+        if client_loop is not None and client_loop.is_running() and not client_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._aclose_quietly(client), client_loop)
+            return
+        task = loop.create_task(self._aclose_quietly(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # Соединения закрытого loop уже не закрыть штатно, они освобождаются вместе с клиентом
+            logger.debug(f"Не удалось закрыть клиент прежнего event loop: {e}")
+
+    async def aclose(self) -> None:
+        """Закрывает соединения клиента текущего event loop."""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
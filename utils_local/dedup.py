@@ -0,0 +1,89 @@
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class ChunkDeduplicator:
+    """
+    Находит повторы чанков при загрузке данных: точные (совпадение текста с точностью до пробелов и регистра)
+    и почти точные (оценка MinHash коэффициента Жаккара по словным шинглам не меньше similarity_threshold).
+    Кандидаты в почти точные повторы ищутся через LSH по полосам сигнатуры, поэтому проверка чанка
+    не зависит от числа уже просмотренных чанков.
+    Первый встреченный чанк сохраняется, последующие повторы отбрасываются.
+    """
+
+    def __init__(self, similarity_threshold: float, num_perm: int = 128, shingle_size: int = 5, seed: int = 0) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size  # Число слов в шингле
+        self.bands, self.rows = self._choose_bands(num_perm, similarity_threshold)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+        self._exact_hashes = set()
+        self._buckets = [{} for _ in range(self.bands)]  # полоса -> {хэш полосы: индексы сигнатур}
+        self._signatures = []
+
+    @staticmethod
+    def _choose_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+        """
+        Подбирает разбиение сигнатуры на полосы так, чтобы порог срабатывания LSH (1/bands)^(1/rows)
+        был близок к similarity_threshold, но не выше него (чтобы не терять повторы).
+        Если такого разбиения нет (порог ниже 1/num_perm), берется разбиение с самым низким порогом.
+        """
+        options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+        lsh_threshold = lambda option: (1 / option[0]) ** (1 / option[1])
+        below = [option for option in options if lsh_threshold(option) <= threshold]
+        if not below:
+            return min(options, key=lsh_threshold)
+        return max(below, key=lsh_threshold)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split()).casefold()
+
+    def _signature(self, text: str) -> np.ndarray:
+        words = WORD_PATTERN.findall(text.casefold())
+        if len(words) <= self.shingle_size:
+            shingles = [" ".join(words)]
+        else:
+            shingles = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in set(shingles)), dtype=np.uint64
+        ) % MERSENNE_PRIME
+        return ((self._a * hashes + self._b) % MERSENNE_PRIME).min(axis=1)
+
+    def check(self, text: str) -> str | None:
+        """
+        Проверяет чанк и, если он не повтор, запоминает его.
+
+        Returns:
+            str | None: "exact" или "near" для повтора, None для нового чанка.
+        """
+        normalized = self.normalize(text)
+        exact_hash = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if exact_hash in self._exact_hashes:
+            return "exact"
+        self._exact_hashes.add(exact_hash)
+
+        signature = self._signature(normalized)
+        band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        for index in candidates:
+            if np.mean(self._signatures[index] == signature) >= self.similarity_threshold:
+                return "near"
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for buckets, key in zip(self._buckets, band_keys):
+            buckets.setdefault(key, []).append(index)
+        return None
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Дисковый кэш эмбеддингов, адресуемый по содержимому: ключ - хэш от (id модели, текст).
+    Векторы хранятся в memory-mapped матрице float16 фиксированного размера max_items x dim,
+    рядом лежит индекс (ключ -> строка матрицы). При заполнении вытесняются давно не использованные записи.
+    Индекс сбрасывается на диск явным вызовом flush. Исключение - вытеснение: строку, на которую может указывать
+    индекс на диске, нельзя перезаписать до записи нового индекса (иначе после падения процесса старый ключ
+    получит чужой вектор). Поэтому вытесняется сразу пачка записей (EVICT_FRACTION от max_items), индекс без них
+    записывается на диск, а освободившиеся строки дальше заполняются без записи индекса.
+    """
+
+    INDEX_FILE = "index.json"
+    VECTORS_FILE = "vectors.f16"
+    EVICT_FRACTION = 0.05  # Доля max_items, освобождаемая за одно вытеснение
+
+    def __init__(self, cache_dir: str, max_items: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.dim = None
+        self._vectors = None  # np.memmap (max_items, dim), создается при первой записи
+        self._slots = {}  # ключ -> номер строки в матрице
+        self._slot_keys = []  # номер строки -> ключ (None - строка свободна)
+        self._free_slots = []  # Свободные строки, индекс на диске на них не указывает
+        self._ticks = np.zeros(self.max_items, dtype=np.int64)  # время последнего обращения к строке (0 - свободна)
+        self._tick = 0
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        """Возвращает ключ кэша для текста, эмбеддинг которого получен моделью model_id."""
+        return hashlib.sha1(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.cache_dir, self.VECTORS_FILE)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    def _load(self) -> None:
+        index_path = self._index_path()
+        if not os.path.exists(index_path) or not os.path.exists(self._vectors_path()):
+            return
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                index = json.load(file)
+            if index["max_items"] != self.max_items:
+                logger.warning(
+                    f"Размер кэша эмбеддингов изменился ({index['max_items']} -> {self.max_items}), кэш будет пересоздан"
+                )
+                return
+            dim = int(index["dim"])
+            expected_size = self.max_items * dim * np.dtype(np.float16).itemsize
+            actual_size = os.path.getsize(self._vectors_path())
+            if actual_size != expected_size:
+                raise ValueError(f"размер {self.VECTORS_FILE} {actual_size} байт, по индексу ожидается {expected_size}")
+            keys = list(index["keys"])
+            ticks = np.asarray(index["ticks"], dtype=np.int64)
+            if len(keys) > self.max_items or len(ticks) != len(keys):
+                raise ValueError("число ключей индекса не совпадает с размером кэша")
+            vectors = np.memmap(self._vectors_path(), dtype=np.float16, mode="r+", shape=(self.max_items, dim))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Не удалось прочитать кэш эмбеддингов, кэш будет пересоздан: {e}")
+            return
+
+        self.dim = dim
+        self._vectors = vectors
+        self._slot_keys = keys
+        self._slots = {key: slot for slot, key in enumerate(keys) if key is not None}
+        self._free_slots = [slot for slot, key in enumerate(keys) if key is None]
+        self._ticks[:len(ticks)] = ticks
+        self._ticks[self._free_slots] = 0
+        self._tick = int(ticks.max()) if len(ticks) else 0
+        logger.info(f"Загружен кэш эмбеддингов: {len(self._slots)} записей")
+
+    def _create_storage(self, dim: int) -> None:
+        # Старый индекс описывает другую матрицу и после падения процесса не должен к ней примениться
+        if os.path.exists(self._index_path()):
+            os.remove(self._index_path())
+        self.dim = dim
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float16, mode="w+", shape=(self.max_items, dim))
+        self._slots = {}
+        self._slot_keys = []
+        self._free_slots = []
+        self._ticks[:] = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+        Возвращает эмбеддинги, найденные в кэше.
+
+        Returns:
+            dict: Словарь {ключ: np.ndarray float32} только для найденных ключей.
+        """
+        found = {}
+        with self._lock:
+            if self._vectors is None:
+                return found
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is not None and key not in found:
+                    self._tick += 1
+                    self._ticks[slot] = self._tick
+                    found[key] = np.asarray(self._vectors[slot], dtype=np.float32)
+            if found:
+                self._dirty = True
+        return found
+
+    def put_many(self, keys: list[str], vectors: list[list[float]]) -> None:
+        """Сохраняет эмбеддинги в кэш, при нехватке места вытесняя давно не использованные."""
+        if not keys:
+            return
+        matrix = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            if self._vectors is None or self.dim != matrix.shape[1]:
+                if self._vectors is not None:
+                    logger.warning(f"Размерность эмбеддингов изменилась ({self.dim} -> {matrix.shape[1]}), кэш очищен")
+                self._create_storage(matrix.shape[1])
+
+            new_keys = {}
+            for row, key in enumerate(keys):
+                if key not in self._slots:
+                    new_keys[key] = row
+            new_keys = list(new_keys.items())[-self.max_items:]
+
+            # Сначала занимаем свободные и еще не использованные строки, затем вытесняем давно не использованные
+            append_count = min(max(0, len(new_keys) - len(self._free_slots)), self.max_items - len(self._slot_keys))
+            self._free_slots.extend(range(len(self._slot_keys), len(self._slot_keys) + append_count))
+            self._slot_keys.extend([None] * append_count)
+            if len(new_keys) > len(self._free_slots):
+                self._evict_locked(len(new_keys) - len(self._free_slots))
+
+            for key, row in new_keys:
+                slot = self._free_slots.pop()
+                self._vectors[slot] = matrix[row]
+                self._slots[key] = slot
+                self._slot_keys[slot] = key
+                self._tick += 1
+                self._ticks[slot] = self._tick
+            self._dirty = True
+
+    def _evict_locked(self, required: int) -> None:
+        """
+        Освобождает не меньше required строк (пачкой, см. EVICT_FRACTION) и сразу записывает индекс без них,
+        чтобы индекс на диске не указывал на строки, которые будут перезаписаны.
+        """
+        used = np.flatnonzero(self._ticks[:len(self._slot_keys)] > 0)
+        evict_count = min(len(used), max(required, int(self.max_items * self.EVICT_FRACTION)))
+        evict_slots = used[np.argpartition(self._ticks[used], evict_count - 1)[:evict_count]].tolist()
+        for slot in evict_slots:
+            self._slots.pop(self._slot_keys[slot], None)
+            self._slot_keys[slot] = None
+            self._ticks[slot] = 0
+        self._free_slots.extend(evict_slots)
+        self._write_index_locked()
+
+    def _write_index_locked(self) -> None:
+        """Сбрасывает матрицу на диск и атомарно (через временный файл) заменяет индекс."""
+        self._vectors.flush()
+        index = {
+            "dim": self.dim,
+            "max_items": self.max_items,
+            "keys": list(self._slot_keys),
+            "ticks": self._ticks[:len(self._slot_keys)].tolist(),
+        }
+        index_path = self._index_path()
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, index_path)
+        self._dirty = False
+
+    def flush(self) -> None:
+        """Сбрасывает матрицу и индекс кэша на диск."""
+        # Индекс пишется под блокировкой: иначе старый снимок может лечь поверх индекса, записанного при вытеснении
+        with self._lock:
+            if not self._dirty or self._vectors is None:
+                return
+            self._write_index_locked()
@@ -0,0 +1,121 @@
+import logging
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Теги, содержимое которых не несет полезного текста и выкидывается при разборе дерева
+DEFAULT_DROP_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "nav"]
+
+# Теги с кодом: их содержимое склеивается в одну строку через пробел
+CODE_TAGS = ["pre", "code"]
+
+
+class HtmlExtractor:
+    """
+    Извлекает заголовок и текст из HTML за один проход разбора.
+    Использует самый быстрый доступный бэкенд: selectolax -> lxml -> BeautifulSoup (html.parser).
+    """
+
+    ENGINES = ("selectolax", "lxml", "bs4")
+
+    def __init__(self, engine: str = "auto", drop_tags: list[str] | None = None) -> None:
+        self.drop_tags = list(drop_tags) if drop_tags is not None else list(DEFAULT_DROP_TAGS)
+        self.engine = self._resolve_engine(engine)
+        logger.info(f"HTML extractor engine: {self.engine}")
+
+    @staticmethod
+    def _resolve_engine(engine: str) -> str:
+        available = {
+            "selectolax": HTMLParser is not None,
+            "lxml": etree is not None,
+            "bs4": True,
+        }
+        if engine == "auto":
+            return next(name for name in HtmlExtractor.ENGINES if available[name])
+        if engine not in available:
+            raise ValueError(f"Неизвестный движок парсинга HTML: {engine}. Доступные: auto, {', '.join(HtmlExtractor.ENGINES)}")
+        if not available[engine]:
+            logger.warning(f"Движок {engine} не установлен, используется bs4")
+            return "bs4"
+        return engine
+
+    def extract(self, html: str) -> tuple[str | None, str]:
+        """
+        Разбирает HTML один раз и возвращает заголовок страницы и ее текст.
+
+        Args:
+            html (str): HTML-код страницы.
+
+        Returns:
+            tuple: (title или None, текст страницы со строками, разделенными "\\n").
+        """
+        if self.engine == "selectolax":
+            return self._extract_selectolax(html)
+        if self.engine == "lxml":
+            return self._extract_lxml(html)
+        return self._extract_bs4(html)
+
+    def _extract_selectolax(self, html: str) -> tuple[str | None, str]:
+        tree = HTMLParser(html)
+        title_node = tree.css_first("title")
+        title = title_node.text(strip=True) if title_node is not None else None
+
+        if self.drop_tags:
+            tree.strip_tags(self.drop_tags)
+        for node in tree.css(", ".join(CODE_TAGS)):
+            if node.parent is not None:
+                node.replace_with(node.text(separator=" ", strip=True))
+
+        root = tree.body if tree.body is not None else tree.root
+        text = root.text(separator="\n", strip=True) if root is not None else ""
+        return title, self._normalize_lines(text)
+
+    def _extract_lxml(self, html: str) -> tuple[str | None, str]:
+        try:
+            doc = lxml.html.document_fromstring(html)
+        except (etree.ParserError, ValueError) as e:
+            logger.warning(f"lxml не смог разобрать страницу ({e}), используется bs4")
+            return self._extract_bs4(html)
+
+        title = doc.findtext(".//title")
+
+        # with_tail=False сохраняет текст, идущий сразу после удаленного тега
+        etree.strip_elements(doc, etree.Comment, *self.drop_tags, with_tail=False)
+        for element in list(doc.iter(*CODE_TAGS)):
+            code_text = " ".join(part.strip() for part in element.itertext() if part.strip())
+            element.clear(keep_tail=True)
+            element.text = code_text
+
+        body = doc.find("body")
+        root = body if body is not None else doc
+        text = "\n".join(part.strip() for part in root.itertext() if part.strip())
+        return title, text
+
+    def _extract_bs4(self, html: str) -> tuple[str | None, str]:
+        soup = BeautifulSoup(html, "html.parser")
+        title = soup.title.get_text() if soup.title else None
+
+        for tag in soup(self.drop_tags):
+            tag.decompose()
+        for tag in soup.find_all(CODE_TAGS):
+            tag.replace_with(tag.get_text(separator=" ", strip=True))
+
+        root = soup.body if soup.body is not None else soup
+        return title, root.get_text(separator="\n", strip=True)
+
+    @staticmethod
+    def _normalize_lines(text: str) -> str:
+        return "\n".join(line.strip() for line in text.split("\n") if line.strip())
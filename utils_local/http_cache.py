@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class HttpCache:
+    """
+    Дисковый кэш скачанных страниц для условных GET-запросов.
+    Для каждого URL хранит тело ответа, ETag и Last-Modified.
+    При превышении лимита размера вытесняются давно не использованные страницы (LRU):
+    индекс упорядочен по времени последнего обращения, а суммарный размер считается на лету,
+    поэтому сохранение страницы не перебирает весь кэш.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str, max_size_mb: float) -> None:
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index = self._load_index()  # url -> {"file", "etag", "last_modified", "size", "last_access"}, от старых к новым
+        self._total_size = sum(entry["size"] for entry in self._index.values())
+        self._dirty = False
+
+    def _load_index(self) -> OrderedDict:
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return OrderedDict()
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                index = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать индекс HTTP кэша, кэш будет пересоздан: {e}")
+            return OrderedDict()
+        return OrderedDict(sorted(index.items(), key=lambda item: item[1]["last_access"]))
+
+    @staticmethod
+    def _file_name(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html"
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Возвращает заголовки If-None-Match / If-Modified-Since для страницы, если она есть в кэше.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get_body(self, url: str) -> str | None:
+        """
+        Возвращает сохраненное тело страницы (после ответа 304) или None, если его нет.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+            entry["last_access"] = time.time()
+            self._index.move_to_end(url)
+            self._dirty = True
+
+        try:
+            with open(os.path.join(self.cache_dir, entry["file"]), "r", encoding="utf-8") as file:
+                return file.read()
+        except OSError:
+            with self._lock:
+                self._remove_locked(url)
+            return None
+
+    def put(self, url: str, body: str, etag: str | None, last_modified: str | None) -> None:
+        """
+        Сохраняет страницу в кэш. Страницы без ETag и Last-Modified не кэшируются,
+        так как для них нельзя сделать условный запрос.
+        """
+        if not etag and not last_modified:
+            return
+
+        data = body.encode("utf-8")
+        if len(data) > self.max_size_bytes:
+            return
+
+        file_name = self._file_name(url)
+        tmp_path = os.path.join(self.cache_dir, file_name + f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, os.path.join(self.cache_dir, file_name))
+
+        with self._lock:
+            self._remove_locked(url)
+            self._index[url] = {
+                "file": file_name,
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": len(data),
+                "last_access": time.time(),
+            }
+            self._total_size += len(data)
+            self._dirty = True
+            if self._total_size > self.max_size_bytes:
+                self._evict_locked()
+
+    def _remove_locked(self, url: str) -> dict | None:
+        """Убирает страницу из индекса (файл не трогает) и уменьшает суммарный размер."""
+        entry = self._index.pop(url, None)
+        if entry is not None:
+            self._total_size -= entry["size"]
+            self._dirty = True
+        return entry
+
+    def _evict_locked(self) -> None:
+        """Вытесняет самые давно использованные страницы, пока размер кэша превышает лимит."""
+        while self._total_size > self.max_size_bytes and self._index:
+            url, entry = self._index.popitem(last=False)
+            self._total_size -= entry["size"]
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+            logger.debug(f"Страница {url} вытеснена из HTTP кэша")
+
+    def flush(self) -> None:
+        """Сохраняет индекс кэша на диск."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self._index, ensure_ascii=False)
+            self._dirty = False
+
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(snapshot)
+        os.replace(tmp_path, index_path)
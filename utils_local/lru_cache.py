@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU кэш в памяти процесса с опциональным временем жизни записей
+    и счетчиками попаданий/промахов.
+    """
+
+    def __init__(self, max_size: int, ttl_sec: float | None = None) -> None:
+        self.max_size = max_size  # 0 - кэш выключен
+        self.ttl_sec = ttl_sec  # None - записи не устаревают
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # ключ -> (время записи, значение)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу и помечает его как недавно использованное."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl_sec is not None and time.monotonic() - item[0] > self.ttl_sec:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value) -> None:
+        """Сохраняет значение, вытесняя давно не использованные записи при переполнении."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Возвращает счетчики попаданий, промахов и текущий размер кэша."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
@@ -0,0 +1,25 @@
+def reciprocal_rank_fusion(result_lists: list[list[tuple]], k: int = 60, limit: int | None = None) -> list[tuple]:
+    """
+    Объединяет несколько ранжированных списков чанков методом Reciprocal Rank Fusion:
+    оценка чанка - сумма 1 / (k + ранг) по спискам, в которых он встретился.
+
+    Args:
+        result_lists (list): Списки кортежей (текст чанка, оценка, длина чанка, url источника, заголовок источника),
+            каждый по убыванию релевантности.
+        k (int): Сглаживающая константа RRF.
+        limit (int): Сколько чанков вернуть (None - все).
+
+    Returns:
+        list: Кортежи того же вида с оценкой RRF вместо исходной оценки, по убыванию оценки RRF.
+    """
+    scores = {}
+    chunks = {}
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            text = chunk[0]
+            scores[text] = scores.get(text, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(text, chunk)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if limit is not None:
+        fused = fused[:limit]
+    return [(text, score) + chunks[text][2:] for text, score in fused]
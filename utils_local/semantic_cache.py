@@ -0,0 +1,126 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Кэш ответов LLM по смыслу запроса. Для каждой коллекции хранит эмбеддинги прошлых запросов
+    вместе с ответами; запрос считается повторным, если косинусная близость его эмбеддинга
+    к сохраненному не меньше similarity_threshold.
+    Записи устаревают по TTL, при переполнении вытесняются давно не использованные,
+    а при росте версии коллекции все ее записи сбрасываются. Версии коллекции только растут,
+    поэтому запросы с версией старше текущей (ответы, полученные до обновления коллекции) игнорируются.
+    """
+
+    def __init__(self, similarity_threshold: float, max_size: int, ttl_sec: float | None = None) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self._collections = {}  # имя коллекции -> {"version", "embeddings" (n x dim), "entries" (list)}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _get_bucket(self, collection_name: str, version: int) -> dict | None:
+        """Возвращает записи коллекции для версии version или None, если версия устарела."""
+        bucket = self._collections.get(collection_name)
+        if bucket is not None and version < bucket["version"]:
+            return None
+        if bucket is None or bucket["version"] != version:
+            # Коллекция пересоздана или изменена - старые ответы больше не актуальны
+            bucket = {"version": version, "embeddings": None, "entries": []}
+            self._collections[collection_name] = bucket
+        return bucket
+
+    def _remove_entries(self, bucket: dict, indices: list[int]) -> None:
+        removed = set(indices)
+        keep = [i for i in range(len(bucket["entries"])) if i not in removed]
+        bucket["entries"] = [bucket["entries"][i] for i in keep]
+        bucket["embeddings"] = bucket["embeddings"][keep] if keep else None
+
+    def lookup(self, collection_name: str, version: int, embedding) -> dict | None:
+        """
+        Ищет сохраненный ответ на близкий по смыслу запрос.
+
+        Returns:
+            dict | None: Запись с ключами 'query', 'answer', 'prompt_chunks' или None.
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._get_bucket(collection_name, version)
+            if bucket is None:
+                self.misses += 1
+                return None
+            if self.ttl_sec is not None and bucket["entries"]:
+                expired = [i for i, entry in enumerate(bucket["entries"]) if now - entry["created"] > self.ttl_sec]
+                if expired:
+                    self._remove_entries(bucket, expired)
+
+            if bucket["embeddings"] is None:
+                self.misses += 1
+                return None
+
+            similarities = bucket["embeddings"] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            entry = bucket["entries"][best]
+            entry["last_used"] = now
+            self.hits += 1
+            return dict(entry, similarity=float(similarities[best]))
+
+    def store(self, collection_name: str, version: int, embedding, query: str, answer: str, prompt_chunks: list) -> None:
+        """Сохраняет ответ на запрос для коллекции указанной версии."""
+        if self.max_size <= 0:
+            return
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._get_bucket(collection_name, version)
+            if bucket is None:
+                # Ответ получен по устаревшей версии коллекции, свежие записи не сбрасываем
+                return
+            bucket["entries"].append({
+                "query": query,
+                "answer": answer,
+                "prompt_chunks": prompt_chunks,
+                "created": now,
+                "last_used": now,
+            })
+            if bucket["embeddings"] is None:
+                bucket["embeddings"] = vector[np.newaxis, :]
+            else:
+                bucket["embeddings"] = np.vstack([bucket["embeddings"], vector])
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        total = sum(len(bucket["entries"]) for bucket in self._collections.values())
+        while total > self.max_size:
+            # Самая давно использованная запись среди всех коллекций
+            name, index = min(
+                ((name, i) for name, bucket in self._collections.items() for i in range(len(bucket["entries"]))),
+                key=lambda item: self._collections[item[0]]["entries"][item[1]]["last_used"],
+            )
+            self._remove_entries(self._collections[name], [index])
+            total -= 1
+
+    def invalidate(self, collection_name: str) -> None:
+        """Удаляет все ответы для коллекции."""
+        with self._lock:
+            self._collections.pop(collection_name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = sum(len(bucket["entries"]) for bucket in self._collections.values())
+            return {"hits": self.hits, "misses": self.misses, "size": size}
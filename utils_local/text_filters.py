@@ -0,0 +1,59 @@
+import re
+
+
+class StopPhraseMatcher:
+    """
+    Проверяет, содержит ли строка хотя бы одну из стоп-фраз.
+    Все фразы собираются в одно скомпилированное регулярное выражение,
+    поэтому строка просматривается один раз, а не по разу на каждую фразу.
+    """
+
+    def __init__(self, phrases: list[str]) -> None:
+        # Длинные фразы ставим первыми, чтобы альтернатива не останавливалась на их префиксах
+        self.phrases = sorted({phrase for phrase in phrases if phrase}, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(phrase) for phrase in self.phrases)) if self.phrases else None
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def search(self, line: str) -> bool:
+        """Возвращает True, если в строке есть любая из стоп-фраз."""
+        return self._pattern is not None and self._pattern.search(line) is not None
+
+
+class DomainStopPhrases:
+    """
+    Набор правил со стоп-фразами, привязанных к сайтам.
+    Ключ правила - подстрока адреса страницы (например "github"), "*" - правило для всех сайтов.
+    """
+
+    ANY_DOMAIN = "*"
+
+    def __init__(self, kind: str, phrases_by_domain: dict | None) -> None:
+        self.kind = kind  # Тип правила, используется в названии при подсчете статистики
+        self.rules = [
+            (str(domain).lower(), StopPhraseMatcher(phrases))
+            for domain, phrases in (phrases_by_domain or {}).items()
+            if phrases
+        ]
+
+    def for_url(self, url: str) -> list[tuple[str, StopPhraseMatcher]]:
+        """
+        Возвращает правила, применимые к странице.
+
+        Returns:
+            list: Список кортежей (название правила, matcher).
+        """
+        url = url.lower()
+        return [
+            (f"{self.kind}:{domain}", matcher)
+            for domain, matcher in self.rules
+            if domain == self.ANY_DOMAIN or domain in url
+        ]
+
+
+def add_filter_stats(stats: dict, rule: str, lines: int, chars: int) -> None:
+    """Добавляет к статистике правила rule число удаленных строк и символов."""
+    rule_stats = stats.setdefault(rule, {"lines": 0, "chars": 0})
+    rule_stats["lines"] += lines
+    rule_stats["chars"] += chars
@@ -0,0 +1,66 @@
+import logging
+import os
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def _find_tokenizer_file(model_dir: str) -> str:
+    """
+    Возвращает путь к tokenizer.json в папке модели. Поддерживается и обычная папка модели,
+    и папка репозитория в кэше HuggingFace (models--org--name), которую создают TEI и huggingface_hub:
+    тогда берется снимок из refs/main, а если его нет - любой снимок с tokenizer.json.
+    """
+    file_path = os.path.join(model_dir, TOKENIZER_FILE)
+    snapshots_dir = os.path.join(model_dir, "snapshots")
+    if os.path.isfile(file_path) or not os.path.isdir(snapshots_dir):
+        return file_path
+
+    ref_path = os.path.join(model_dir, "refs", "main")
+    if os.path.isfile(ref_path):
+        with open(ref_path, "r", encoding="utf-8") as file:
+            snapshot_file = os.path.join(snapshots_dir, file.read().strip(), TOKENIZER_FILE)
+        if os.path.isfile(snapshot_file):
+            return snapshot_file
+    for snapshot in sorted(os.listdir(snapshots_dir)):
+        snapshot_file = os.path.join(snapshots_dir, snapshot, TOKENIZER_FILE)
+        if os.path.isfile(snapshot_file):
+            return snapshot_file
+    return file_path
+
+
+def load_local_tokenizer(path: str | None):
+    """
+    Загружает токенизатор HuggingFace из файлов модели на диске.
+
+    Args:
+        path (str): Путь к tokenizer.json, к папке модели, в которой он лежит, или к папке модели в кэше HuggingFace.
+
+    Returns:
+        tokenizers.Tokenizer | None: Токенизатор или None, если библиотека tokenizers
+        не установлена или файл не найден.
+    """
+    if not path:
+        return None
+    if Tokenizer is None:
+        logger.warning("Библиотека tokenizers не установлена, локальный подсчет токенов недоступен")
+        return None
+
+    file_path = _find_tokenizer_file(path) if os.path.isdir(path) else path
+    if not os.path.isfile(file_path):
+        logger.warning(f"Файл токенизатора {file_path} не найден, локальный подсчет токенов недоступен")
+        return None
+
+    try:
+        tokenizer = Tokenizer.from_file(file_path)
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить токенизатор {file_path}: {e}")
+        return None
+    logger.info(f"Загружен локальный токенизатор {file_path}")
+    return tokenizer
@@ -1,3 +1,5 @@
+import functools
+import inspect
 import logging
 import os
 import time
@@ -19,16 +21,28 @@ def check_and_set_env_var(var_name, value_new):
 
 
 def profile_time(func):
-    def exec_and_print_status(*args, **kwargs):
-        t_start = time.time()
-        out = func(*args, **kwargs)
-        t_end = time.time()
-        dt_msecs = (t_end - t_start) * 1000
-
-        self = args[0]
+    def log_time(self, t_start):
+        dt_msecs = (time.time() - t_start) * 1000
         logger_profile.debug(
             f"{self.__class__.__name__}.{func.__name__}, time spent {dt_msecs:.2f} msecs"
         )
+
+    if inspect.iscoroutinefunction(func):
+        # Для async-методов время считается до завершения корутины, а не до ее создания
+        @functools.wraps(func)
+        async def exec_and_print_status_async(*args, **kwargs):
+            t_start = time.time()
+            out = await func(*args, **kwargs)
+            log_time(args[0], t_start)
+            return out
+
+        return exec_and_print_status_async
+
+    @functools.wraps(func)
+    def exec_and_print_status(*args, **kwargs):
+        t_start = time.time()
+        out = func(*args, **kwargs)
+        log_time(args[0], t_start)
         return out
 
-    return exec_and_print_status
\ No newline at end of file
+    return exec_and_print_status